@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/1.11/ref/settings/
 
 import os
 import sys
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -48,9 +49,23 @@ STATIC_URL = '/static/'
 
 # 自定义认证：同时使用username及email登陆
 AUTHENTICATION_BACKENDS = (
-    'users.views.CustomBackend',
+    'users.backends.EmailOrUsernameBackend',
 )
 
+# 第一个为首选算法, 用户登录时其他算法(或迭代次数较低)的密码hash会自动升级
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.SHA1PasswordHasher',
+    'django.contrib.auth.hashers.MD5PasswordHasher',
+]
+
+AUTH_SETTINGS = {
+    # 登录名(用户名或邮箱)对应的用户id缓存时间(秒)
+    'USER_ID_CACHE_TIMEOUT': 60 * 5,
+}
+
 INSTALLED_APPS = [
     'django.contrib.admin',
     'django.contrib.auth',
@@ -63,9 +78,14 @@ INSTALLED_APPS = [
     'courses',
     'organization',
     'operation',
+    'search',
+    # 后台工具: 请求统计、后台导出任务、分批导入
+    'admin_tools',
     # 三方库 xadmin
     'xadmin',
     'crispy_forms',
+    # 三方库: django-import-export(xadmin导入)
+    'import_export',
     # 验证码
     'captcha',
     # 三方库: django-pure-pagination
@@ -84,14 +104,148 @@ PAGINATION_SETTINGS = {
     'COURSE_NUM_PER_PAGE': 6,
     'TEACHER_NUM_PER_PAGE': 2,
     'MESSAGE_NUM_PER_PAGE': 8,
+    'FAV_NUM_PER_PAGE': 12,
 
     'SHOW_FIRST_PAGE_WHEN_INVALID': True,
+
+    # 列表分页方式(utils.keyset_pagination): 'keyset' 游标分页, 'offset' 页码分页
+    'MODE': 'keyset',
+    # 列表总数缓存时间(秒)
+    'COUNT_CACHE_TIMEOUT': 60,
+}
+
+# 点击数写缓冲配置(utils.click_counter)
+CLICK_COUNTER_SETTINGS = {
+    # 缓冲写入数据库的间隔(秒), 0表示每次点击立即写入
+    'FLUSH_INTERVAL': 10,
+    # 缓冲中的对象数达到该值时立即写入
+    'FLUSH_SIZE': 100,
+}
+
+# 用户操作记录异步写入配置(utils.activity_log)
+ACTIVITY_LOG_SETTINGS = {
+    # 'async' 后台线程批量写入, 'sync' 在请求中立即写入(测试时使用)
+    'MODE': 'async',
+    # 写入间隔(秒)
+    'FLUSH_INTERVAL': 2,
+    # 每批写入的最大记录数
+    'FLUSH_SIZE': 100,
+    # 队列容量
+    'MAX_SIZE': 10000,
+    # 队列已满时的策略: 'drop' 丢弃, 'block' 短暂等待后丢弃, 'sync' 在请求中直接写入
+    'OVERFLOW': 'drop',
+}
+
+# 邮件发送队列配置(utils.mail_dispatcher)
+MAIL_DISPATCHER_SETTINGS = {
+    # 'async' 发送线程批量发送, 'sync' 在请求中立即发送(测试时使用)
+    'MODE': 'async',
+    # 每个进程的发送线程数
+    'WORKERS': 2,
+    # 每个SMTP连接发送的最大邮件数
+    'BATCH_SIZE': 20,
+    # 队列容量, 队列已满时邮件留在EmailOutbox中等待重试
+    'MAX_SIZE': 1000,
+    # 最大发送次数
+    'MAX_ATTEMPTS': 5,
+    # 第一次重试的等待时间(秒), 之后每次翻倍
+    'RETRY_DELAY': 60,
+    # 发送线程空闲时检查待重试邮件的间隔(秒)
+    'POLL_INTERVAL': 30,
+}
+
+# 邮箱验证码配置(utils.verify_token)
+VERIFY_TOKEN_SETTINGS = {
+    # 各类验证码的有效时间(秒)
+    'TTL': {
+        'register': 60 * 60 * 24 * 3,
+        'forget': 60 * 60 * 2,
+        'update_email': 60 * 30,
+    },
+    # 过期的验证码记录保留时间(秒), 之后由 python manage.py purge_verify_tokens 删除
+    'KEEP_EXPIRED': 60 * 60 * 24 * 7,
+}
+
+# 搜索配置(search app)
+SEARCH_SETTINGS = {
+    # 搜索后端
+    'BACKEND': 'search.backends.DatabaseSearchBackend',
+    # 单次搜索返回的最大结果数
+    'MAX_RESULTS': 1000,
+    # 索引没有命中时(单个英文字母、单词中间的片段等)退回icontains匹配
+    'ICONTAINS_FALLBACK': True,
+}
+
+# 页面缓存配置(utils.page_cache)
+PAGE_CACHE_SETTINGS = {
+    # 是否启用未登录用户的整页缓存
+    'ENABLED': True,
+    # 整页缓存时间(秒), 相关模型保存时立即失效
+    'PAGE_TIMEOUT': 60 * 5,
+    # 片段(轮播图、热门排行、城市列表)缓存时间(秒)
+    'FRAGMENT_TIMEOUT': 60 * 5,
+}
+
+# media、static文件访问配置(utils.file_serve)
+FILE_SERVE_SETTINGS = {
+    # 'django' 由uWSGI发送文件(sendfile), 'x-accel' 返回X-Accel-Redirect由nginx发送
+    'MODE': os.environ.get('FILE_SERVE_MODE', 'django'),
+    # 普通文件的缓存时间(秒), 0表示每次使用ETag验证
+    'MAX_AGE': 0,
+    # 文件名带内容hash的静态资源的缓存时间(秒)
+    'IMMUTABLE_MAX_AGE': 60 * 60 * 24 * 365,
+    # Range请求逐块读取的大小(字节)
+    'CHUNK_SIZE': 64 * 1024,
+}
+
+# xadmin后台导出任务配置(utils.export_jobs)
+EXPORT_JOB_SETTINGS = {
+    'ENABLED': True,
+    # 'async' 导出线程执行, 'sync' 在请求中立即执行(测试时使用)
+    'MODE': 'async',
+    # 每个进程的导出线程数
+    'WORKERS': 2,
+    # 导出文件目录(不在MEDIA_ROOT中, 只能由任务所属用户下载)
+    'ROOT': os.path.join(BASE_DIR, 'export_jobs'),
+    # FILE_SERVE_MODE=x-accel 时nginx internal location的前缀
+    'ACCEL_PREFIX': '/protected/export_jobs/',
+    # 任务及导出文件的保留时间(秒), 之后由导出线程或 python manage.py purge_export_jobs 删除
+    'EXPIRE': 60 * 60 * 24,
+    # 每个用户进行中的最大任务数
+    'MAX_ACTIVE_JOBS': 3,
+    # 导出中的任务超过该时间(秒)未更新进度(如进程退出)时重新执行
+    'LEASE': 60 * 5,
+    # 更新进度的间隔(秒)
+    'PROGRESS_INTERVAL': 2,
+    # 导出线程空闲时检查未执行任务的间隔(秒)
+    'POLL_INTERVAL': 30,
+}
+
+# xadmin分批导入配置(utils.bulk_import)
+BULK_IMPORT_SETTINGS = {
+    'ENABLED': True,
+    # 每批导入的行数, 每批一个事务并记录导入进度
+    'BATCH_SIZE': 1000,
+    # 上传后试导入预览的行数, 其余行在导入时校验
+    'PREVIEW_ROWS': 100,
+    # 导入中的任务超过该时间(秒)未更新(如请求超时、进程退出)时可再次确认导入, 从断点继续
+    'LEASE': 60 * 5,
+}
+
+# xadmin列表筛选项缓存配置(xadmin.filters), 筛选字段路径上的模型保存、删除时失效
+XADMIN_FILTER_CHOICES = {
+    'ENABLED': True,
+    'TIMEOUT': 60 * 60,
+    # 筛选项超过该数量时改为输入搜索
+    'MAX_CHOICES': 100,
 }
 
 #
 AUTH_USER_MODEL = 'users.UserProfile'
 
 MIDDLEWARE_CLASSES = [
+    # 请求统计(SQL数量及耗时), 放在最前面
+    'utils.request_stats.RequestStatsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -105,7 +259,8 @@ ROOT_URLCONF = 'Lighten.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates + 模板渲染耗时统计
+        'BACKEND': 'utils.request_stats.InstrumentedDjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')]
         ,
         'APP_DIRS': True,
@@ -117,6 +272,8 @@ TEMPLATES = [
                 'django.contrib.messages.context_processors.messages',
                 # 将media配置变量注册入templates
                 'django.core.context_processors.media',
+                # 页头未读消息数
+                'users.context_processors.unread_messages',
             ],
         },
     },
@@ -124,19 +281,71 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'Lighten.wsgi.application'
 
+REQUEST_STATS_SETTINGS = {
+    'ENABLED': True,
+    # 总耗时(秒)或SQL数量超过该值的请求记录warning
+    'SLOW_TIME': 1.0,
+    'MAX_QUERIES': 50,
+    # 各view(url名称)的SQL数量限制, 超过时记录warning, 运行测试时抛出异常
+    'QUERY_BUDGETS': {
+        'index': 15,
+        'course:course_list': 15,
+        'course:detail': 15,
+        'org:org_list': 15,
+        'org:teacher_list': 15,
+        # 后台分批导入的SQL数量与导入的行数成正比(每批约5条), 不限制
+        'xadmin:courses_course_process_import': None,
+        'xadmin:courses_lesson_process_import': None,
+        'xadmin:courses_video_process_import': None,
+    },
+    'DEFAULT_QUERY_BUDGET': 30,
+    'RAISE_ON_BUDGET': sys.argv[1:2] == ['test'],
+    # 各进程统计写入缓存的间隔(秒)
+    'FLUSH_INTERVAL': 30,
+}
+
 # Database
 # https://docs.djangoproject.com/en/1.11/ref/settings/#databases
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.mysql',
+        # django.db.backends.mysql + 持久连接健康检查、连接池及连接耗时统计(utils/db_pool)
+        'ENGINE': 'utils.db_pool.mysql',
         'NAME': os.environ.get('MYSQL_DATABASE_NAME'),
         'USER': 'root',
         'PASSWORD': os.environ.get('MYSQL_ENV_MYSQL_ROOT_PASSWORD'),
         'HOST': os.environ.get('MYSQL_PORT_3306_TCP_ADDR'),
         'OPTIONS': {
             "init_command": "SET foreign_key_checks=0;",
-        }
+        },
+        # 持久连接的最长使用时间(秒), 每个请求不再重新连接(及执行init_command); 启用连接池时为0(由连接池复用连接)
+        'CONN_MAX_AGE': 0 if os.environ.get('DB_POOL_ENABLED') == '1' else int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        # 持久连接在每个请求第一次使用前检查是否可用(MySQL重启或wait_timeout断开后自动重连)
+        'CONN_HEALTH_CHECKS': True,
+        # 进程内连接池(uWSGI开启多线程时使用): MAX_SIZE 最多空闲连接数, MAX_OVERFLOW 繁忙时额外的连接数,
+        # TIMEOUT 等待空闲连接的时间(秒), RECYCLE 连接最长使用时间(秒), MIN_SIZE worker启动时预先建立的连接数
+        'POOL': {
+            'ENABLED': os.environ.get('DB_POOL_ENABLED') == '1',
+            'MAX_SIZE': 5,
+            'MAX_OVERFLOW': 5,
+            'TIMEOUT': 10,
+            'RECYCLE': 60 * 60,
+            'MIN_SIZE': 1,
+        },
+    }
+}
+
+# Cache
+# 多个uWSGI worker进程之间共享缓存(用户收藏集合等), 使用文件缓存
+# https://docs.djangoproject.com/en/1.9/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('DJANGO_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'lighten_cache')),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
     }
 }
 
@@ -16,11 +16,11 @@ Including another URLconf
 """
 from django.conf.urls import url, include
 from django.views.generic import TemplateView
-from django.views.static import serve
 import xadmin
 
 from users.views import LoginView, LogoutView, RegisterView, ActiveUserView, \
     ForgetPasswordView, ResetPasswordView, ModifyPasswordView, IndexView
+from utils.file_serve import serve
 
 from Lighten.settings import MEDIA_ROOT
 
@@ -49,10 +49,10 @@ urlpatterns = [
     # 课程相关url配置
     url('^course/', include('courses.urls', namespace='course')),
 
-    # 上传文件的访问处理函数
-    url(r'^media/(?P<path>.*$)', serve, {'document_root': MEDIA_ROOT}),
+    # 上传文件的访问处理函数(支持ETag、Range, 'x-accel'模式下由nginx发送文件)
+    url(r'^media/(?P<path>.*$)', serve, {'document_root': MEDIA_ROOT, 'url_prefix': '/protected/media/'}),
     # setting中关闭DEBUG时, 加入static的处理函数
-    url(r'^static/(?P<path>.*)$', serve, {'document_root': STATIC_ROOT}),
+    url(r'^static/(?P<path>.*)$', serve, {'document_root': STATIC_ROOT, 'url_prefix': '/protected/static/'}),
 
     # 个人中心url配置
     url(r'^users/', include('users.urls', namespace='user')),
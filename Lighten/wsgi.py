@@ -1,3 +1,4 @@
+# coding: utf-8
 """
 WSGI config for Lighten project.
 
@@ -14,3 +15,31 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "Lighten.settings")
 
 application = get_wsgi_application()
+
+try:
+    from uwsgidecorators import postfork
+except ImportError:
+    # 不在uWSGI中运行
+    postfork = None
+
+if postfork is not None:
+    @postfork
+    def warmup_db_connections():
+        """uWSGI fork出worker进程后, 丢弃从master继承的数据库连接并预先建立连接"""
+        from utils.db_pool import warmup_connections
+        warmup_connections()
+
+
+def start_workers():
+    """启动导出线程、邮件发送线程: 进程重启后数据库中未执行的导出任务、待重试的邮件无需等待新的请求即可继续执行"""
+    from utils.export_jobs import export_job_runner
+    from utils.mail_dispatcher import mail_dispatcher
+    export_job_runner.start()
+    mail_dispatcher.start()
+
+
+if postfork is not None:
+    # master进程中启动的线程不会保留到fork出的worker中
+    postfork(start_workers)
+else:
+    start_workers()
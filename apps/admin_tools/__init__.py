@@ -0,0 +1 @@
+default_app_config = 'admin_tools.apps.AdminToolsConfig'
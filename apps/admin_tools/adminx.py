@@ -0,0 +1,234 @@
+# coding: utf-8
+"""
+    xadmin后台工具: 请求统计页面, 列表页的后台导出任务, django-import-export的分批导入
+"""
+import json
+import os
+from collections import OrderedDict
+from datetime import datetime
+
+import xadmin
+from django.contrib import messages
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponse, HttpResponseRedirect
+from django.template.response import TemplateResponse
+from django.utils.encoding import force_text
+from django.utils.http import urlquote
+from import_export.forms import ConfirmImportForm, ImportForm
+from import_export.signals import post_import
+from xadmin import views
+from xadmin.plugins.importexport import ImportBaseView
+
+from users.models import ExportJob, ImportJob
+from utils.bulk_import import BULK_IMPORT_SETTINGS, BulkImporter, claim_job, open_import_file, read_import_dataset, \
+    run_import
+from utils.export_jobs import EXPORT_JOB_SETTINGS, cancel_job, create_job, get_progress, get_root
+from utils.file_serve import serve
+from utils.request_stats import get_top_stats
+
+
+class ExportJobAdmin(object):
+    list_display = ['title', 'user', 'status', 'done_nums', 'total_nums', 'file_size', 'add_time', 'finish_time',
+                    'expire_time']
+    list_filter = ['status', 'model', 'add_time', 'expire_time']
+    search_fields = ['title', 'model', 'user__username']
+    readonly_fields = ['status', 'done_nums', 'total_nums', 'file_name', 'file_size', 'error', 'start_time',
+                       'update_time', 'finish_time']
+
+
+class ImportJobAdmin(object):
+    list_display = ['original_file_name', 'user', 'model', 'status', 'done_rows', 'new_nums', 'update_nums',
+                    'add_time', 'finish_time']
+    list_filter = ['status', 'model', 'add_time']
+    search_fields = ['original_file_name', 'model', 'user__username']
+    readonly_fields = ['status', 'done_rows', 'new_nums', 'update_nums', 'skip_nums', 'delete_nums', 'error',
+                       'update_time', 'finish_time']
+
+
+xadmin.site.register(ExportJob, ExportJobAdmin)
+xadmin.site.register(ImportJob, ImportJobAdmin)
+
+
+# 请求统计页面的排序方式
+REQUEST_STATS_ORDERS = OrderedDict([('wall_time_avg', u'平均耗时'), ('wall_time_max', u'最大耗时'),
+                                    ('queries_avg', u'平均SQL数'), ('queries_max', u'最大SQL数'),
+                                    ('db_time_avg', u'平均SQL耗时'), ('requests', u'请求数')])
+
+
+class RequestStatsView(views.CommAdminView):
+    """请求统计: 各view的平均SQL数量及耗时(所有进程)"""
+
+    def get(self, request, *args, **kwargs):
+        if not request.user.is_superuser:
+            raise PermissionDenied
+        order_by = request.GET.get('o', 'wall_time_avg')
+        if order_by not in REQUEST_STATS_ORDERS:
+            order_by = 'wall_time_avg'
+        context = self.get_context()
+        context.update({'title': u'请求统计',
+                        'order_by': order_by,
+                        'orders': REQUEST_STATS_ORDERS,
+                        'rows': get_top_stats(order_by, nums=100)})
+        return TemplateResponse(request, 'xadmin/request_stats.html', context)
+
+
+xadmin.site.register_view(r'^request_stats/$', RequestStatsView, name='request_stats')
+
+
+class ExportJobPlugin(views.BaseAdminPlugin):
+    """
+        列表页导出菜单中的'后台导出'(xadmin导出及django-import-export导出):
+        以当前的筛选、搜索、排序及导出参数创建导出任务, 跳转到导出任务页面
+    """
+    # (导出插件的参数名, 导出时的值)
+    export_params = (('_do_', 'export'), ('_action_', 'export'))
+
+    def init_request(self, *args, **kwargs):
+        return EXPORT_JOB_SETTINGS.get('ENABLED', True)
+
+    def get_context(self, context):
+        # 导出菜单中显示'后台导出'按钮
+        context['export_job_url'] = self.get_admin_url('export_jobs')
+        return context
+
+    def get_result_list(self, __):
+        params = self.request.GET.copy()
+        for name, value in self.export_params:
+            if params.get(name) == 'export_job':
+                params[name] = value
+                break
+        else:
+            return __()
+
+        export_type = params.get('export_type') or params.get('file_format', '')
+        title = u'{name} {export_type}'.format(name=force_text(self.opts.verbose_name), export_type=export_type)
+        job = create_job(self.user, self.model, params.urlencode(), title=title)
+        if job is None:
+            messages.error(self.request, u'进行中的导出任务已达到{nums}个, 请等待完成或取消后再导出'.format(
+                nums=EXPORT_JOB_SETTINGS.get('MAX_ACTIVE_JOBS', 3)))
+        else:
+            messages.success(self.request, u'已创建导出任务: {title}'.format(title=title))
+        return HttpResponseRedirect(self.get_admin_url('export_jobs'))
+
+
+class ExportJobListView(views.CommAdminView):
+    """当前用户的导出任务(未过期), 进行中的任务定时查询进度"""
+
+    def get(self, request, *args, **kwargs):
+        jobs = ExportJob.objects.filter(user=request.user, expire_time__gt=datetime.now()).order_by('-add_time')[:50]
+        context = self.get_context()
+        context.update({'title': u'导出任务',
+                        'jobs': jobs,
+                        'expire_hours': EXPORT_JOB_SETTINGS.get('EXPIRE', 60 * 60 * 24) // 3600})
+        return TemplateResponse(request, 'xadmin/export_jobs.html', context)
+
+
+class ExportJobProgressView(views.CommAdminView):
+    """导出进度: ?ids=1,2,3 返回当前用户的这些任务的进度(JSON)"""
+
+    def get(self, request, *args, **kwargs):
+        try:
+            job_ids = [int(job_id) for job_id in request.GET.get('ids', '').split(',') if job_id][:50]
+        except ValueError:
+            job_ids = []
+        jobs = ExportJob.objects.filter(user=request.user, id__in=job_ids)
+        return HttpResponse(json.dumps({'jobs': [get_progress(job) for job in jobs]}),
+                            content_type='application/json')
+
+
+class ExportJobCancelView(views.CommAdminView):
+    """取消导出任务"""
+
+    def post(self, request, job_id, *args, **kwargs):
+        if cancel_job(request.user, job_id):
+            messages.success(request, u'已取消导出任务')
+        else:
+            messages.error(request, u'任务已完成或不存在')
+        return HttpResponseRedirect(self.get_admin_url('export_jobs'))
+
+
+class ExportJobDownloadView(views.CommAdminView):
+    """下载导出文件(只能下载自己的任务)"""
+
+    def get(self, request, job_id, *args, **kwargs):
+        job = ExportJob.objects.filter(id=job_id, user=request.user, status=ExportJob.STATUS_DONE,
+                                       expire_time__gt=datetime.now()).first()
+        if job is None or not job.file_name:
+            raise Http404(u'导出文件不存在或已过期')
+        response = serve(request, job.file_name, document_root=get_root(),
+                         url_prefix=EXPORT_JOB_SETTINGS.get('ACCEL_PREFIX'))
+        # 下载的文件名: 任务名称.扩展名
+        name = u'{title}{ext}'.format(title=job.title.replace(' ', '_') or job.id,
+                                      ext=os.path.splitext(job.file_name)[1])
+        response['Content-Disposition'] = "attachment; filename*=UTF-8''{name}".format(name=urlquote(name))
+        return response
+
+
+xadmin.site.register_plugin(ExportJobPlugin, views.ListAdminView)
+xadmin.site.register_view(r'^export_jobs/$', ExportJobListView, name='export_jobs')
+xadmin.site.register_view(r'^export_jobs/progress/$', ExportJobProgressView, name='export_job_progress')
+xadmin.site.register_view(r'^export_jobs/(?P<job_id>\d+)/cancel/$', ExportJobCancelView, name='export_job_cancel')
+xadmin.site.register_view(r'^export_jobs/(?P<job_id>\d+)/download/$', ExportJobDownloadView,
+                          name='export_job_download')
+
+
+class BulkImportPlugin(views.BaseAdminPlugin):
+    """
+        django-import-export导入(xadmin.plugins.importexport):
+        上传后只试导入前PREVIEW_ROWS行用于预览, 确认导入后由utils.bulk_import分批导入,
+        导入失败或中断时已导入的批次保留, 再次确认导入从断点继续
+    """
+
+    def init_request(self, *args, **kwargs):
+        return BULK_IMPORT_SETTINGS.get('ENABLED', True)
+
+    def get_context(self, context):
+        context['preview_rows'] = BULK_IMPORT_SETTINGS.get('PREVIEW_ROWS', 100)
+        return context
+
+    def get_import_dataset(self, __, input_format, tmp_storage):
+        with open_import_file(tmp_storage) as f:
+            return read_import_dataset(f, input_format, self.admin_view.from_encoding,
+                                       BULK_IMPORT_SETTINGS.get('PREVIEW_ROWS', 100))
+
+    def dry_run_import(self, __, resource, dataset, import_file):
+        # 与导入相同按批查询已存在的记录及关联对象, 不逐行执行保存
+        return BulkImporter(resource).preview(list(dataset.dict))
+
+    def process_import(self, __, resource, input_format, tmp_storage, confirm_form):
+        job, created = ImportJob.objects.get_or_create(
+            user=self.user, model=self.model._meta.label_lower,
+            file_name=confirm_form.cleaned_data['import_file_name'],
+            defaults={'original_file_name': confirm_form.cleaned_data['original_file_name'][:200],
+                      'input_format': input_format.get_title()})
+        changelist_url = self.get_model_url(self.model, 'changelist')
+        if job.status == ImportJob.STATUS_DONE:
+            messages.info(self.request, u'该文件已导入')
+            return HttpResponseRedirect(changelist_url)
+        if not claim_job(job):
+            messages.warning(self.request, u'该文件正在导入中, 已导入{nums}行'.format(nums=job.done_rows))
+            return HttpResponseRedirect(changelist_url)
+
+        job = run_import(job, resource, input_format, tmp_storage, encoding=self.admin_view.from_encoding,
+                         log=not self.admin_view.get_skip_admin_log())
+        if job.status == ImportJob.STATUS_DONE:
+            tmp_storage.remove()
+            messages.success(self.request, u'导入完成, 新增: {new}, 更新: {update}, 跳过: {skip}, 删除: {delete}'.format(
+                new=job.new_nums, update=job.update_nums, skip=job.skip_nums, delete=job.delete_nums))
+            post_import.send(sender=None, model=self.model)
+            return HttpResponseRedirect(changelist_url)
+
+        # 导入失败: 保留临时文件, 再次确认导入时从已提交的行之后继续
+        messages.error(self.request, u'导入失败: {error}; 已导入{nums}行, 修正数据后重新上传, '
+                                     u'或再次确认导入从第{line}行继续'.format(error=job.error, nums=job.done_rows,
+                                                                    line=job.done_rows + 2))
+        context = self.admin_view.get_context()
+        context.update({'title': u'导入 {name}'.format(name=force_text(self.opts.verbose_name)),
+                        'form': ImportForm(self.admin_view.get_import_formats()),
+                        'confirm_form': ConfirmImportForm(initial=confirm_form.cleaned_data),
+                        'opts': self.opts,
+                        'fields': [f.column_name for f in resource.get_user_visible_fields()]})
+        return TemplateResponse(self.request, [self.admin_view.import_template_name], context)
+
+
+xadmin.site.register_plugin(BulkImportPlugin, ImportBaseView)
@@ -0,0 +1,8 @@
+# coding: utf-8
+from django.apps import AppConfig
+
+
+class AdminToolsConfig(AppConfig):
+    """xadmin后台工具: 请求统计、后台导出任务、分批导入及相关的管理命令"""
+    name = 'admin_tools'
+    verbose_name = u'后台工具'
@@ -0,0 +1,88 @@
+# coding: utf-8
+import sys
+import time
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.urlresolvers import reverse
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.six import BytesIO
+
+from courses.models import Course
+from utils.db_pool import PooledDatabaseWrapperMixin, connection_stats, get_pool
+
+# (名称, CONN_MAX_AGE, 是否启用连接池)
+MODES = ((u'每个请求重新连接', 0, False),
+         (u'持久连接', 60, False),
+         (u'连接池', 0, True))
+
+
+class Command(BaseCommand):
+    help = u'数据库连接性能测试: 对比每个请求重新连接、持久连接及连接池时每秒处理的请求数'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=None, dest='path',
+                            help=u'请求的url路径, 默认第一个课程的详情页(首页等列表页的匿名访问有页面缓存)')
+        parser.add_argument('--requests', type=int, default=500, dest='requests',
+                            help=u'每种模式的请求数')
+
+    def handle(self, *args, **options):
+        handler = WSGIHandler()
+        connection = connections[DEFAULT_DB_ALIAS]
+        path = options['path']
+        if path is None:
+            course = Course.objects.order_by('id').first()
+            if course is None:
+                self.stderr.write(u'没有课程, 请使用 --path 指定url路径')
+                return
+            path = reverse('course:detail', kwargs={'course_id': course.id})
+        settings_dict = connection.settings_dict
+        saved = settings_dict['CONN_MAX_AGE'], settings_dict.get('POOL')
+        try:
+            for name, max_age, pool_enabled in MODES:
+                if pool_enabled and not isinstance(connection, PooledDatabaseWrapperMixin):
+                    self.stdout.write(u'{name}: ENGINE不是utils.db_pool的数据库后端, 跳过'.format(name=name))
+                    continue
+                connection.close()
+                settings_dict['CONN_MAX_AGE'] = max_age
+                settings_dict['POOL'] = dict(saved[1] or {}, ENABLED=pool_enabled)
+                connection_stats.reset()
+
+                start = time.time()
+                for i in range(options['requests']):
+                    # 经过WSGIHandler: 与uWSGI中一样在请求开始、结束时关闭过期的连接
+                    response = handler(self.environ(path), lambda status, headers: None)
+                    for chunk in response:
+                        pass
+                    response.close()
+                seconds = time.time() - start
+
+                stats = connection_stats.as_dict()
+                self.stdout.write(u'{name}: {nums}个请求 {seconds:.3f}秒 {qps:.1f}请求/秒, 新建连接{opened}次, '
+                                  u'获取连接平均{avg:.2f}毫秒'.format(name=name, nums=options['requests'],
+                                                                     seconds=seconds,
+                                                                     qps=options['requests'] / seconds,
+                                                                     opened=stats['opened_nums'],
+                                                                     avg=stats['acquire_time_avg'] * 1000))
+        finally:
+            connection.close()
+            pool = get_pool(connection) if isinstance(connection, PooledDatabaseWrapperMixin) else None
+            if pool is not None:
+                pool.clear()
+            settings_dict['CONN_MAX_AGE'], settings_dict['POOL'] = saved
+
+    def environ(self, path):
+        return {'REQUEST_METHOD': 'GET',
+                'PATH_INFO': path,
+                'QUERY_STRING': '',
+                'SERVER_NAME': 'localhost',
+                'SERVER_PORT': '80',
+                'SERVER_PROTOCOL': 'HTTP/1.1',
+                'REMOTE_ADDR': '127.0.0.1',
+                'wsgi.version': (1, 0),
+                'wsgi.url_scheme': 'http',
+                'wsgi.input': BytesIO(),
+                'wsgi.errors': sys.stderr,
+                'wsgi.multithread': False,
+                'wsgi.multiprocess': True,
+                'wsgi.run_once': False}
@@ -0,0 +1,101 @@
+# coding: utf-8
+import time
+
+from django.contrib.admin.models import LogEntry, ADDITION, CHANGE
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils.encoding import force_text
+from import_export.formats.base_formats import CSV
+from import_export.results import RowResult
+from import_export.tmp_storages import TempFolderStorage
+
+from courses.adminx import LessonImportResource
+from courses.models import Course, Lesson
+from users.models import ImportJob, UserProfile
+from utils.bulk_import import claim_job, open_import_file, read_import_dataset, run_import
+
+# 测试数据的名称前缀(结束后删除)
+NAME_PREFIX = 'bench_import_'
+ADMIN_USERNAME = 'bench_import_admin'
+
+
+class Command(BaseCommand):
+    help = u'xadmin导入性能测试: 以生成的章节csv(部分行更新已存在的章节)对比原导入(整个文件一个事务逐行保存)与分批导入的耗时'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', default='1000,10000', dest='rows',
+                            help=u'导入的行数, 以逗号分隔')
+        parser.add_argument('--update-ratio', type=float, default=0.2, dest='update_ratio',
+                            help=u'更新已存在章节的行所占比例')
+        parser.add_argument('--batch-size', type=int, default=1000, dest='batch_size',
+                            help=u'分批导入每批的行数')
+        parser.add_argument('--legacy-max-rows', type=int, default=50000, dest='legacy_max_rows',
+                            help=u'行数超过该值时不执行原导入')
+
+    def handle(self, *args, **options):
+        admin = UserProfile.objects.create(username=ADMIN_USERNAME, is_staff=True, is_superuser=True)
+        course = Course.objects.create(name=NAME_PREFIX + 'course', degree='cj', image='bench_import.png')
+        try:
+            for nums in sorted(int(nums) for nums in options['rows'].split(',')):
+                update_nums = int(nums * options['update_ratio'])
+                for name, import_func in ((u'原导入', self.legacy_import), (u'分批导入', self.bulk_import)):
+                    if import_func == self.legacy_import and nums > options['legacy_max_rows']:
+                        self.stdout.write(u'{rows}行 {name}: 跳过'.format(rows=nums, name=name))
+                        continue
+                    tmp_storage = self.create_csv(course, nums, update_nums)
+                    start = time.time()
+                    import_func(admin, tmp_storage, options)
+                    seconds = time.time() - start
+                    tmp_storage.remove()
+                    self.check_result(course, nums, update_nums)
+                    self.stdout.write(u'{rows}行(更新{update}行) {name}: {seconds:.2f}秒 {speed:.0f}行/秒'.format(
+                        rows=nums, update=update_nums, name=name, seconds=seconds, speed=nums / seconds))
+        finally:
+            Lesson.objects.filter(course=course).delete()
+            course.delete()
+            # 导入任务及日志随用户删除
+            admin.delete()
+
+    def create_csv(self, course, nums, update_nums):
+        """重新生成测试章节: update_nums个已存在的章节, csv中更新这些章节并新增其余行"""
+        Lesson.objects.filter(course=course).delete()
+        Lesson.objects.bulk_create([Lesson(name=u'{prefix}{n}'.format(prefix=NAME_PREFIX, n=i), course=course)
+                                    for i in range(update_nums)])
+        lesson_ids = list(Lesson.objects.filter(course=course).order_by('id').values_list('id', flat=True))
+
+        tmp_storage = TempFolderStorage()
+        with tmp_storage.open(mode='wb') as f:
+            f.write(b'id,name,course,add_time\n')
+            for i in range(nums):
+                lesson_id = lesson_ids[i] if i < len(lesson_ids) else ''
+                f.write(u'{id},{prefix}{n} 第{n}章 导入测试,{course},2017-10-01 12:00:00\n'.format(
+                    id=lesson_id, prefix=NAME_PREFIX, n=i, course=course.id).encode('utf-8'))
+        return tmp_storage
+
+    def check_result(self, course, nums, update_nums):
+        imported = Lesson.objects.filter(course=course).count()
+        if imported != nums:
+            self.stderr.write(u'导入后的章节数{imported}与行数{nums}不一致'.format(imported=imported, nums=nums))
+
+    def legacy_import(self, admin, tmp_storage, options):
+        """原ImportProcessView: 读取整个文件, 一个事务中逐行保存, 每行一条LogEntry"""
+        with open_import_file(tmp_storage) as f:
+            dataset = read_import_dataset(f, CSV())
+        content_type_id = ContentType.objects.get_for_model(Lesson).pk
+        with transaction.atomic():
+            result = LessonImportResource().import_data(dataset, dry_run=False, raise_errors=True)
+            for row in result:
+                LogEntry.objects.log_action(
+                    user_id=admin.pk, content_type_id=content_type_id, object_id=row.object_id,
+                    object_repr=force_text(row.object_repr),
+                    action_flag=ADDITION if row.import_type == RowResult.IMPORT_TYPE_NEW else CHANGE,
+                    change_message='%s through import_export' % row.import_type)
+
+    def bulk_import(self, admin, tmp_storage, options):
+        job = ImportJob.objects.create(user=admin, model=Lesson._meta.label_lower, file_name=tmp_storage.name,
+                                       original_file_name='benchmark.csv', input_format='csv')
+        claim_job(job)
+        job = run_import(job, LessonImportResource(), CSV(), tmp_storage, batch_size=options['batch_size'])
+        if job.status != ImportJob.STATUS_DONE:
+            self.stderr.write(u'分批导入失败: {error}'.format(error=job.error))
@@ -0,0 +1,19 @@
+# coding: utf-8
+from django.core.management.base import BaseCommand
+
+from utils.export_jobs import export_job_runner, purge_export_jobs
+
+
+class Command(BaseCommand):
+    help = u'删除过期的导出任务及导出文件(可由cron定期执行)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--run-due', action='store_true', dest='run_due', default=False,
+                            help=u'同时执行未执行的导出任务(如导出线程未启动)')
+
+    def handle(self, *args, **options):
+        if options['run_due']:
+            nums = export_job_runner.run_due(limit=100)
+            self.stdout.write(u'完成{nums}个导出任务'.format(nums=nums))
+        nums = purge_export_jobs()
+        self.stdout.write(u'删除{nums}个过期的导出任务'.format(nums=nums))
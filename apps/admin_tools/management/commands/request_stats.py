@@ -0,0 +1,31 @@
+# coding: utf-8
+from django.core.management.base import BaseCommand
+
+from utils.request_stats import get_top_stats, request_stats
+
+
+class Command(BaseCommand):
+    help = u'输出各view的请求统计(所有uWSGI进程写入缓存的统计): SQL数量、SQL耗时、模板渲染耗时及总耗时'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--order', default='wall_time_avg', dest='order',
+                            choices=['wall_time_avg', 'wall_time_max', 'queries_avg', 'queries_max',
+                                     'db_time_avg', 'requests'],
+                            help=u'排序字段(降序)')
+        parser.add_argument('--limit', type=int, default=20, dest='limit',
+                            help=u'输出的view数量')
+        parser.add_argument('--clear', action='store_true', dest='clear', default=False,
+                            help=u'清除统计')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            request_stats.clear()
+            self.stdout.write(u'已清除请求统计')
+            return
+
+        self.stdout.write(u'{:<40} {:>8} {:>10} {:>10} {:>12} {:>12} {:>12} {:>12}'.format(
+            u'view', u'请求数', u'平均SQL数', u'最大SQL数', u'平均SQL(ms)', u'平均模板(ms)', u'平均耗时(ms)', u'最大耗时(ms)'))
+        for row in get_top_stats(options['order'], options['limit']):
+            self.stdout.write(u'{:<40} {:>8} {:>10.1f} {:>10} {:>12.1f} {:>12.1f} {:>12.1f} {:>12.1f}'.format(
+                row['view'], row['requests'], row['queries_avg'], row['queries_max'], row['db_time_avg'] * 1000,
+                row['template_time_avg'] * 1000, row['wall_time_avg'] * 1000, row['wall_time_max'] * 1000))
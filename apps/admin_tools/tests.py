@@ -0,0 +1,127 @@
+# coding: utf-8
+"""
+    后台分批导入(utils.bulk_import): 每批的新增、更新、跳过、删除, 出错后保留已提交的批次并从断点继续
+"""
+from django.contrib.admin.models import LogEntry
+from django.test import TestCase, override_settings
+from import_export import resources
+from import_export.formats import base_formats
+from import_export.tmp_storages import TempFolderStorage
+
+from courses.models import Course, Lesson
+from courses.tests import TEST_CACHES
+from organization.models import CityDict, CourseOrg, Teacher
+from users.models import ImportJob, UserProfile
+from utils import bulk_import
+
+
+class LessonResource(resources.ModelResource):
+    """delete列为1的行删除对应的章节, 未修改的行跳过"""
+
+    def for_delete(self, row, instance):
+        return row.get('delete') == u'1'
+
+    class Meta:
+        model = Lesson
+        fields = ('id', 'name', 'course')
+        skip_unchanged = True
+
+
+@override_settings(CACHES=TEST_CACHES)
+class BulkImportTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        city = CityDict.objects.create(name=u'北京', desc=u'北京')
+        org = CourseOrg.objects.create(name=u'机构', desc=u'机构', image='org/x.jpg', address=u'地址', city=city)
+        teacher = Teacher.objects.create(name=u'讲师', org=org, work_company=u'公司', work_position=u'职位',
+                                         points=u'特点')
+        cls.courses = [Course.objects.create(name=u'课程%d' % i, desc=u'课程描述', degree='cj', image='course/x.jpg',
+                                             course_org=org, teacher=teacher)
+                       for i in range(2)]
+        cls.user = UserProfile.objects.create(username='admin', is_staff=True, is_superuser=True)
+
+    def setUp(self):
+        self.storage = TempFolderStorage()
+
+    def tearDown(self):
+        self.storage.remove()
+
+    def write_csv(self, rows):
+        lines = [u'id,name,course,delete'] + [u','.join(row) for row in rows]
+        self.storage.save((u'\n'.join(lines) + u'\n').encode('utf-8'), mode='wb')
+
+    def run_import(self, job, batch_size):
+        self.assertTrue(bulk_import.claim_job(job))
+        return bulk_import.run_import(job, LessonResource(), base_formats.CSV(), self.storage, batch_size=batch_size)
+
+    def create_job(self):
+        return ImportJob.objects.create(user=self.user, model='courses.lesson', file_name=self.storage.name,
+                                        original_file_name='lessons.csv')
+
+    def test_import_in_batches(self):
+        course0, course1 = [str(course.id) for course in self.courses]
+        renamed = Lesson.objects.create(name=u'旧章节', course=self.courses[0])
+        unchanged = Lesson.objects.create(name=u'章节', course=self.courses[0])
+        removed = Lesson.objects.create(name=u'删除', course=self.courses[1])
+        # 计数字段由post_bulk_import校正
+        Course.objects.update(lesson_nums=0)
+        self.write_csv([
+            [str(renamed.id), u'新章节', course1, u''],
+            [str(unchanged.id), u'章节', course0, u''],
+            [u'', u'新增1', course0, u''],
+            [str(removed.id), u'删除', course1, u'1'],
+            [u'', u'新增2', course1, u''],
+            [u'', u'新增3', course1, u''],
+            [u'', u'新增4', course1, u''],
+        ])
+        job = self.run_import(self.create_job(), batch_size=3)
+
+        self.assertEqual((job.status, job.done_rows), (ImportJob.STATUS_DONE, 7))
+        self.assertEqual((job.new_nums, job.update_nums, job.skip_nums, job.delete_nums), (4, 1, 1, 1))
+        renamed.refresh_from_db()
+        self.assertEqual((renamed.name, renamed.course_id), (u'新章节', self.courses[1].id))
+        self.assertFalse(Lesson.objects.filter(id=removed.id).exists())
+        self.assertEqual(Lesson.objects.filter(name__startswith=u'新增').count(), 4)
+        self.assertEqual([Course.objects.get(id=course.id).lesson_nums for course in self.courses], [2, 4])
+        # 每批一条LogEntry
+        self.assertEqual([entry.object_repr for entry in LogEntry.objects.order_by('id')],
+                         [u'lessons.csv 第2-4行', u'lessons.csv 第5-7行', u'lessons.csv 第8-8行'])
+
+    def test_resume_after_error(self):
+        course0 = str(self.courses[0].id)
+        rows = [[u'', u'章节%d' % i, course0, u''] for i in range(5)]
+        rows[3][2] = u'99999'
+        self.write_csv(rows)
+        job = self.run_import(self.create_job(), batch_size=2)
+
+        # 第5行出错, 所在的批次(第4-5行)回滚, 已提交的第一批保留
+        self.assertEqual((job.status, job.done_rows, job.new_nums), (ImportJob.STATUS_FAILED, 2, 2))
+        self.assertIn(u'第5行', job.error)
+        self.assertEqual(list(Lesson.objects.order_by('id').values_list('name', flat=True)), [u'章节0', u'章节1'])
+        self.assertEqual(Course.objects.get(id=self.courses[0].id).lesson_nums, 2)
+
+        # 修正文件后重新导入: 从 done_rows + 2 行(第4行)继续, 已导入的行不再导入
+        rows[0][1] = u'不应导入'
+        rows[3][2] = course0
+        self.write_csv(rows)
+        LogEntry.objects.all().delete()
+        job = self.run_import(job, batch_size=2)
+
+        self.assertEqual((job.status, job.done_rows, job.new_nums), (ImportJob.STATUS_DONE, 5, 5))
+        self.assertEqual(list(Lesson.objects.order_by('id').values_list('name', flat=True)),
+                         [u'章节%d' % i for i in range(5)])
+        self.assertEqual([entry.object_repr for entry in LogEntry.objects.order_by('id')],
+                         [u'lessons.csv 第4-5行', u'lessons.csv 第6-6行'])
+        self.assertEqual(Course.objects.get(id=self.courses[0].id).lesson_nums, 5)
+
+    def test_claimed_job(self):
+        self.write_csv([[u'', u'章节', str(self.courses[0].id), u'']])
+        job = self.create_job()
+        self.assertTrue(bulk_import.claim_job(job))
+        # 正在其他请求中导入
+        self.assertFalse(bulk_import.claim_job(job))
+        job = bulk_import.run_import(job, LessonResource(), base_formats.CSV(), self.storage)
+        self.assertEqual(job.status, ImportJob.STATUS_DONE)
+        # 已完成的任务不再导入
+        self.assertFalse(bulk_import.claim_job(job))
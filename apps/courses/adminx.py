@@ -1,9 +1,28 @@
 # coding: utf-8
 import xadmin
+from import_export import resources
 
 from models import Course, BannerCourse, Lesson, Video, CourseResource
 
 
+# 课程、章节、视频的导入(xadmin.plugins.importexport, 由utils.bulk_import分批导入), 按id更新已存在的记录
+class CourseImportResource(resources.ModelResource):
+    class Meta:
+        model = Course
+        # 计数字段由signals及utils.aggregates维护
+        exclude = ('students', 'fav_nums', 'click_nums', 'lesson_nums')
+
+
+class LessonImportResource(resources.ModelResource):
+    class Meta:
+        model = Lesson
+
+
+class VideoImportResource(resources.ModelResource):
+    class Meta:
+        model = Video
+
+
 class CourseAdmin(object):
     list_display = ['name', 'desc', 'detail', 'degree', 'learn_times', 'students', 'fav_nums',
                     'image', 'click_nums', 'add_time']
@@ -11,9 +30,10 @@ class CourseAdmin(object):
     search_fields = list_display[:]
     search_fields.remove('add_time')
     ordering = ['-click_nums']
-    readonly_fields = ['click_nums', 'students']
+    readonly_fields = ['click_nums', 'students', 'lesson_nums']
     exclude = ['fav_nums']
     style_fields = {'detail': 'ueditor'}
+    import_export_args = {'import_resource_class': CourseImportResource}
 
     def queryset(self):
         qs = super(CourseAdmin, self).queryset()
@@ -28,7 +48,7 @@ class BannerCourseAdmin(object):
     search_fields = list_display[:]
     search_fields.remove('add_time')
     ordering = ['-click_nums']
-    readonly_fields = ['click_nums', 'students']
+    readonly_fields = ['click_nums', 'students', 'lesson_nums']
 
     def queryset(self):
         qs = super(BannerCourseAdmin, self).queryset()
@@ -40,12 +60,14 @@ class LessonAdmin(object):
     list_display = ['name', 'course', 'add_time']
     list_filter = ['name', 'course__name', 'add_time']
     search_fields = ['name', 'course__name']
+    import_export_args = {'import_resource_class': LessonImportResource}
 
 
 class VideoAdmin(object):
     list_display = ['name', 'lesson', 'add_time']
     list_filter = ['name', 'lesson__name', 'add_time']
     search_fields = ['name', 'lesson__name']
+    import_export_args = {'import_resource_class': VideoImportResource}
 
 
 class CourseResourceAdmin(object):
@@ -5,3 +5,7 @@ from django.apps import AppConfig
 class CoursesConfig(AppConfig):
     name = 'courses'
     verbose_name = u'课程'
+
+    def ready(self):
+        # 注册signal receivers
+        from . import signals
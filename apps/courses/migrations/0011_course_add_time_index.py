@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9 on 2026-10-18 23:51
+from __future__ import unicode_literals
+
+import datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0010_course_lesson_nums'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='course',
+            name='add_time',
+            field=models.DateTimeField(db_index=True, default=datetime.datetime.now, verbose_name='\u6dfb\u52a0\u65f6\u95f4'),
+        ),
+    ]
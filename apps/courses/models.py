@@ -28,7 +28,8 @@ class Course(models.Model):
     click_nums = models.IntegerField(default=0, verbose_name=u'点击数')
     category = models.CharField(max_length=20, verbose_name=u'课程类别', default=u'计算机技术')
     tag = models.CharField(default='', verbose_name=u'课程标签', max_length=10)
-    add_time = models.DateTimeField(default=datetime.now, verbose_name=u'添加时间')
+    lesson_nums = models.IntegerField(default=0, verbose_name=u'章节数')
+    add_time = models.DateTimeField(default=datetime.now, db_index=True, verbose_name=u'添加时间')
 
     class Meta:
         verbose_name = u'课程'
@@ -37,11 +38,6 @@ class Course(models.Model):
     def __unicode__(self):
         return self.name
 
-    @property
-    def lesson_nums(self):
-        """获取课程章节数"""
-        return self.lesson_set.all().count()
-
     @property
     def learning_user_courses(self):
         """获取该课程下的 用户-课程"""
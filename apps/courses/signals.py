@@ -0,0 +1,81 @@
+# coding: utf-8
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import BannerCourse, Course, Lesson, Video
+from utils.aggregates import reconcile_aggregates, update_course_lesson_nums, update_org_course_nums, \
+    update_org_student_nums, update_teacher_course_stats
+from utils.bulk_import import post_bulk_import
+from utils.page_cache import invalidate_tags, TAG_COURSE
+from utils.syllabus import invalidate_all_syllabus, invalidate_course_syllabus
+
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+def invalidate_lesson_syllabus(sender, instance, **kwargs):
+    """章节保存、删除后清除课程大纲缓存, 更新课程章节数"""
+    invalidate_course_syllabus(instance.course_id)
+    update_course_lesson_nums([instance.course_id])
+
+
+@receiver(post_save, sender=Video)
+@receiver(post_delete, sender=Video)
+def invalidate_video_syllabus(sender, instance, **kwargs):
+    """视频保存、删除后清除课程大纲缓存"""
+    # 章节被级联删除时, 由章节的post_delete清除
+    course_ids = Lesson.objects.filter(id=instance.lesson_id).values_list('course_id', flat=True)
+    for course_id in course_ids:
+        invalidate_course_syllabus(course_id)
+
+
+# BannerCourse为Course的代理模型, 其保存、删除时sender为BannerCourse
+@receiver(pre_save, sender=Course)
+@receiver(pre_save, sender=BannerCourse)
+def remember_course_relations(sender, instance, raw=False, **kwargs):
+    """记录修改前的课程机构及讲师, 用于更新原机构、原讲师的计数"""
+    instance._old_relations = None
+    if instance.pk and not raw:
+        instance._old_relations = Course.objects.filter(pk=instance.pk) \
+                                                .values_list('course_org_id', 'teacher_id').first()
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_save, sender=BannerCourse)
+@receiver(post_delete, sender=Course)
+@receiver(post_delete, sender=BannerCourse)
+def update_course_aggregates(sender, instance, raw=False, **kwargs):
+    """课程保存、删除后更新机构课程数、讲师课程数及热门课程"""
+    if raw:
+        return
+    old_org_id, old_teacher_id = getattr(instance, '_old_relations', None) or (None, None)
+    org_ids = [instance.course_org_id, old_org_id]
+    update_org_course_nums(org_ids)
+    # 课程更换了机构, 其学习人数随之转移
+    if old_org_id != instance.course_org_id:
+        update_org_student_nums(org_ids)
+    update_teacher_course_stats([instance.teacher_id, old_teacher_id])
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_save, sender=BannerCourse)
+@receiver(post_delete, sender=Course)
+@receiver(post_delete, sender=BannerCourse)
+def invalidate_course_pages(sender, **kwargs):
+    """课程保存、删除后清除首页、列表页的缓存"""
+    invalidate_tags(TAG_COURSE)
+
+
+@receiver(post_bulk_import, sender=Course)
+@receiver(post_bulk_import, sender=BannerCourse)
+@receiver(post_bulk_import, sender=Lesson)
+@receiver(post_bulk_import, sender=Video)
+def refresh_after_bulk_import(sender, **kwargs):
+    """后台批量导入课程、章节、视频后(不触发post_save)校正计数字段, 清除课程大纲及页面缓存"""
+    if sender is Lesson:
+        reconcile_aggregates(['Course.lesson_nums'])
+    elif sender is not Video:
+        reconcile_aggregates(['CourseOrg.course_nums', 'CourseOrg.student_nums', 'Teacher.course_nums',
+                              'Teacher.hot_course'])
+    if sender in (Lesson, Video):
+        invalidate_all_syllabus()
+    invalidate_tags(TAG_COURSE)
@@ -1,3 +1,163 @@
-from django.test import TestCase
+# coding: utf-8
+"""
+    首页、课程列表、课程详情的SQL数量
 
-# Create your tests here.
+    运行测试时 REQUEST_STATS_SETTINGS['RAISE_ON_BUDGET'] 为True, SQL数量超过 QUERY_BUDGETS 时
+    RequestStatsMiddleware 抛出QueryBudgetExceeded使测试失败
+
+    测试使用LocMemCache: 默认的FileBasedCache目录与线上相同, cache.clear()会清空线上的缓存
+"""
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.test import TestCase, override_settings
+
+from courses.models import Course, CourseResource, Lesson, Video
+from operation.models import UserCourse, UserFavorite
+from organization.models import CityDict, CourseOrg, Teacher
+from search.backends import get_search_backend
+from users.models import Banner, UserProfile
+from utils.request_stats import REQUEST_STATS_SETTINGS, QueryBudgetExceeded, get_all_stats, get_query_budget, \
+    request_stats
+
+TEST_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class QueryBudgetTestCase(TestCase):
+    """多个机构、讲师、课程、学习用户的测试数据(数据较少时看不出N+1查询)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        city = CityDict.objects.create(name=u'北京', desc=u'北京')
+        cls.orgs = [CourseOrg.objects.create(name=u'机构%d' % i, desc=u'机构', image='org/x.jpg', address=u'地址',
+                                             city=city, category='pxjg' if i % 2 else 'gx')
+                    for i in range(3)]
+        cls.teachers = [Teacher.objects.create(name=u'讲师%d' % i, org=org, work_company=u'公司',
+                                               work_position=u'职位', points=u'特点')
+                        for i, org in enumerate(cls.orgs)]
+        cls.courses = []
+        for i in range(12):
+            course = Course.objects.create(name=u'课程%d' % i, desc=u'课程描述', degree='cj', image='course/x.jpg',
+                                           click_nums=i, is_banner=i < 3, course_org=cls.orgs[i % 3],
+                                           teacher=cls.teachers[i % 3], tag='python' if i % 2 else 'django')
+            for j in range(3):
+                lesson = Lesson.objects.create(name=u'章节%d' % j, course=course)
+                for k in range(2):
+                    Video.objects.create(name=u'视频%d' % k, lesson=lesson, url='http://example.com/v.mp4')
+            CourseResource.objects.create(name=u'资料', course=course, download='course/resource/x.zip')
+            cls.courses.append(course)
+        for i in range(3):
+            Banner.objects.create(title=u'轮播图%d' % i, image='banner/x.jpg', url='http://example.com/', index=i)
+
+        cls.users = []
+        for i in range(5):
+            user = UserProfile(username='user%d' % i, email='user%d@example.com' % i)
+            user.set_password('password')
+            user.save()
+            for course in cls.courses[i:i + 4]:
+                UserCourse.objects.create(user=user, course=course)
+            cls.users.append(user)
+        UserFavorite.objects.create(user=cls.users[0], fav_id=cls.courses[0].id, fav_type=1)
+        UserFavorite.objects.create(user=cls.users[0], fav_id=cls.orgs[0].id, fav_type=2)
+
+    def setUp(self):
+        # 缓存为空时的SQL数量最多
+        cache.clear()
+        request_stats.reset()
+        self.assertTrue(REQUEST_STATS_SETTINGS.get('RAISE_ON_BUDGET'))
+
+    def assertWithinBudget(self, view_name, *args, **kwargs):
+        """请求view(超过QUERY_BUDGETS时RequestStatsMiddleware抛出QueryBudgetExceeded)"""
+        self.assertIsNotNone(get_query_budget(view_name))
+        query = kwargs.pop('query', '')
+        response = self.client.get(reverse(view_name, args=args) + query)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+
+class CourseQueryBudgetTest(QueryBudgetTestCase):
+
+    def test_index(self):
+        self.assertWithinBudget('index')
+
+    def test_index_login(self):
+        self.client.login(username='user0', password='password')
+        self.assertWithinBudget('index')
+
+    def test_course_list(self):
+        self.assertWithinBudget('course:course_list')
+        self.assertWithinBudget('course:course_list', query='?sort=students')
+        self.assertWithinBudget('course:course_list', query='?sort=hot&keywords=' + u'课程'.encode('utf-8'))
+
+    def test_course_detail(self):
+        self.assertWithinBudget('course:detail', self.courses[0].id)
+
+    def test_course_detail_login(self):
+        self.client.login(username='user0', password='password')
+        self.assertWithinBudget('course:detail', self.courses[0].id)
+
+
+class RequestStatsTest(QueryBudgetTestCase):
+
+    def test_budget_exceeded(self):
+        budgets = REQUEST_STATS_SETTINGS['QUERY_BUDGETS']
+        budget = budgets['course:detail']
+        budgets['course:detail'] = 1
+        try:
+            self.assertRaises(QueryBudgetExceeded, self.assertWithinBudget, 'course:detail', self.courses[0].id)
+        finally:
+            budgets['course:detail'] = budget
+
+    def test_no_budget(self):
+        """QUERY_BUDGETS中为None的view不限制SQL数量"""
+        budgets = REQUEST_STATS_SETTINGS['QUERY_BUDGETS']
+        budget = budgets['course:detail']
+        budgets['course:detail'] = None
+        try:
+            response = self.client.get(reverse('course:detail', args=[self.courses[0].id]))
+            self.assertEqual(response.status_code, 200)
+        finally:
+            budgets['course:detail'] = budget
+
+    def test_middleware_records_stats(self):
+        self.assertWithinBudget('course:detail', self.courses[0].id)
+        self.assertWithinBudget('course:detail', self.courses[1].id)
+        stats = dict((row['view'], row) for row in get_all_stats())['course:detail']
+        self.assertEqual(stats['requests'], 2)
+        self.assertGreater(stats['queries'], 0)
+        self.assertGreaterEqual(stats['queries_max'], stats['queries_avg'])
+        self.assertGreater(stats['db_time'], 0)
+        self.assertGreater(stats['template_time'], 0)
+        self.assertGreaterEqual(stats['wall_time'], stats['template_time'])
+
+
+class CourseSearchTest(QueryBudgetTestCase):
+    """搜索结果超过MAX_RESULTS时只返回相关度最高的部分, 页面显示为 'N+'"""
+
+    def setUp(self):
+        super(CourseSearchTest, self).setUp()
+        self.backend = get_search_backend()
+        self.max_results = self.backend.max_results
+        self.backend.max_results = 5
+
+    def tearDown(self):
+        self.backend.max_results = self.max_results
+
+    def test_truncated(self):
+        courses, truncated = self.backend.search(Course.objects.all(), u'课程')
+        self.assertTrue(truncated)
+        self.assertEqual(courses.count(), 5)
+
+        courses, truncated = self.backend.search(Course.objects.all(), u'课程11')
+        self.assertFalse(truncated)
+        self.assertEqual([course.id for course in courses], [self.courses[11].id])
+
+    def test_course_list(self):
+        response = self.assertWithinBudget('course:course_list', query='?keywords=' + u'课程'.encode('utf-8'))
+        self.assertTrue(response.context['search_truncated'])
+        self.assertContains(response, u'共<span class="key">5+</span>门课程')
+
+    def test_org_list(self):
+        response = self.assertWithinBudget('org:org_list', query='?keywords=' + u'机构'.encode('utf-8'))
+        self.assertFalse(response.context['search_truncated'])
+        self.assertContains(response, u'共<span class="key">3</span>家')
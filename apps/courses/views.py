@@ -1,15 +1,21 @@
 # coding: utf-8
 
 from django.http import HttpResponse
-from django.db.models import Q
 from django.shortcuts import render
+from django.utils.decorators import method_decorator
 from django.views.generic import View
-from pure_pagination import Paginator, PageNotAnInteger
 
 from .models import Course, CourseResource, Video
-from operation.models import UserFavorite, CourseComments, UserCourse
-from utils.function import order_by_occur_nums
+from operation.models import CourseComments
+from search.backends import get_search_backend
+from utils.click_counter import click_counter
+from utils.course_relation import get_top_related_courses
+from utils.enrollment import enroll
+from utils.favorite import get_fav_status, FAV_TYPE_COURSE, FAV_TYPE_ORG
+from utils.keyset_pagination import paginate
 from utils.mixin_utils import LoginRequiredMixin
+from utils.page_cache import cache_anonymous_page, get_fragment, TAG_COURSE, TAG_ORG
+from utils.syllabus import get_course_syllabus
 from Lighten.settings import PAGINATION_SETTINGS
 
 
@@ -22,67 +28,46 @@ def get_related_courses(request, course):
     """
 
     # 推荐功能: 该课程的同学还学过..
-    # 找出该课程所有记录
-    user_coursers = UserCourse.objects.filter(course=course)
-    # 获取该课程记录的所有学生
-    user_ids = [user_courser.user.id for user_courser in user_coursers]
-    # 这些学生的所有课程记录
-    all_user_courses = UserCourse.objects.filter(user_id__in=user_ids)
-    # 取出所有课程id(该课程的同学还学过的所有课程id)
-    # 如 [1, 1, 2, 2, 2]
-    course_ids = [user_course.course.id for user_course in all_user_courses]
-    # 再按照课程id的重复次数进行排序
-    course_ids = order_by_occur_nums(course_ids)
-    # 按照排序后的课程进行逐个获取, 并依次加入relate_courses
-    relate_courses = []
-    for relate_course_id in course_ids:
-        relate_course = Course.objects.filter(id=relate_course_id).exclude(id=course.id)
-        # 取Top5
-        if relate_course and len(relate_courses) <= 5:
-            relate_courses.append(relate_course[0])
-    return relate_courses
+    # 从课程关联索引中按共同学习人数取Top5, 索引由UserCourse的创建增量维护
+    # (已有数据由迁移operation 0008建立, 全量重建: python manage.py rebuild_related_courses)
+    return get_top_related_courses(course.id, nums=5)
 
 
 class CourseListView(View):
     """课程列表"""
 
+    @method_decorator(cache_anonymous_page(tags=[TAG_COURSE, TAG_ORG], query_params=['sort', 'page', 'cursor', 'keywords']))
     def get(self, request):
         # 最新公开课
         all_courses = Course.objects.order_by('-add_time').all()
         # 热门课程推荐
-        hot_courses = Course.objects.order_by('-click_nums').all()[:3]
+        hot_courses = get_fragment('hot_courses', [TAG_COURSE], lambda: click_counter.top(Course.objects.all(), 3))
 
         # 课程搜索功能
         search_keywords = request.GET.get('keywords', '')
+        search_truncated = False
         if search_keywords:
-            all_courses = all_courses.filter(Q(name__icontains=search_keywords) |
-                                             Q(desc__icontains=search_keywords) |
-                                             Q(you_need_know__icontains=search_keywords) |
-                                             Q(teacher_tell__icontains=search_keywords) |
-                                             Q(degree__icontains=search_keywords) |
-                                             Q(category__icontains=search_keywords) |
-                                             Q(tag__icontains=search_keywords))
+            # 倒排索引搜索, 结果按相关度排序(超过MAX_RESULTS时只显示相关度最高的部分)
+            all_courses, search_truncated = get_search_backend().search(all_courses, search_keywords)
 
         sort = request.GET.get('sort', '')
+        ordering = ['-add_time', '-id']
 
         # 根据sort: 'students' or 'courses'进行排序
         if sort:
             sort_dict = {'students': '-students',
                          'hot': '-click_nums'}
             all_courses = all_courses.order_by(sort_dict[sort])
+            ordering = [sort_dict[sort], '-id']
 
-        # 对所有课程进行分页
+        # 对所有课程进行分页(按搜索相关度排序时使用页码分页)
         per_page = PAGINATION_SETTINGS.get('COURSE_NUM_PER_PAGE', 6)
-        paginator = Paginator(all_courses, per_page, request=request)
-        try:
-            per_page = int(request.GET.get('page', 1))
-        except PageNotAnInteger:
-            per_page = 1
-        # 分页后的课程机构
-        course_paginator = paginator.page(per_page)
+        course_paginator = paginate(request, all_courses, per_page,
+                                    ordering=None if search_keywords and not sort else ordering, cache_count=True)
 
         return render(request, 'course-list.html', {'hot_courses': hot_courses,
                                                     'course_paginator': course_paginator,
+                                                    'search_truncated': search_truncated,
                                                     'sort': sort})
 
 
@@ -92,19 +77,14 @@ class CourseDetailView(View):
     def get(self, request, course_id):
         course = Course.objects.get(id=int(course_id))
 
-        # 课程点击数+1
-        course.click_nums += 1
-        course.save()
-
-        # 获取该课程的收藏状态
-        logined = request.user.is_authenticated()
-        course_has_fav = True if logined and UserFavorite.objects.filter(user=request.user,
-                                                                         fav_id=course.id,
-                                                                         fav_type=1) else False
-        # 获取该课程机构的收藏状态
-        org_has_fav = True if logined and UserFavorite.objects.filter(user=request.user,
-                                                                      fav_id=course.course_org.id,
-                                                                      fav_type=2) else False
+        # 课程点击数+1 (写缓冲, 定期批量写入)
+        click_counter.incr(course)
+
+        # 获取该课程及其课程机构的收藏状态(一次查询)
+        favs = get_fav_status(request.user, [(FAV_TYPE_COURSE, course.id), (FAV_TYPE_ORG, course.course_org_id)])
+        course_has_fav = (FAV_TYPE_COURSE, course.id) in favs
+        org_has_fav = (FAV_TYPE_ORG, course.course_org_id) in favs
+
         # 获取tag相同的最高点击课程(作为相关课程推荐)
         tag = course.tag
         if tag:
@@ -124,11 +104,7 @@ class CourseInfoView(LoginRequiredMixin, View):
         course = Course.objects.get(id=int(course_id))
 
         # 记录用户学习的课程: 关联用户-课程表
-        # 查询用户是否已经关联了该课程
-        user_course_record = UserCourse.objects.filter(user=request.user, course=course)
-        if not user_course_record:
-            user_course_record = UserCourse(user=request.user, course=course)
-            user_course_record.save()
+        if enroll(request, course):
             request.user.log('开始学习课程: {}'.format(course.name))
         request.user.log('继续学习课程: {}'.format(course.name))
 
@@ -139,7 +115,8 @@ class CourseInfoView(LoginRequiredMixin, View):
 
         return render(request, 'course-video.html', {'course': course,
                                                      'course_resources': course_resources,
-                                                     'relate_courses': relate_courses})
+                                                     'relate_courses': relate_courses,
+                                                     'syllabus': get_course_syllabus(course.id)})
 
 
 class CourseCommentView(LoginRequiredMixin, View):
@@ -193,15 +170,11 @@ class CourseVideoView(View):
 
     def get(self, request, video_id):
         # 获取video及其course
-        video = Video.objects.get(id=int(video_id))
+        video = Video.objects.select_related('lesson__course').get(id=int(video_id))
         course = video.lesson.course
 
         # 记录用户学习的课程: 关联用户-课程表
-        # 查询用户是否已经关联了该课程
-        user_course_record = UserCourse.objects.filter(user=request.user, course=course)
-        if not user_course_record:
-            user_course_record = UserCourse(user=request.user, course=course)
-            user_course_record.save()
+        enroll(request, course)
 
         # 课程推荐(该课的同学还学过)
         relate_courses = get_related_courses(request, course)
@@ -212,4 +185,5 @@ class CourseVideoView(View):
         return render(request, 'course-play.html', {'course': course,
                                                     'course_resources': course_resources,
                                                     'relate_courses': relate_courses,
-                                                    'video': video})
+                                                    'video': video,
+                                                    'syllabus': get_course_syllabus(course.id)})
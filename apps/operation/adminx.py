@@ -26,12 +26,15 @@ class UserMessageAdmin(object):
     list_display = ['message', 'user', 'has_read', 'add_time']
     list_filter = list_display
     search_fields = ['message', 'user', 'has_read']
+    # 数据量大, 列表页的总数使用表统计信息或限制行数的COUNT估算
+    list_count_strategy = 'estimated'
 
 
 class UserCourseAdmin(object):
     list_display = ['user', 'course', 'add_time']
     list_filter = ['user__nickname', 'course__name', 'add_time']
     search_fields = ['user__nickname', 'course__name']
+    list_count_strategy = 'estimated'
 
 
 xadmin.site.register(UserAsk, UserAskAdmin)
@@ -5,3 +5,7 @@ from django.apps import AppConfig
 class OperationConfig(AppConfig):
     name = 'operation'
     verbose_name = u'用户操作'
+
+    def ready(self):
+        # 注册signal receivers
+        from . import signals
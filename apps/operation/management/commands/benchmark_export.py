@@ -0,0 +1,116 @@
+# coding: utf-8
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.utils import translation
+
+from operation.models import UserMessage
+from users.models import UserProfile
+
+# 测试数据的消息内容前缀(导出时按该前缀搜索, 结束后删除)
+MESSAGE_PREFIX = 'bench_export_'
+ADMIN_USERNAME = 'bench_export_admin'
+ADMIN_PASSWORD = 'bench_export_pw'
+
+# (名称, 是否流式导出)
+MODES = ((u'原导出', False),
+         (u'流式导出', True))
+
+
+def current_rss_kb():
+    """当前进程的常驻内存(KB)"""
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * resource.getpagesize() // 1024
+
+
+class Command(BaseCommand):
+    help = u'xadmin导出性能测试: 对比原导出与流式导出全部用户消息时的内存峰值(每次导出在单独的进程中执行)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', default='1000,10000,50000', dest='rows',
+                            help=u'导出的行数, 以逗号分隔')
+        parser.add_argument('--format', default='csv', dest='format',
+                            choices=['csv', 'json', 'xml', 'xlsx'], help=u'导出格式')
+        parser.add_argument('--child', default=None, dest='child', choices=['stream', 'legacy'],
+                            help=u'(内部使用) 在子进程中执行一次导出并输出结果')
+
+    def handle(self, *args, **options):
+        if options['child']:
+            self.export(options['child'] == 'stream', options['format'])
+            return
+
+        row_nums = sorted(int(nums) for nums in options['rows'].split(','))
+        admin = UserProfile.objects.create(username=ADMIN_USERNAME, is_staff=True, is_superuser=True)
+        admin.set_password(ADMIN_PASSWORD)
+        admin.save()
+        created = 0
+        try:
+            for nums in row_nums:
+                created = self.create_messages(created, nums)
+                for name, streaming in MODES:
+                    result = self.run_child(streaming, options)
+                    if result is None:
+                        continue
+                    self.stdout.write(u'{rows}行 {name}: {seconds:.2f}秒 {size:.1f}MB, 内存峰值{peak:.1f}MB '
+                                      u'(导出增加{increase:.1f}MB)'.format(
+                                          rows=nums, name=name, seconds=result['seconds'],
+                                          size=result['bytes'] / 1024.0 / 1024,
+                                          peak=result['peak_kb'] / 1024.0,
+                                          increase=(result['peak_kb'] - result['start_kb']) / 1024.0))
+        finally:
+            UserMessage.objects.filter(message__startswith=MESSAGE_PREFIX).delete()
+            UserProfile.objects.filter(username=ADMIN_USERNAME).delete()
+
+    def create_messages(self, created, nums):
+        """分批创建测试消息, 避免本进程占用过多内存"""
+        while created < nums:
+            batch = min(nums - created, 5000)
+            UserMessage.objects.bulk_create([
+                UserMessage(user=(created + i) % 1000, has_read=bool(i % 2),
+                            message=u'{prefix}{n} 课程已更新, 请及时查看'.format(prefix=MESSAGE_PREFIX, n=created + i))
+                for i in range(batch)])
+            created += batch
+        return created
+
+    def run_child(self, streaming, options):
+        """新的进程中导出: 进程的内存峰值(ru_maxrss)不会受之前导出的影响"""
+        command = [sys.executable, os.path.abspath(sys.argv[0]), 'benchmark_export',
+                   '--child', streaming and 'stream' or 'legacy', '--format', options['format']]
+        if options.get('settings'):
+            command.append('--settings=' + options['settings'])
+        if options.get('pythonpath'):
+            command.append('--pythonpath=' + options['pythonpath'])
+        try:
+            output = subprocess.check_output(command)
+        except subprocess.CalledProcessError as e:
+            self.stderr.write(u'导出失败: {code}'.format(code=e.returncode))
+            return None
+        return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+    def export(self, streaming, file_type):
+        from xadmin.plugins.export import ExportPlugin
+
+        ExportPlugin.export_streaming = streaming
+        # 管理命令中默认没有激活语言, 原导出渲染列表时需要
+        translation.activate(settings.LANGUAGE_CODE)
+        client = Client()
+        client.login(username=ADMIN_USERNAME, password=ADMIN_PASSWORD)
+        start_kb = current_rss_kb()
+
+        start = time.time()
+        response = client.get('/xadmin/operation/usermessage/', {
+            '_do_': 'export', 'export_type': file_type, 'all': 'on', '_q_': MESSAGE_PREFIX})
+        size = 0
+        for chunk in (response.streaming_content if response.streaming else [response.content]):
+            size += len(chunk)
+        seconds = time.time() - start
+
+        self.stdout.write(json.dumps({'seconds': seconds, 'bytes': size, 'start_kb': start_kb,
+                                      'peak_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}))
@@ -0,0 +1,16 @@
+# coding: utf-8
+from django.core.management.base import BaseCommand
+
+from utils.course_relation import rebuild_course_relations
+
+
+class Command(BaseCommand):
+    help = u'根据用户-课程记录全量重建课程关联索引(该课程的同学还学过)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, dest='batch_size',
+                            help=u'bulk_create每批写入数')
+
+    def handle(self, *args, **options):
+        nums = rebuild_course_relations(batch_size=options['batch_size'])
+        self.stdout.write(u'课程关联索引重建完成, 共写入{nums}条记录'.format(nums=nums))
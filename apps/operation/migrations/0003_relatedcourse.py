@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9 on 2026-10-18 23:34
+from __future__ import unicode_literals
+
+import datetime
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0009_course_is_banner'),
+        ('operation', '0002_auto_20170912_1227'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedCourse',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nums', models.IntegerField(default=0, verbose_name='\u5171\u540c\u5b66\u4e60\u4eba\u6570')),
+                ('add_time', models.DateTimeField(default=datetime.datetime.now, verbose_name='\u6dfb\u52a0\u65f6\u95f4')),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='relations', to='courses.Course', verbose_name='\u8bfe\u7a0b')),
+                ('related_course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='courses.Course', verbose_name='\u5173\u8054\u8bfe\u7a0b')),
+            ],
+            options={
+                'verbose_name': '\u8bfe\u7a0b\u5173\u8054',
+                'verbose_name_plural': '\u8bfe\u7a0b\u5173\u8054',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='relatedcourse',
+            unique_together=set([('course', 'related_course')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='relatedcourse',
+            index_together=set([('course', 'nums')]),
+        ),
+    ]
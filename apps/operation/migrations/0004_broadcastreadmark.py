@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9 on 2026-10-18 23:40
+from __future__ import unicode_literals
+
+import datetime
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('operation', '0003_relatedcourse'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BroadcastReadMark',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_read_id', models.IntegerField(default=0, verbose_name='\u5df2\u8bfb\u5168\u4f53\u6d88\u606fid')),
+                ('add_time', models.DateTimeField(default=datetime.datetime.now, verbose_name='\u6dfb\u52a0\u65f6\u95f4')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='broadcast_read_mark', to=settings.AUTH_USER_MODEL, verbose_name='\u7528\u6237')),
+            ],
+            options={
+                'verbose_name': '\u5168\u4f53\u6d88\u606f\u5df2\u8bfb\u6807\u8bb0',
+                'verbose_name_plural': '\u5168\u4f53\u6d88\u606f\u5df2\u8bfb\u6807\u8bb0',
+            },
+        ),
+    ]
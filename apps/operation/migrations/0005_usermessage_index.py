@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9 on 2026-10-18 23:51
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operation', '0004_broadcastreadmark'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='usermessage',
+            index_together=set([('user', 'add_time')]),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9 on 2026-10-19 00:10
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def remove_duplicate_user_courses(apps, schema_editor):
+    """
+    删除重复的用户-课程记录(保留最早的一条), 按剩余的记录重新统计课程学习人数、机构学习人数及讲师热门课程
+    (此前Course.students不随选课更新, 之后只由 incr_course_student_nums 增减)
+    """
+    UserCourse = apps.get_model('operation', 'UserCourse')
+    Course = apps.get_model('courses', 'Course')
+    CourseOrg = apps.get_model('organization', 'CourseOrg')
+    Teacher = apps.get_model('organization', 'Teacher')
+
+    duplicates = list(UserCourse.objects.values('user', 'course')
+                                        .annotate(nums=models.Count('id'), min_id=models.Min('id'))
+                                        .filter(nums__gt=1).order_by())
+    for row in duplicates:
+        UserCourse.objects.filter(user=row['user'], course=row['course']).exclude(id=row['min_id']).delete()
+
+    students = dict((row['course'], row['nums']) for row in
+                    UserCourse.objects.values('course').annotate(nums=models.Count('id')).order_by())
+    for course_id, value in Course.objects.values_list('id', 'students').iterator():
+        if value != students.get(course_id, 0):
+            Course.objects.filter(id=course_id).update(students=students.get(course_id, 0))
+
+    org_ids = set(CourseOrg.objects.values_list('id', flat=True))
+    org_students = dict((row['course__course_org'], row['nums']) for row in
+                        UserCourse.objects.values('course__course_org').annotate(nums=models.Count('id')).order_by())
+    for org_id in org_ids:
+        CourseOrg.objects.filter(id=org_id).update(student_nums=org_students.get(org_id, 0))
+
+    # 热门课程按学习人数排序
+    hot_courses = {}
+    for teacher_id, course_id in Course.objects.filter(teacher__isnull=False) \
+                                               .order_by('teacher_id', '-students', 'id') \
+                                               .values_list('teacher_id', 'id').iterator():
+        hot_courses.setdefault(teacher_id, course_id)
+    for teacher_id, course_id in hot_courses.items():
+        Teacher.objects.filter(id=teacher_id).update(hot_course=course_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operation', '0005_usermessage_index'),
+        ('organization', '0007_aggregate_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_user_courses, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='usercourse',
+            unique_together=set([('user', 'course')]),
+        ),
+    ]
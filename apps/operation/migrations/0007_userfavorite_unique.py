@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9 on 2026-10-19 00:30
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def remove_duplicate_favorites(apps, schema_editor):
+    """删除重复的用户收藏(保留最早的一条), 并重新统计受影响对象的收藏数"""
+    UserFavorite = apps.get_model('operation', 'UserFavorite')
+    # UserFavorite.fav_type: 1 课程, 2 课程机构, 3 讲师
+    fav_models = {1: apps.get_model('courses', 'Course'),
+                  2: apps.get_model('organization', 'CourseOrg'),
+                  3: apps.get_model('organization', 'Teacher')}
+
+    duplicates = list(UserFavorite.objects.values('user', 'fav_type', 'fav_id')
+                                          .annotate(nums=models.Count('id'), min_id=models.Min('id'))
+                                          .filter(nums__gt=1).order_by())
+    targets = set()
+    for row in duplicates:
+        UserFavorite.objects.filter(user=row['user'], fav_type=row['fav_type'], fav_id=row['fav_id']) \
+                            .exclude(id=row['min_id']).delete()
+        targets.add((row['fav_type'], row['fav_id']))
+
+    for fav_type, fav_id in targets:
+        if fav_type in fav_models:
+            fav_models[fav_type].objects.filter(id=fav_id).update(
+                fav_nums=UserFavorite.objects.filter(fav_type=fav_type, fav_id=fav_id).count())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operation', '0006_usercourse_unique'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_favorites, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='userfavorite',
+            unique_together=set([('user', 'fav_type', 'fav_id')]),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+def build_related_courses(apps, schema_editor):
+    """根据已有的用户-课程记录建立课程关联索引(之后由signals增量维护, 也可以 python manage.py rebuild_related_courses 重建)"""
+    from utils.course_relation import rebuild_course_relations
+    rebuild_course_relations(user_course_model=apps.get_model('operation', 'UserCourse'),
+                             related_course_model=apps.get_model('operation', 'RelatedCourse'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operation', '0007_userfavorite_unique'),
+    ]
+
+    operations = [
+        migrations.RunPython(build_related_courses, migrations.RunPython.noop),
+    ]
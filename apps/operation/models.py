@@ -48,6 +48,7 @@ class UserFavorite(models.Model):
     class Meta:
         verbose_name = u'用户收藏'
         verbose_name_plural = verbose_name
+        unique_together = ('user', 'fav_type', 'fav_id')
 
     def __unicode__(self):
         return '{user} {fav_id}({fav_type})'.format(user=self.user, fav_id=self.fav_id,
@@ -63,11 +64,27 @@ class UserMessage(models.Model):
     class Meta:
         verbose_name = u'用户消息'
         verbose_name_plural = verbose_name
+        # 消息列表按 (接收用户, 添加时间) 游标分页
+        index_together = [('user', 'add_time')]
 
     def __unicode__(self):
         return 'user:{user} {message}'.format(user=self.user, message=self.message[:20])
 
 
+class BroadcastReadMark(models.Model):
+    """全体消息(UserMessage.user == 0)的已读水位: id不大于last_read_id的全体消息视为该用户已读"""
+    user = models.OneToOneField(UserProfile, verbose_name=u'用户', related_name='broadcast_read_mark')
+    last_read_id = models.IntegerField(default=0, verbose_name=u'已读全体消息id')
+    add_time = models.DateTimeField(default=datetime.now, verbose_name=u'添加时间')
+
+    class Meta:
+        verbose_name = u'全体消息已读标记'
+        verbose_name_plural = verbose_name
+
+    def __unicode__(self):
+        return '{user}: {last_read_id}'.format(user=self.user_id, last_read_id=self.last_read_id)
+
+
 class UserCourse(models.Model):
     user = models.ForeignKey(UserProfile, verbose_name=u'用户')
     course = models.ForeignKey(Course, verbose_name=u'课程')
@@ -76,6 +93,26 @@ class UserCourse(models.Model):
     class Meta:
         verbose_name = u'用户课程'
         verbose_name_plural = verbose_name
+        unique_together = ('user', 'course')
 
     def __unicode__(self):
         return '{user}-{course}'.format(user=self.user, course=self.course)
+
+
+class RelatedCourse(models.Model):
+    """课程关联索引(该课程的同学还学过), 由UserCourse的创建增量维护"""
+    course = models.ForeignKey(Course, verbose_name=u'课程', related_name='relations')
+    related_course = models.ForeignKey(Course, verbose_name=u'关联课程', related_name='+')
+    nums = models.IntegerField(default=0, verbose_name=u'共同学习人数')
+    add_time = models.DateTimeField(default=datetime.now, verbose_name=u'添加时间')
+
+    class Meta:
+        verbose_name = u'课程关联'
+        verbose_name_plural = verbose_name
+        unique_together = ('course', 'related_course')
+        index_together = ('course', 'nums')
+
+    def __unicode__(self):
+        return '{course}-{related_course}({nums})'.format(course=self.course_id,
+                                                          related_course=self.related_course_id,
+                                                          nums=self.nums)
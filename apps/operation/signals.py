@@ -0,0 +1,44 @@
+# coding: utf-8
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import UserCourse, UserMessage
+from courses.models import Course
+from utils.aggregates import incr_course_student_nums, incr_org_student_nums, update_teacher_course_stats
+from utils.course_relation import add_course_relations
+from utils.message import BROADCAST_USER, invalidate_unread_message_nums
+
+
+@receiver(post_save, sender=UserCourse)
+def update_course_relations(sender, instance, created, **kwargs):
+    """新增用户-课程记录时, 增量更新课程关联索引(该课程的同学还学过)"""
+    if created:
+        add_course_relations(instance.user_id, instance.course_id, exclude_id=instance.id)
+
+
+def _update_course_student_nums(course_id, delta):
+    """课程及课程机构学习人数 +delta, 重新统计讲师的热门课程(学习人数最多的课程)"""
+    incr_course_student_nums(course_id, delta)
+    for org_id, teacher_id in Course.objects.filter(id=course_id).values_list('course_org_id', 'teacher_id'):
+        incr_org_student_nums(org_id, delta)
+        update_teacher_course_stats([teacher_id])
+
+
+@receiver(post_save, sender=UserCourse)
+def incr_course_org_student_nums(sender, instance, created, raw=False, **kwargs):
+    """新增用户-课程记录时, 课程及课程机构学习人数 +1, 更新讲师的热门课程"""
+    if created and not raw:
+        _update_course_student_nums(instance.course_id, 1)
+
+
+@receiver(post_delete, sender=UserCourse)
+def decr_course_org_student_nums(sender, instance, **kwargs):
+    """删除用户-课程记录时, 课程及课程机构学习人数 -1, 更新讲师的热门课程"""
+    _update_course_student_nums(instance.course_id, -1)
+
+
+@receiver(post_save, sender=UserMessage)
+def update_unread_message_nums(sender, instance, created, **kwargs):
+    """新增全体消息时, 所有用户的未读消息数缓存失效"""
+    if created and instance.user == BROADCAST_USER:
+        invalidate_unread_message_nums()
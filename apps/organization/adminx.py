@@ -15,6 +15,7 @@ class CourseOrgAdmin(object):
     list_filter = ['name', 'desc', 'click_nums', 'fav_nums', 'image', 'address', 'city__name',
                    'add_time']
     search_fields = ['name', 'desc', 'click_nums', 'fav_nums', 'image', 'address', 'city__name']
+    readonly_fields = ['course_nums', 'student_nums', 'teacher_nums']
 
 
 class TeacherAdmin(object):
@@ -24,6 +25,7 @@ class TeacherAdmin(object):
                    'click_nums', 'fav_nums', 'add_time']
     search_fields = ['name', 'org__name', 'work_years', 'work_company', 'work_position', 'points',
                      'click_nums', 'fav_nums']
+    readonly_fields = ['course_nums', 'hot_course']
 
 xadmin.site.register(CityDict, CityDictAdmin)
 xadmin.site.register(CourseOrg, CourseOrgAdmin)
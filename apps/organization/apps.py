@@ -6,3 +6,6 @@ class OrganizationConfig(AppConfig):
     name = 'organization'
     verbose_name = u'课程机构'
 
+    def ready(self):
+        # 注册signal receivers
+        from . import signals
@@ -0,0 +1,12 @@
+# coding: utf-8
+from django.core.management.base import BaseCommand
+
+from utils.aggregates import reconcile_aggregates
+
+
+class Command(BaseCommand):
+    help = u'以分组聚合查询全量校正课程章节数、机构课程数/讲师数/学习人数、讲师课程数/热门课程'
+
+    def handle(self, *args, **options):
+        for field, nums in sorted(reconcile_aggregates().items()):
+            self.stdout.write(u'{field}: 校正{nums}条记录'.format(field=field, nums=nums))
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9 on 2026-10-18 23:44
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_aggregates(apps, schema_editor):
+    """根据现有数据填充冗余计数字段"""
+    Course = apps.get_model('courses', 'Course')
+    Lesson = apps.get_model('courses', 'Lesson')
+    CourseOrg = apps.get_model('organization', 'CourseOrg')
+    Teacher = apps.get_model('organization', 'Teacher')
+    UserCourse = apps.get_model('operation', 'UserCourse')
+
+    def fill(model, field, queryset, group_by):
+        for row in queryset.values(group_by).annotate(nums=models.Count('id')).order_by():
+            if row[group_by]:
+                model.objects.filter(pk=row[group_by]).update(**{field: row['nums']})
+
+    fill(Course, 'lesson_nums', Lesson.objects.all(), 'course')
+    fill(CourseOrg, 'course_nums', Course.objects.all(), 'course_org')
+    fill(CourseOrg, 'teacher_nums', Teacher.objects.all(), 'org')
+    fill(CourseOrg, 'student_nums', UserCourse.objects.all(), 'course__course_org')
+    fill(Teacher, 'course_nums', Course.objects.all(), 'teacher')
+
+    hot_courses = {}
+    for teacher_id, course_id in Course.objects.filter(teacher__isnull=False) \
+                                               .order_by('teacher_id', '-students', 'id') \
+                                               .values_list('teacher_id', 'id'):
+        hot_courses.setdefault(teacher_id, course_id)
+    for teacher_id, course_id in hot_courses.items():
+        Teacher.objects.filter(pk=teacher_id).update(hot_course=course_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0010_course_lesson_nums'),
+        ('operation', '0004_broadcastreadmark'),
+        ('organization', '0006_courseorg_tag'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='courseorg',
+            name='teacher_nums',
+            field=models.IntegerField(default=0, verbose_name='\u8bb2\u5e08\u6570'),
+        ),
+        migrations.AddField(
+            model_name='teacher',
+            name='course_nums',
+            field=models.IntegerField(default=0, verbose_name='\u8bfe\u7a0b\u6570'),
+        ),
+        migrations.AddField(
+            model_name='teacher',
+            name='hot_course',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='courses.Course', verbose_name='\u70ed\u95e8\u8bfe\u7a0b'),
+        ),
+        migrations.RunPython(fill_aggregates, migrations.RunPython.noop),
+    ]
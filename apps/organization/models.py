@@ -35,6 +35,7 @@ class CourseOrg(models.Model):
     city = models.ForeignKey(CityDict, verbose_name=u'所在城市')
     student_nums = models.IntegerField(default=0, verbose_name=u'学习人数')
     course_nums = models.IntegerField(default=0, verbose_name=u'课程数')
+    teacher_nums = models.IntegerField(default=0, verbose_name=u'讲师数')
     add_time = models.DateTimeField(default=datetime.now, verbose_name=u'添加时间')
 
     class Meta:
@@ -44,11 +45,6 @@ class CourseOrg(models.Model):
     def __unicode__(self):
         return self.name
 
-    @property
-    def teacher_nums(self):
-        """获取机构讲师数"""
-        return self.teacher_set.all().count()
-
 
 class Teacher(models.Model):
     name = models.CharField(max_length=50, verbose_name=u'教师名')
@@ -62,6 +58,9 @@ class Teacher(models.Model):
     image = models.ImageField(upload_to='teacher/%Y/%m', verbose_name=u'头像', default='')
     click_nums = models.IntegerField(default=0, verbose_name=u'点击数')
     fav_nums = models.IntegerField(default=0, verbose_name=u'收藏人数')
+    course_nums = models.IntegerField(default=0, verbose_name=u'课程数')
+    hot_course = models.ForeignKey('courses.Course', verbose_name=u'热门课程', null=True, blank=True,
+                                   related_name='+', on_delete=models.SET_NULL)
     add_time = models.DateTimeField(default=datetime.now, verbose_name=u'添加时间')
 
     class Meta:
@@ -70,15 +69,3 @@ class Teacher(models.Model):
 
     def __unicode__(self):
         return '{name} ({org})'.format(name=self.name, org=self.org)
-
-    @property
-    def hot_course(self):
-        hot_course = self.course_set.order_by('-students')[:1]
-        if hot_course:
-            return hot_course[0]
-        else:
-            return None
-
-    @property
-    def course_nums(self):
-        return self.course_set.count()
@@ -0,0 +1,50 @@
+# coding: utf-8
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import CityDict, CourseOrg, Teacher
+from utils.aggregates import reconcile_aggregates, update_org_teacher_nums
+from utils.bulk_import import post_bulk_import
+from utils.page_cache import invalidate_tags, TAG_CITY, TAG_ORG, TAG_TEACHER
+
+
+@receiver(pre_save, sender=Teacher)
+def remember_teacher_org(sender, instance, raw=False, **kwargs):
+    """记录修改前的所属机构, 用于更新原机构的讲师数"""
+    instance._old_org_id = None
+    if instance.pk and not raw:
+        instance._old_org_id = Teacher.objects.filter(pk=instance.pk).values_list('org_id', flat=True).first()
+
+
+@receiver(post_save, sender=Teacher)
+@receiver(post_delete, sender=Teacher)
+def update_teacher_aggregates(sender, instance, raw=False, **kwargs):
+    """讲师保存、删除后更新机构讲师数"""
+    if raw:
+        return
+    update_org_teacher_nums([instance.org_id, getattr(instance, '_old_org_id', None)])
+
+
+# 模型对应的页面缓存tag
+PAGE_CACHE_TAGS = {CityDict: TAG_CITY, CourseOrg: TAG_ORG, Teacher: TAG_TEACHER}
+
+
+@receiver(post_save, sender=CityDict)
+@receiver(post_save, sender=CourseOrg)
+@receiver(post_save, sender=Teacher)
+@receiver(post_delete, sender=CityDict)
+@receiver(post_delete, sender=CourseOrg)
+@receiver(post_delete, sender=Teacher)
+def invalidate_org_pages(sender, **kwargs):
+    """城市、机构、讲师保存、删除后清除首页、列表页的缓存"""
+    invalidate_tags(PAGE_CACHE_TAGS[sender])
+
+
+@receiver(post_bulk_import, sender=CityDict)
+@receiver(post_bulk_import, sender=CourseOrg)
+@receiver(post_bulk_import, sender=Teacher)
+def refresh_org_after_bulk_import(sender, **kwargs):
+    """后台批量导入城市、机构、讲师后(不触发post_save)校正机构讲师数, 清除页面缓存"""
+    if sender is Teacher:
+        reconcile_aggregates(['CourseOrg.teacher_nums'])
+    invalidate_tags(PAGE_CACHE_TAGS[sender])
@@ -1,3 +1,25 @@
-from django.test import TestCase
+# coding: utf-8
+"""
+    机构列表、讲师列表的SQL数量(超过 QUERY_BUDGETS 时测试失败, 见 courses.tests)
+"""
+from courses.tests import QueryBudgetTestCase
 
-# Create your tests here.
+
+class OrgQueryBudgetTest(QueryBudgetTestCase):
+
+    def test_org_list(self):
+        self.assertWithinBudget('org:org_list')
+        self.assertWithinBudget('org:org_list', query='?ct=pxjg&sort=students&city={city}'.format(
+            city=self.orgs[0].city_id))
+
+    def test_org_list_login(self):
+        self.client.login(username='user0', password='password')
+        self.assertWithinBudget('org:org_list')
+
+    def test_teacher_list(self):
+        self.assertWithinBudget('org:teacher_list')
+        self.assertWithinBudget('org:teacher_list', query='?sort=hot')
+
+    def test_teacher_list_login(self):
+        self.client.login(username='user0', password='password')
+        self.assertWithinBudget('org:teacher_list')
@@ -2,7 +2,7 @@
 
 from django.conf.urls import url, include
 from .views import OrgView, AddUserAskView, \
-    OrgDetailHomepageView, OrgDetailCourseView, OrgDetailDescView, OrgDetailTeacherView, AddFavView, TeacherListView, TeacherDetailView
+    OrgDetailHomepageView, OrgDetailCourseView, OrgDetailDescView, OrgDetailTeacherView, AddFavView, BulkFavView, TeacherListView, TeacherDetailView
 
 urlpatterns = [
     # 授课机构列表页
@@ -22,6 +22,8 @@ urlpatterns = [
 
     # 机构收藏
     url(r'^add_fav/$', AddFavView.as_view(), name='add_fav'),
+    # 批量收藏、取消收藏
+    url(r'^bulk_fav/$', BulkFavView.as_view(), name='bulk_fav'),
 
     # 讲师列表页
     url(r'^teacher/list/$', TeacherListView.as_view(), name='teacher_list'),
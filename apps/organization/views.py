@@ -1,14 +1,21 @@
 # coding: utf-8
-from django.db.models import Q
+import json
+
 from django.http import HttpResponse
 from django.shortcuts import render
+from django.utils.decorators import method_decorator
 from django.views.generic import View
 from pure_pagination import Paginator, EmptyPage, PageNotAnInteger
 
 from .models import CityDict, CourseOrg, Teacher
 from .forms import UserAskForm
 from courses.models import Course
-from operation.models import UserFavorite
+from search.backends import get_search_backend
+from utils.click_counter import click_counter
+from utils.favorite import get_fav_name, get_fav_status, is_fav, toggle_favorite, toggle_favorites, \
+    FAV_MODELS, FAV_TYPE_NAMES, FAV_TYPE_ORG, FAV_TYPE_TEACHER, MAX_BULK_FAV_NUMS
+from utils.keyset_pagination import paginate
+from utils.page_cache import cache_anonymous_page, get_fragment, TAG_CITY, TAG_COURSE, TAG_ORG, TAG_TEACHER
 from Lighten.settings import PAGINATION_SETTINGS
 
 
@@ -17,6 +24,8 @@ class OrgView(View):
         课程机构列表功能
     """
 
+    @method_decorator(cache_anonymous_page(tags=[TAG_ORG, TAG_CITY, TAG_COURSE],
+                                           query_params=['sort', 'page', 'cursor', 'city', 'ct', 'keywords']))
     def get(self, request):
         # 取出城市、类别、排序参数
         city_id = request.GET.get('city', '')
@@ -24,19 +33,17 @@ class OrgView(View):
         sort = request.GET.get('sort', '')
 
         # 机构排名
-        hot_orgs = CourseOrg.objects.order_by('-click_nums')[:3]
+        hot_orgs = get_fragment('hot_orgs', [TAG_ORG], lambda: click_counter.top(CourseOrg.objects.all(), 3))
         # 城市
-        all_cities = CityDict.objects.all()
+        all_cities = get_fragment('all_cities', [TAG_CITY], lambda: list(CityDict.objects.all()))
 
         # 课程搜索功能
         search_keywords = request.GET.get('keywords', '')
+        all_organizations = CourseOrg.objects.all()
+        search_truncated = False
         if search_keywords:
-            all_organizations = CourseOrg.objects.filter(Q(name__icontains=search_keywords) |
-                                                         Q(desc__icontains=search_keywords) |
-                                                         Q(category__icontains=search_keywords) |
-                                                         Q(address__icontains=search_keywords))
-        else:
-            all_organizations = CourseOrg.objects.all()
+            # 倒排索引搜索, 结果按相关度排序(超过MAX_RESULTS时只显示相关度最高的部分)
+            all_organizations, search_truncated = get_search_backend().search(all_organizations, search_keywords)
 
         # 根据城市筛选课程机构
         if city_id:
@@ -47,25 +54,23 @@ class OrgView(View):
             all_organizations = all_organizations.filter(category=category)
 
         # 根据sort: 'students' or 'courses'进行排序
+        ordering = ['id']
         if sort:
             sort_dict = {'students': '-student_nums',
                          'courses': '-course_nums'}
             all_organizations = all_organizations.order_by(sort_dict[sort])
+            ordering = [sort_dict[sort], '-id']
 
-        # 对课程机构进行分页
+        # 对课程机构进行分页(按搜索相关度排序时使用页码分页)
         per_page = PAGINATION_SETTINGS.get('ORGANIZATION_NUM_PER_PAGE', '5')
-        paginator = Paginator(all_organizations, per_page=per_page, request=request)
-        try:
-            page_num = int(request.GET.get('page', 1))
-        except PageNotAnInteger:
-            page_num = 1
-        # 分页后的课程机构
-        org_paginator = paginator.page(page_num)
+        org_paginator = paginate(request, all_organizations, per_page,
+                                 ordering=None if search_keywords and not sort else ordering, cache_count=True)
 
         return render(request, 'org-list.html',
                       {'org_paginator': org_paginator,
                        'all_cities': all_cities,
-                       'org_nums': all_organizations.count(),
+                       'org_nums': org_paginator.paginator.count,
+                       'search_truncated': search_truncated,
                        'cur_city_id': city_id,
                        'category': category,
                        'hot_orgs': hot_orgs,
@@ -90,17 +95,14 @@ class OrgDetailHomepageView(View):
     def get(self, request, org_id):
         course_org = CourseOrg.objects.get(id=int(org_id))
 
-        # 点击数 +1
-        course_org.click_nums += 1
-        course_org.save()
+        # 点击数 +1 (写缓冲, 定期批量写入)
+        click_counter.incr(course_org)
 
         # 用户为登录状态时显示收藏状态
-        has_fav = True if request.user.is_authenticated() and UserFavorite.objects.filter(user=request.user,
-                                                                                          fav_id=course_org.id,
-                                                                                          fav_type=2) else False
+        has_fav = is_fav(request.user, FAV_TYPE_ORG, course_org.id)
 
         all_courses = course_org.course_set.order_by('-students').all()[:3]
-        all_teachers = course_org.teacher_set.all()[:1]
+        all_teachers = course_org.teacher_set.select_related('hot_course')[:1]
         return render(request, 'org-detail-homepage.html', {'course_org': course_org,
                                                             'all_courses': all_courses,
                                                             'all_teachers': all_teachers,
@@ -115,9 +117,7 @@ class OrgDetailCourseView(View):
     def get(self, request, org_id):
         course_org = CourseOrg.objects.get(id=int(org_id))
         # 用户为登录状态时显示收藏状态
-        has_fav = True if request.user.is_authenticated() and UserFavorite.objects.filter(user=request.user,
-                                                                                          fav_id=course_org.id,
-                                                                                          fav_type=2) else False
+        has_fav = is_fav(request.user, FAV_TYPE_ORG, course_org.id)
 
         all_courses = course_org.course_set.all()
 
@@ -143,9 +143,7 @@ class OrgDetailDescView(View):
     def get(self, request, org_id):
         course_org = CourseOrg.objects.get(id=int(org_id))
         # 用户为登录状态时显示收藏状态
-        has_fav = True if request.user.is_authenticated() and UserFavorite.objects.filter(user=request.user,
-                                                                                          fav_id=course_org.id,
-                                                                                          fav_type=2) else False
+        has_fav = is_fav(request.user, FAV_TYPE_ORG, course_org.id)
         return render(request, 'org-detail-desc.html', {'course_org': course_org,
                                                         'current_page': 'desc',
                                                         'has_fav': has_fav})
@@ -157,9 +155,7 @@ class OrgDetailTeacherView(View):
     def get(self, request, org_id):
         course_org = CourseOrg.objects.get(id=int(org_id))
         # 用户为登录状态时显示收藏状态
-        has_fav = True if request.user.is_authenticated() and UserFavorite.objects.filter(user=request.user,
-                                                                                          fav_id=course_org.id,
-                                                                                          fav_type=2) else False
+        has_fav = is_fav(request.user, FAV_TYPE_ORG, course_org.id)
         all_teachers = course_org.teacher_set.all()
         return render(request, 'org-detail-teachers.html', {'course_org': course_org,
                                                             'all_teachers': all_teachers,
@@ -167,54 +163,73 @@ class OrgDetailTeacherView(View):
                                                             'has_fav': has_fav})
 
 
+def _parse_fav_target(fav_type, fav_id):
+    """解析收藏类型及收藏对象id, 无效时返回None"""
+    try:
+        fav_type, fav_id = int(fav_type), int(fav_id)
+    except (TypeError, ValueError):
+        return None
+    if fav_type not in FAV_MODELS or fav_id <= 0:
+        return None
+    return fav_type, fav_id
+
+
 class AddFavView(View):
     """用户收藏、取消收藏"""
 
     def post(self, request):
-        fav_id = int(request.POST.get('fav_id', 0))
-        fav_type = int(request.POST.get('fav_type', 0))
+        # 用户必须为登录状态
+        if not request.user.is_authenticated():
+            return HttpResponse('{"status": "fail", "msg": "用户未登录"}',
+                                content_type='application/json')
 
-        # 用于记录用户操作 获取用户收藏的对象name(课程名称、机构名称或讲师名字)
-        fav_types = {1: (Course, '课程'), 2: (CourseOrg, '课程机构'), 3: (Teacher, '讲师')}
-        # obj指代一种model obj， 如Course、CourseOrg或Teacher
-        obj = fav_types[fav_type][0].objects.get(id=fav_id)
-        obj_name = obj.name
-        obj_type = fav_types[fav_type][1]
+        target = _parse_fav_target(request.POST.get('fav_type', 0), request.POST.get('fav_id', 0))
+        faved = toggle_favorite(request.user.id, *target) if target else None
+        if faved is None:
+            return HttpResponse('{"status": "fail", "msg": "收藏失败"}',
+                                content_type='application/json')
 
-        # 用户必须为登录状态
+        # 记录用户操作
+        fav_type, fav_id = target
+        obj_type = FAV_TYPE_NAMES[fav_type]
+        obj_name = get_fav_name(fav_type, fav_id)
+        if faved:
+            request.user.log('收藏了{type}: {name}'.format(type=obj_type, name=obj_name))
+            return HttpResponse('{"status": "success", "msg": "已收藏"}',
+                                content_type='application/json')
+        request.user.log('取消了收藏({type}): {name}'.format(type=obj_type, name=obj_name))
+        return HttpResponse('{"status": "success", "msg": "收藏"}',
+                            content_type='application/json')
+
+
+class BulkFavView(View):
+    """
+        批量收藏、取消收藏
+        POST favs: JSON数组, 如 [{"fav_type": 1, "fav_id": 2}, {"fav_type": 3, "fav_id": 1}]
+        返回每个对象的收藏状态: {"status": "success", "favs": [{"fav_type": 1, "fav_id": 2, "fav": true}, ...]}
+        (fav为null表示收藏对象不存在)
+    """
+
+    def post(self, request):
         if not request.user.is_authenticated():
             return HttpResponse('{"status": "fail", "msg": "用户未登录"}',
                                 content_type='application/json')
 
-        exist_records = UserFavorite.objects.filter(user=request.user, fav_id=fav_id, fav_type=fav_type)
-        if exist_records:
-            # 记录已存在, 表示用户取消收藏
-            exist_records.delete()
-            # 记录用户操作
-            request.user.log('取消了收藏({type}): {name}'.format(type=obj_type, name=obj_name))
-
-            # 收藏数 -1   判断>0是开发调试过程需要 亦可保证安全
-            if obj.fav_nums > 0:
-                obj.fav_nums -= 1
-                obj.save()
-            return HttpResponse('{"status": "success", "msg": "收藏"}',
+        try:
+            favs = json.loads(request.POST.get('favs', '[]'))
+            targets = [_parse_fav_target(fav.get('fav_type'), fav.get('fav_id')) for fav in favs]
+        except (ValueError, AttributeError, TypeError):
+            targets = [None]
+        if not targets or None in targets or len(targets) > MAX_BULK_FAV_NUMS:
+            return HttpResponse('{"status": "fail", "msg": "收藏失败"}',
                                 content_type='application/json')
-        else:
-            if fav_id > 0 and fav_type > 0:
-                # 添加用户收藏
-                user_fav = UserFavorite(user=request.user, fav_id=fav_id, fav_type=fav_type)
-                user_fav.save()
-                # 收藏数 +1
-                obj.fav_nums += 1
-                obj.save()
-
-                # 记录用户操作
-                request.user.log('收藏了{type}: {name}'.format(type=obj_type, name=obj_name))
-                return HttpResponse('{"status": "success", "msg": "已收藏"}',
-                                    content_type='application/json')
-            else:
-                return HttpResponse('{"status": "fail", "msg": "收藏失败"}',
-                                    content_type='application/json')
+
+        results = toggle_favorites(request.user.id, targets)
+        request.user.log('批量收藏、取消收藏了{nums}个对象'.format(nums=len(results)))
+        return HttpResponse(json.dumps({'status': 'success',
+                                        'favs': [{'fav_type': fav_type, 'fav_id': fav_id, 'fav': faved}
+                                                 for fav_type, fav_id, faved in results]}),
+                            content_type='application/json')
 
 
 class TeacherListView(View):
@@ -222,38 +237,38 @@ class TeacherListView(View):
         课程讲师列表页
     """
 
+    @method_decorator(cache_anonymous_page(tags=[TAG_TEACHER], query_params=['sort', 'page', 'cursor', 'keywords']))
     def get(self, request):
 
-        # 是否排序
-        sort = request.GET.get('sort', '')
-        if sort == 'hot':
-            all_teachers = Teacher.objects.order_by('-click_nums')
-        else:
-            all_teachers = Teacher.objects.all()
+        all_teachers = Teacher.objects.all()
 
         # 课程搜索功能
         search_keywords = request.GET.get('keywords', '')
+        search_truncated = False
         if search_keywords:
-            all_teachers = all_teachers.filter(Q(name__icontains=search_keywords) |
-                                               Q(academic_degree__icontains=search_keywords) |
-                                               Q(work_company__icontains=search_keywords) |
-                                               Q(work_position__icontains=search_keywords) |
-                                               Q(org__name__icontains=search_keywords))
+            # 倒排索引搜索, 结果按相关度排序(超过MAX_RESULTS时只显示相关度最高的部分)
+            all_teachers, search_truncated = get_search_backend().search(all_teachers, search_keywords)
+
+        # 是否排序
+        sort = request.GET.get('sort', '')
+        ordering = ['id']
+        if sort == 'hot':
+            all_teachers = all_teachers.order_by('-click_nums')
+            ordering = ['-click_nums', '-id']
 
-        # 分页
+        # 分页(按搜索相关度排序时使用页码分页)
         per_page = PAGINATION_SETTINGS.get('TEACHER_NUM_PER_PAGE', 10)
-        paginator = Paginator(all_teachers.all(), per_page, request=request)
-        try:
-            page_index = int(request.GET.get('page', 1))
-        except PageNotAnInteger:
-            page_index = 1
-        teacher_paginator = paginator.page(page_index)
+        teacher_paginator = paginate(request, all_teachers, per_page,
+                                     ordering=None if search_keywords and sort != 'hot' else ordering,
+                                     cache_count=True)
 
         # 讲师排行榜
-        hot_teachers = Teacher.objects.order_by('-fav_nums')[:5]
+        hot_teachers = get_fragment('hot_teachers', [TAG_TEACHER],
+                                    lambda: list(Teacher.objects.order_by('-fav_nums')[:5]))
 
         return render(request, 'teachers-list.html', {'teacher_paginator': teacher_paginator,
-                                                      'teacher_nums': all_teachers.count(),
+                                                      'teacher_nums': teacher_paginator.paginator.count,
+                                                      'search_truncated': search_truncated,
                                                       'hot_teachers': hot_teachers,
                                                       'sort': sort})
 
@@ -265,20 +280,16 @@ class TeacherDetailView(View):
 
     def get(self, request, teacher_id):
         teacher = Teacher.objects.get(id=teacher_id)
-        # 点击数 +1
-        teacher.click_nums +=1
-        teacher.save()
-
-        teacher_has_fav = True if request.user.is_authenticated() and UserFavorite.objects.filter(user=request.user,
-                                                                                                  fav_id=teacher_id,
-                                                                                                  # 3为教师类型
-                                                                                                  fav_type=3) else False
-        org_has_fav = True if request.user.is_authenticated() and UserFavorite.objects.filter(user=request.user,
-                                                                                              fav_id=teacher.org.id,
-                                                                                              # 2为课程机构
-                                                                                              fav_type=2) else False
+        # 点击数 +1 (写缓冲, 定期批量写入)
+        click_counter.incr(teacher)
+
+        # 讲师及其所属机构的收藏状态(一次查询)
+        favs = get_fav_status(request.user, [(FAV_TYPE_TEACHER, teacher.id), (FAV_TYPE_ORG, teacher.org_id)])
+        teacher_has_fav = (FAV_TYPE_TEACHER, teacher.id) in favs
+        org_has_fav = (FAV_TYPE_ORG, teacher.org_id) in favs
         # 讲师排行榜
-        hot_teachers = Teacher.objects.order_by('-fav_nums')[:5]
+        hot_teachers = get_fragment('hot_teachers', [TAG_TEACHER],
+                                    lambda: list(Teacher.objects.order_by('-fav_nums')[:5]))
 
         # 全部课程(按照学习人数排序)
         teacher_courses = Course.objects.filter(teacher=teacher).order_by('-students')
@@ -0,0 +1,11 @@
+# coding: utf-8
+from django.apps import AppConfig
+
+
+class SearchConfig(AppConfig):
+    name = 'search'
+    verbose_name = u'搜索'
+
+    def ready(self):
+        # 注册signal receivers
+        from . import signals
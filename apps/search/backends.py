@@ -0,0 +1,128 @@
+# coding: utf-8
+import operator
+from functools import reduce
+
+from django.db import transaction
+from django.db.models import Case, Count, IntegerField, Q, Sum, Value, When
+from django.utils.module_loading import import_string
+
+from Lighten.settings import SEARCH_SETTINGS
+from .indexes import get_index
+from .models import SearchToken
+from .tokenizer import tokenize_for_query
+
+
+class BaseSearchBackend(object):
+    """搜索后端接口"""
+
+    def __init__(self, max_results=1000, icontains_fallback=True):
+        # 单次搜索返回的最大结果数
+        self.max_results = max_results
+        # 索引没有命中时退回icontains匹配
+        self.icontains_fallback = icontains_fallback
+
+    def update(self, obj):
+        """索引(或重新索引)对象"""
+        raise NotImplementedError
+
+    def remove(self, obj):
+        """从索引中删除对象"""
+        raise NotImplementedError
+
+    def rebuild(self, index, batch_size=1000):
+        """全量重建某个SearchIndex的索引, 返回索引的对象数"""
+        raise NotImplementedError
+
+    def search_ids(self, model, keywords, limit=None):
+        """返回按相关度降序排列的对象id列表(最多limit个, 默认max_results)"""
+        raise NotImplementedError
+
+    def search(self, queryset, keywords):
+        """
+        在queryset中搜索keywords
+        :param queryset:   QuerySet  如 Course.objects.all()
+        :param keywords:   (str)     搜索关键词
+        :return:           (tuple)   (QuerySet 按相关度排序, 可继续filter/order_by并交给Paginator分页,
+                                      (bool) 命中的对象超过max_results, 只返回了相关度最高的max_results个)
+        """
+        # 多取一个id判断结果是否被截断
+        ids = self.search_ids(queryset.model, keywords, limit=self.max_results + 1)
+        if not ids:
+            if self.icontains_fallback:
+                return self.fallback_search(queryset, keywords), False
+            return queryset.none(), False
+        truncated = len(ids) > self.max_results
+        ids = ids[:self.max_results]
+        rank = Case(*[When(pk=pk, then=Value(i)) for i, pk in enumerate(ids)], output_field=IntegerField())
+        return queryset.filter(pk__in=ids).annotate(search_rank=rank).order_by('search_rank'), truncated
+
+    def fallback_search(self, queryset, keywords):
+        """
+        分词无法命中的查询: 单个英文字母、单词中间的片段(如'jango')、符号(如'c++'),
+        按SearchIndex.fallback_fields以icontains匹配整个关键词(全表扫描, 只在索引没有结果时执行)
+        """
+        fields = get_index(queryset.model).fallback_fields
+        keywords = keywords.strip()
+        if not fields or not keywords:
+            return queryset.none()
+        return queryset.filter(reduce(operator.or_, [Q(**{field + '__icontains': keywords}) for field in fields]))
+
+
+class DatabaseSearchBackend(BaseSearchBackend):
+    """
+        基于数据库表(SearchToken)的倒排索引
+
+        查询时按 (model_label, token) 索引取出命中的对象, 要求包含全部查询词, 按权重和排序
+    """
+
+    def update(self, obj):
+        index = get_index(obj.__class__)
+        with transaction.atomic():
+            SearchToken.objects.filter(model_label=index.model_label, obj_id=obj.pk).delete()
+            SearchToken.objects.bulk_create(self._build(index, obj))
+
+    def remove(self, obj):
+        index = get_index(obj.__class__)
+        SearchToken.objects.filter(model_label=index.model_label, obj_id=obj.pk).delete()
+
+    def rebuild(self, index, batch_size=1000):
+        nums = 0
+        with transaction.atomic():
+            SearchToken.objects.filter(model_label=index.model_label).delete()
+            tokens = []
+            for obj in index.get_queryset().iterator():
+                tokens.extend(self._build(index, obj))
+                if len(tokens) >= batch_size:
+                    SearchToken.objects.bulk_create(tokens)
+                    tokens = []
+                nums += 1
+            SearchToken.objects.bulk_create(tokens)
+        return nums
+
+    def search_ids(self, model, keywords, limit=None):
+        tokens = tokenize_for_query(keywords)
+        if not tokens:
+            return []
+        rows = SearchToken.objects.filter(model_label=get_index(model).model_label, token__in=tokens) \
+                                  .values('obj_id') \
+                                  .annotate(matched=Count('token', distinct=True), score=Sum('weight')) \
+                                  .filter(matched=len(tokens)) \
+                                  .order_by('-score', 'obj_id')[:limit or self.max_results]
+        return [row['obj_id'] for row in rows]
+
+    def _build(self, index, obj):
+        return [SearchToken(model_label=index.model_label, obj_id=obj.pk, token=token, weight=weight)
+                for token, weight in index.get_tokens(obj).items()]
+
+
+_backend = None
+
+
+def get_search_backend():
+    """获取settings.SEARCH_SETTINGS['BACKEND']配置的搜索后端(单例)"""
+    global _backend
+    if _backend is None:
+        backend_class = import_string(SEARCH_SETTINGS.get('BACKEND', 'search.backends.DatabaseSearchBackend'))
+        _backend = backend_class(max_results=SEARCH_SETTINGS.get('MAX_RESULTS', 1000),
+                                 icontains_fallback=SEARCH_SETTINGS.get('ICONTAINS_FALLBACK', True))
+    return _backend
@@ -0,0 +1,79 @@
+# coding: utf-8
+from collections import Counter
+
+from courses.models import Course
+from organization.models import CourseOrg, Teacher
+from .tokenizer import tokenize_for_index
+
+
+class SearchIndex(object):
+    """
+        搜索索引配置
+
+        fields: (属性路径, 权重), 路径可跨关联对象('org.name')或为无参方法('get_degree_display')
+        fallback_fields: 索引无法命中时以icontains匹配的字段(ORM查询路径)
+    """
+    model = None
+    fields = ()
+    fallback_fields = ()
+    select_related = ()
+
+    @property
+    def model_label(self):
+        return self.model._meta.label_lower
+
+    def get_queryset(self):
+        return self.model.objects.select_related(*self.select_related).order_by('pk')
+
+    def get_value(self, obj, path):
+        for attr in path.split('.'):
+            if obj is None:
+                return ''
+            obj = getattr(obj, attr)
+            if callable(obj):
+                obj = obj()
+        return obj
+
+    def get_tokens(self, obj):
+        """
+        :param obj:   model对象
+        :return:      (Counter)  {词: 权重}
+        """
+        tokens = Counter()
+        for path, weight in self.fields:
+            for token, nums in tokenize_for_index(self.get_value(obj, path)).items():
+                tokens[token] += nums * weight
+        return tokens
+
+
+class CourseIndex(SearchIndex):
+    model = Course
+    fields = (('name', 5), ('tag', 3), ('category', 2), ('get_degree_display', 2),
+              ('desc', 1), ('you_need_know', 1), ('teacher_tell', 1))
+    fallback_fields = ('name', 'desc', 'you_need_know', 'teacher_tell', 'degree', 'category', 'tag')
+
+
+class CourseOrgIndex(SearchIndex):
+    model = CourseOrg
+    fields = (('name', 5), ('get_category_display', 2), ('address', 2), ('desc', 1))
+    fallback_fields = ('name', 'desc', 'category', 'address')
+
+
+class TeacherIndex(SearchIndex):
+    model = Teacher
+    fields = (('name', 5), ('org.name', 2), ('academic_degree', 1), ('work_company', 1),
+              ('work_position', 1))
+    fallback_fields = ('name', 'academic_degree', 'work_company', 'work_position', 'org__name')
+    select_related = ('org',)
+
+
+registered_indexes = [CourseIndex(), CourseOrgIndex(), TeacherIndex()]
+
+
+def get_index(model):
+    """获取model对应的SearchIndex, 未注册时返回None"""
+    model = model._meta.concrete_model
+    for index in registered_indexes:
+        if index.model is model:
+            return index
+    return None
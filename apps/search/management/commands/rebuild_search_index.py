@@ -0,0 +1,20 @@
+# coding: utf-8
+from django.core.management.base import BaseCommand
+
+from search.backends import get_search_backend
+from search.indexes import registered_indexes
+
+
+class Command(BaseCommand):
+    help = u'全量重建课程、机构、讲师的搜索索引'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, dest='batch_size',
+                            help=u'bulk_create每批写入数')
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        for index in registered_indexes:
+            nums = backend.rebuild(index, batch_size=options['batch_size'])
+            self.stdout.write(u'{model}: 已索引{nums}条记录'.format(model=index.model._meta.verbose_name,
+                                                                 nums=nums))
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9 on 2026-10-18 23:37
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchToken',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_label', models.CharField(max_length=50, verbose_name='\u5bf9\u8c61\u7c7b\u578b')),
+                ('obj_id', models.IntegerField(verbose_name='\u5bf9\u8c61id')),
+                ('token', models.CharField(max_length=20, verbose_name='\u8bcd')),
+                ('weight', models.IntegerField(default=1, verbose_name='\u6743\u91cd')),
+            ],
+            options={
+                'verbose_name': '\u641c\u7d22\u7d22\u5f15',
+                'verbose_name_plural': '\u641c\u7d22\u7d22\u5f15',
+            },
+        ),
+        migrations.AlterIndexTogether(
+            name='searchtoken',
+            index_together=set([('model_label', 'obj_id'), ('model_label', 'token')]),
+        ),
+    ]
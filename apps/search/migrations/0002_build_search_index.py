@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+# 每批写入的索引词数
+BATCH_SIZE = 1000
+
+
+def build_search_index(apps, schema_editor):
+    """为已有的课程、机构、讲师建立搜索索引(之后由signals维护, 也可以 python manage.py rebuild_search_index 重建)"""
+    from search.indexes import registered_indexes
+    SearchToken = apps.get_model('search', 'SearchToken')
+
+    for index in registered_indexes:
+        model = apps.get_model(index.model._meta.label)
+        SearchToken.objects.filter(model_label=index.model_label).delete()
+        tokens = []
+        for obj in model.objects.select_related(*index.select_related).order_by('pk').iterator():
+            tokens.extend(SearchToken(model_label=index.model_label, obj_id=obj.pk, token=token, weight=weight)
+                          for token, weight in index.get_tokens(obj).items())
+            if len(tokens) >= BATCH_SIZE:
+                SearchToken.objects.bulk_create(tokens)
+                tokens = []
+        SearchToken.objects.bulk_create(tokens)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0001_initial'),
+        ('courses', '0011_course_add_time_index'),
+        ('organization', '0007_aggregate_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(build_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# coding: utf-8
+from __future__ import unicode_literals
+
+from django.db import models
+
+
+class SearchToken(models.Model):
+    """倒排索引: 词 -> 对象"""
+    model_label = models.CharField(max_length=50, verbose_name=u'对象类型')
+    obj_id = models.IntegerField(verbose_name=u'对象id')
+    token = models.CharField(max_length=20, verbose_name=u'词')
+    weight = models.IntegerField(default=1, verbose_name=u'权重')
+
+    class Meta:
+        verbose_name = u'搜索索引'
+        verbose_name_plural = verbose_name
+        index_together = (('model_label', 'token'), ('model_label', 'obj_id'))
+
+    def __unicode__(self):
+        return '{token} -> {model_label}:{obj_id}'.format(token=self.token, model_label=self.model_label,
+                                                         obj_id=self.obj_id)
@@ -0,0 +1,46 @@
+# coding: utf-8
+from django.apps import apps
+from django.db.models.signals import post_delete, post_save
+
+from organization.models import CourseOrg, Teacher
+from utils.bulk_import import post_bulk_import
+from .backends import get_search_backend
+from .indexes import get_index
+
+
+def update_search_index(sender, instance, raw=False, **kwargs):
+    """对象保存后更新其搜索索引"""
+    if raw or get_index(sender) is None:
+        return
+    backend = get_search_backend()
+    backend.update(instance)
+    # 讲师索引包含机构名称, 机构修改后需要重新索引其讲师
+    if isinstance(instance, CourseOrg):
+        for teacher in instance.teacher_set.select_related('org'):
+            backend.update(teacher)
+
+
+def remove_search_index(sender, instance, **kwargs):
+    """对象删除后移除其搜索索引"""
+    if get_index(sender) is not None:
+        get_search_backend().remove(instance)
+
+
+def rebuild_search_index(sender, **kwargs):
+    """后台批量导入(不触发post_save)后重建该模型的索引"""
+    backend = get_search_backend()
+    backend.rebuild(get_index(sender))
+    if sender._meta.concrete_model is CourseOrg:
+        backend.rebuild(get_index(Teacher))
+
+
+# 只为已注册索引的模型及其代理模型(如BannerCourse, 保存时sender为代理类)连接signal:
+# 不限定sender的post_delete receiver会使所有模型的 queryset.delete() 先查询再逐条删除
+for model in apps.get_models():
+    if get_index(model) is not None:
+        post_save.connect(update_search_index, sender=model,
+                          dispatch_uid='search_update_index_' + model._meta.label_lower)
+        post_delete.connect(remove_search_index, sender=model,
+                            dispatch_uid='search_remove_index_' + model._meta.label_lower)
+        post_bulk_import.connect(rebuild_search_index, sender=model,
+                                 dispatch_uid='search_rebuild_index_' + model._meta.label_lower)
@@ -0,0 +1,59 @@
+# coding: utf-8
+"""
+    分词: 中文按字切分为 unigram + bigram, 英文/数字按单词切分为前缀(edge n-gram)
+
+    如 u'Python入门教程'
+    索引 --> python py pyt pyth pytho 入 门 教 程 入门 门教 教程
+    查询 --> python 入门 门教 教程
+"""
+import re
+from collections import Counter
+
+from django.utils.encoding import force_text
+
+# 索引词最大长度, 与SearchToken.token一致
+MAX_TOKEN_LENGTH = 20
+
+TOKEN_RE = re.compile(u'([\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+)|([a-z0-9]+)', re.UNICODE)
+
+
+def _split(text):
+    """切分出 (中文片段, 英文单词) 元组"""
+    if not text:
+        return []
+    return TOKEN_RE.findall(force_text(text).lower())
+
+
+def tokenize_for_index(text):
+    """
+    对待索引的文本分词
+    :param text:   (str)      文本
+    :return:       (Counter)  {词: 出现次数}
+    """
+    tokens = Counter()
+    for cjk, word in _split(text):
+        if cjk:
+            tokens.update(cjk)
+            tokens.update(cjk[i:i + 2] for i in range(len(cjk) - 1))
+        else:
+            word = word[:MAX_TOKEN_LENGTH]
+            tokens.update(word[:i] for i in range(min(2, len(word)), len(word) + 1))
+    return tokens
+
+
+def tokenize_for_query(text):
+    """
+    对搜索关键词分词
+    :param text:   (str)   关键词
+    :return:       (set)   词集合, 结果须包含全部的词
+    """
+    tokens = set()
+    for cjk, word in _split(text):
+        if cjk:
+            if len(cjk) == 1:
+                tokens.add(cjk)
+            else:
+                tokens.update(cjk[i:i + 2] for i in range(len(cjk) - 1))
+        else:
+            tokens.add(word[:MAX_TOKEN_LENGTH])
+    return tokens
@@ -3,7 +3,7 @@ import xadmin
 from xadmin import views
 from xadmin.plugins.auth import UserAdmin
 
-from .models import UserProfile, EmailVerifyRecord, Banner
+from .models import UserProfile, EmailVerifyRecord, EmailOutbox, Banner
 
 
 class BaseSetting(object):
@@ -26,11 +26,17 @@ class GlobalSetting(object):
 
 
 class EmailVerifyRecordAdmin(object):
-    fields = ['code', 'email', 'send_type', 'send_time']
+    fields = ['code', 'email', 'send_type', 'send_time', 'expire_time', 'used_time']
     list_display = fields
     list_filter = fields
-    search_fields = fields[:]
-    search_fields.remove('send_time')
+    search_fields = ['code', 'email', 'send_type']
+
+
+class EmailOutboxAdmin(object):
+    list_display = ['subject', 'recipients', 'status', 'attempts', 'next_try_time', 'sent_time', 'add_time']
+    list_filter = ['status', 'attempts', 'next_try_time', 'sent_time', 'add_time']
+    search_fields = ['subject', 'recipients', 'last_error']
+    readonly_fields = ['attempts', 'last_error', 'sent_time']
 
 
 class BannerAdmin(object):
@@ -41,6 +47,7 @@ class BannerAdmin(object):
     search_fields.remove('add_time')
 
 xadmin.site.register(EmailVerifyRecord, EmailVerifyRecordAdmin)
+xadmin.site.register(EmailOutbox, EmailOutboxAdmin)
 xadmin.site.register(Banner, BannerAdmin)
 # xadmin.site.register(UserProfile, UserProfileAdmin)
 xadmin.site.register(views.BaseAdminView, BaseSetting)
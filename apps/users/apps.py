@@ -5,3 +5,7 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     name = 'users'
     verbose_name = u'用户'
+
+    def ready(self):
+        # 注册signal receivers
+        from . import signals
@@ -0,0 +1,98 @@
+# coding: utf-8
+import hashlib
+import logging
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db import connection
+from django.utils.encoding import force_bytes
+
+logger = logging.getLogger(__name__)
+
+AUTH_SETTINGS = getattr(settings, 'AUTH_SETTINGS', {})
+
+
+def normalize_identifier(identifier):
+    """规范化登录名: 去除首尾空白, 邮箱的域名部分转为小写"""
+    identifier = (identifier or '').strip()
+    if '@' in identifier:
+        identifier = get_user_model().objects.normalize_email(identifier)
+    return identifier
+
+
+def _cache_key(identifier):
+    return 'auth_user_id:' + hashlib.md5(force_bytes(identifier)).hexdigest()
+
+
+def find_users(identifier):
+    """
+    按用户名或邮箱查询用户(一次查询): 两个索引查询的UNION(OR条件在MySQL中通常无法同时使用两个索引)
+    :return:   (list)  [(UserProfile(), 是否用户名匹配)], 用户名匹配的在前
+    """
+    UserModel = get_user_model()
+    qn = connection.ops.quote_name
+    table = qn(UserModel._meta.db_table)
+    username = qn(UserModel._meta.get_field(UserModel.USERNAME_FIELD).column)
+    if '@' not in identifier:
+        # 不含'@'的登录名不可能是邮箱
+        sql = 'SELECT *, 0 AS matched_by FROM {table} WHERE {username} = %s'.format(table=table, username=username)
+        params = [identifier]
+    else:
+        email = qn(UserModel._meta.get_field('email').column)
+        sql = 'SELECT *, 0 AS matched_by FROM {table} WHERE {username} = %s ' \
+              'UNION SELECT *, 1 AS matched_by FROM {table} WHERE {email} = %s ' \
+              'ORDER BY matched_by LIMIT 3'.format(table=table, username=username, email=email)
+        params = [identifier, identifier]
+    return [(user, user.matched_by == 0) for user in UserModel._default_manager.raw(sql, params)]
+
+
+class EmailOrUsernameBackend(ModelBackend):
+    """
+        用户名或邮箱登录
+
+        登录名到用户id的对应关系短时间缓存, 命中时只按主键查询用户;
+        密码校验成功且密码hash不是PASSWORD_HASHERS中的首选算法(或迭代次数过低)时,
+        AbstractBaseUser.check_password 会以首选算法重新hash并保存
+    """
+
+    def get_user_by_identifier(self, identifier):
+        """
+        :param identifier:   规范化后的登录名(用户名或邮箱)
+        :return:             UserProfile() or None
+        """
+        UserModel = get_user_model()
+        key = _cache_key(identifier)
+        user_id = cache.get(key)
+        if user_id is not None:
+            user = UserModel._default_manager.filter(pk=user_id).first()
+            # 缓存后用户修改了用户名或邮箱
+            if user is not None and identifier in (user.get_username(), user.email):
+                return user
+
+        users = find_users(identifier)
+        if not users:
+            return None
+        user, by_username = users[0]
+        if not by_username and len(users) > 1:
+            # 只有邮箱匹配且有多个用户使用该邮箱, 无法确定登录的用户
+            logger.warning('multiple users found by email: %s', identifier)
+            return None
+
+        cache.set(key, user.pk, AUTH_SETTINGS.get('USER_ID_CACHE_TIMEOUT', 60 * 5))
+        return user
+
+    def authenticate(self, username=None, password=None, **kwargs):
+        identifier = normalize_identifier(username)
+        if not identifier or not password:
+            return None
+
+        user = self.get_user_by_identifier(identifier)
+        if user is None:
+            # 用户不存在时同样执行一次密码hash, 避免通过响应时间判断用户是否存在
+            get_user_model()().set_password(password)
+            return None
+        if user.check_password(password):
+            return user
+        return None
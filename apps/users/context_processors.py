@@ -0,0 +1,9 @@
+# coding: utf-8
+from utils.message import get_unread_message_nums
+
+
+def unread_messages(request):
+    """页头未读消息数(缓存, 通常不查询数据库)"""
+    if not request.user.is_authenticated():
+        return {}
+    return {'unread_message_nums': get_unread_message_nums(request.user.id)}
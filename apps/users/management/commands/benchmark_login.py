@@ -0,0 +1,75 @@
+# coding: utf-8
+import time
+
+from django.contrib.auth.backends import ModelBackend
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.test.utils import override_settings
+
+from users.backends import EmailOrUsernameBackend
+from users.models import UserProfile
+
+
+class LegacyBackend(ModelBackend):
+    """原登录认证(Q(username) | Q(email) 查询), 用于对比"""
+
+    def authenticate(self, username=None, password=None, **kwargs):
+        try:
+            user = UserProfile.objects.get(Q(username=username) | Q(email=username))
+            if user.check_password(password):
+                return user
+        except:
+            return None
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = u'登录认证性能测试: 对比原认证与 EmailOrUsernameBackend 每秒的登录次数(测试数据在事务中创建并回滚)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, dest='users',
+                            help=u'创建的测试用户数')
+        parser.add_argument('--logins', type=int, default=2000, dest='logins',
+                            help=u'每种认证的登录次数')
+        parser.add_argument('--real-hasher', action='store_true', dest='real_hasher', default=False,
+                            help=u'使用settings中的密码hash算法(默认使用MD5, 只比较查询的耗时)')
+
+    def handle(self, *args, **options):
+        if options['real_hasher']:
+            self.run(options['users'], options['logins'])
+        else:
+            with override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher']):
+                self.run(options['users'], options['logins'])
+
+    def run(self, user_nums, login_nums):
+        try:
+            with transaction.atomic():
+                self.create_users(user_nums)
+                identifiers = []
+                for i in range(login_nums):
+                    # 用户名、邮箱登录各一半
+                    n = i % user_nums
+                    identifiers.append('bench_user_%d' % n if i % 2 else 'bench_%d@bench.com' % n)
+
+                for name, backend in ((u'原认证', LegacyBackend()), (u'EmailOrUsernameBackend', EmailOrUsernameBackend())):
+                    start = time.time()
+                    for identifier in identifiers:
+                        if backend.authenticate(username=identifier, password='bench_password') is None:
+                            self.stderr.write(u'{name}: {identifier} 登录失败'.format(name=name, identifier=identifier))
+                    seconds = time.time() - start
+                    self.stdout.write(u'{name}: {nums}次登录 {seconds:.3f}秒 {qps:.1f}次/秒'.format(
+                        name=name, nums=login_nums, seconds=seconds, qps=login_nums / seconds if seconds else 0))
+                raise Rollback()
+        except Rollback:
+            pass
+
+    def create_users(self, user_nums):
+        template = UserProfile()
+        template.set_password('bench_password')
+        UserProfile.objects.bulk_create([UserProfile(username='bench_user_%d' % i, email='bench_%d@bench.com' % i,
+                                                     password=template.password)
+                                         for i in range(user_nums)], batch_size=500)
@@ -0,0 +1,16 @@
+# coding: utf-8
+from django.core.management.base import BaseCommand
+
+from utils.verify_token import purge_tokens
+
+
+class Command(BaseCommand):
+    help = u'删除过期的邮箱验证码记录(可由cron定期执行)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep', type=int, default=None, dest='keep',
+                            help=u'过期记录的保留时间(秒), 默认VERIFY_TOKEN_SETTINGS["KEEP_EXPIRED"]')
+
+    def handle(self, *args, **options):
+        nums = purge_tokens(keep_seconds=options['keep'])
+        self.stdout.write(u'删除{nums}条过期的验证码记录'.format(nums=nums))
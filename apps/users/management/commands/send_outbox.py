@@ -0,0 +1,21 @@
+# coding: utf-8
+from django.core.management.base import BaseCommand
+
+from utils.mail_dispatcher import mail_dispatcher
+
+
+class Command(BaseCommand):
+    help = u'发送邮件队列中已到发送时间的邮件(可由cron定期执行), 并输出队列统计'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=1000, dest='limit',
+                            help=u'本次最多发送的邮件数')
+        parser.add_argument('--stats', action='store_true', dest='stats_only', default=False,
+                            help=u'只输出统计, 不发送')
+
+    def handle(self, *args, **options):
+        if not options['stats_only']:
+            nums = mail_dispatcher.retry_due(limit=options['limit'])
+            self.stdout.write(u'发送成功{nums}封邮件'.format(nums=nums))
+        for key, value in sorted(mail_dispatcher.stats().items()):
+            self.stdout.write(u'{key}: {value}'.format(key=key, value=value))
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9 on 2026-10-18 23:52
+from __future__ import unicode_literals
+
+import datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_emailverifyrecord_new_email'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailOutbox',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(max_length=200, verbose_name='\u6807\u9898')),
+                ('body', models.TextField(verbose_name='\u5185\u5bb9')),
+                ('from_email', models.CharField(default='', max_length=100, verbose_name='\u53d1\u4ef6\u4eba')),
+                ('recipients', models.TextField(verbose_name='\u6536\u4ef6\u4eba')),
+                ('status', models.CharField(choices=[('pending', '\u5f85\u53d1\u9001'), ('sending', '\u53d1\u9001\u4e2d'), ('sent', '\u5df2\u53d1\u9001'), ('failed', '\u53d1\u9001\u5931\u8d25')], default='pending', max_length=10, verbose_name='\u72b6\u6001')),
+                ('attempts', models.IntegerField(default=0, verbose_name='\u53d1\u9001\u6b21\u6570')),
+                ('next_try_time', models.DateTimeField(default=datetime.datetime.now, verbose_name='\u4e0b\u6b21\u53d1\u9001\u65f6\u95f4')),
+                ('last_error', models.TextField(blank=True, default='', verbose_name='\u9519\u8bef\u4fe1\u606f')),
+                ('sent_time', models.DateTimeField(blank=True, null=True, verbose_name='\u53d1\u9001\u65f6\u95f4')),
+                ('add_time', models.DateTimeField(default=datetime.datetime.now, verbose_name='\u6dfb\u52a0\u65f6\u95f4')),
+            ],
+            options={
+                'verbose_name': '\u90ae\u4ef6\u53d1\u9001\u961f\u5217',
+                'verbose_name_plural': '\u90ae\u4ef6\u53d1\u9001\u961f\u5217',
+            },
+        ),
+        migrations.AlterIndexTogether(
+            name='emailoutbox',
+            index_together=set([('status', 'next_try_time')]),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import datetime
+import hashlib
+
+from django.db import migrations, models
+
+
+def fill_tokens(apps, schema_editor):
+    """已有验证码记录: 生成token, 过期时间为发送后一天(重复的验证码只保留最新一条)"""
+    EmailVerifyRecord = apps.get_model('users', 'EmailVerifyRecord')
+    tokens = set()
+    for record in EmailVerifyRecord.objects.order_by('-send_time', '-id'):
+        email, new_email = ('', '') if record.send_type in ('register', 'forget') else (record.email, record.new_email)
+        token = hashlib.sha256(':'.join([record.send_type, email, new_email, record.code]).encode('utf-8')).hexdigest()
+        if token in tokens:
+            record.delete()
+            continue
+        tokens.add(token)
+        EmailVerifyRecord.objects.filter(id=record.id).update(
+            token=token, expire_time=record.send_time + datetime.timedelta(days=1))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_emailoutbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emailverifyrecord',
+            name='token',
+            field=models.CharField(max_length=64, null=True, verbose_name='\u9a8c\u8bc1\u7801\u6458\u8981'),
+        ),
+        migrations.AddField(
+            model_name='emailverifyrecord',
+            name='expire_time',
+            field=models.DateTimeField(db_index=True, default=datetime.datetime.now, verbose_name='\u8fc7\u671f\u65f6\u95f4'),
+        ),
+        migrations.AddField(
+            model_name='emailverifyrecord',
+            name='used_time',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='\u4f7f\u7528\u65f6\u95f4'),
+        ),
+        migrations.RunPython(fill_tokens, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='emailverifyrecord',
+            name='token',
+            field=models.CharField(max_length=64, unique=True, verbose_name='\u9a8c\u8bc1\u7801\u6458\u8981'),
+        ),
+    ]
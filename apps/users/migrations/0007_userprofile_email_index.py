@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9 on 2026-10-18 23:58
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_emailverifyrecord_token'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='userprofile',
+            index_together=set([('email',)]),
+        ),
+    ]
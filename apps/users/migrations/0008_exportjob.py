@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9 on 2026-10-19 00:22
+from __future__ import unicode_literals
+
+import datetime
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_userprofile_email_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=100, verbose_name='\u5bfc\u51fa\u6a21\u578b')),
+                ('title', models.CharField(default='', max_length=100, verbose_name='\u540d\u79f0')),
+                ('query_string', models.TextField(blank=True, default='', verbose_name='\u5bfc\u51fa\u53c2\u6570')),
+                ('status', models.CharField(choices=[('pending', '\u7b49\u5f85\u4e2d'), ('running', '\u5bfc\u51fa\u4e2d'), ('done', '\u5df2\u5b8c\u6210'), ('failed', '\u5bfc\u51fa\u5931\u8d25'), ('cancelled', '\u5df2\u53d6\u6d88')], default='pending', max_length=10, verbose_name='\u72b6\u6001')),
+                ('total_nums', models.IntegerField(default=0, verbose_name='\u603b\u884c\u6570')),
+                ('done_nums', models.IntegerField(default=0, verbose_name='\u5df2\u5bfc\u51fa\u884c\u6570')),
+                ('file_name', models.CharField(blank=True, default='', max_length=200, verbose_name='\u5bfc\u51fa\u6587\u4ef6')),
+                ('file_size', models.BigIntegerField(default=0, verbose_name='\u6587\u4ef6\u5927\u5c0f')),
+                ('error', models.TextField(blank=True, default='', verbose_name='\u9519\u8bef\u4fe1\u606f')),
+                ('add_time', models.DateTimeField(default=datetime.datetime.now, verbose_name='\u6dfb\u52a0\u65f6\u95f4')),
+                ('start_time', models.DateTimeField(blank=True, null=True, verbose_name='\u5f00\u59cb\u65f6\u95f4')),
+                ('update_time', models.DateTimeField(default=datetime.datetime.now, verbose_name='\u66f4\u65b0\u65f6\u95f4')),
+                ('finish_time', models.DateTimeField(blank=True, null=True, verbose_name='\u5b8c\u6210\u65f6\u95f4')),
+                ('expire_time', models.DateTimeField(db_index=True, default=datetime.datetime.now, verbose_name='\u8fc7\u671f\u65f6\u95f4')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='\u7528\u6237')),
+            ],
+            options={
+                'verbose_name': '\u5bfc\u51fa\u4efb\u52a1',
+                'verbose_name_plural': '\u5bfc\u51fa\u4efb\u52a1',
+            },
+        ),
+        migrations.AlterIndexTogether(
+            name='exportjob',
+            index_together=set([('user', 'add_time'), ('status', 'update_time')]),
+        ),
+    ]
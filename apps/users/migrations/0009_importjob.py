@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9 on 2026-10-19 00:28
+from __future__ import unicode_literals
+
+import datetime
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0008_exportjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=100, verbose_name='\u5bfc\u5165\u6a21\u578b')),
+                ('file_name', models.CharField(db_index=True, max_length=200, verbose_name='\u4e34\u65f6\u6587\u4ef6')),
+                ('original_file_name', models.CharField(blank=True, default='', max_length=200, verbose_name='\u4e0a\u4f20\u6587\u4ef6')),
+                ('input_format', models.CharField(blank=True, default='', max_length=20, verbose_name='\u6587\u4ef6\u683c\u5f0f')),
+                ('status', models.CharField(choices=[('pending', '\u7b49\u5f85\u4e2d'), ('running', '\u5bfc\u5165\u4e2d'), ('done', '\u5df2\u5b8c\u6210'), ('failed', '\u5bfc\u5165\u5931\u8d25')], default='pending', max_length=10, verbose_name='\u72b6\u6001')),
+                ('done_rows', models.IntegerField(default=0, verbose_name='\u5df2\u5bfc\u5165\u884c\u6570')),
+                ('new_nums', models.IntegerField(default=0, verbose_name='\u65b0\u589e')),
+                ('update_nums', models.IntegerField(default=0, verbose_name='\u66f4\u65b0')),
+                ('skip_nums', models.IntegerField(default=0, verbose_name='\u8df3\u8fc7')),
+                ('delete_nums', models.IntegerField(default=0, verbose_name='\u5220\u9664')),
+                ('error', models.TextField(blank=True, default='', verbose_name='\u9519\u8bef\u4fe1\u606f')),
+                ('add_time', models.DateTimeField(default=datetime.datetime.now, verbose_name='\u6dfb\u52a0\u65f6\u95f4')),
+                ('update_time', models.DateTimeField(default=datetime.datetime.now, verbose_name='\u66f4\u65b0\u65f6\u95f4')),
+                ('finish_time', models.DateTimeField(blank=True, null=True, verbose_name='\u5b8c\u6210\u65f6\u95f4')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='\u7528\u6237')),
+            ],
+            options={
+                'verbose_name': '\u5bfc\u5165\u4efb\u52a1',
+                'verbose_name_plural': '\u5bfc\u5165\u4efb\u52a1',
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.contrib.auth.base_user import BaseUserManager
+from django.db import migrations
+
+
+def normalize(value):
+    """同users.backends.normalize_identifier: 去除首尾空白, 邮箱的域名部分转为小写"""
+    value = value.strip()
+    return BaseUserManager.normalize_email(value) if '@' in value else value
+
+
+def normalize_emails(apps, schema_editor):
+    """
+    已注册用户的邮箱(及以邮箱作为的用户名)按登录时的规则规范化, 登录名与数据库中的值精确匹配;
+    规范化后的用户名已被其他用户使用时保留原用户名
+    """
+    UserProfile = apps.get_model('users', 'UserProfile')
+    for pk, username, email in UserProfile.objects.values_list('pk', 'username', 'email').iterator():
+        new_email = normalize(email)
+        new_username = normalize(username)
+        if new_username != username and UserProfile.objects.filter(username=new_username).exists():
+            new_username = username
+        if (new_username, new_email) != (username, email):
+            UserProfile.objects.filter(pk=pk).update(username=new_username, email=new_email)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0009_importjob'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_emails, migrations.RunPython.noop),
+    ]
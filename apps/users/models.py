@@ -19,23 +19,21 @@ class UserProfile(AbstractUser):
     class Meta:
         verbose_name = '用户信息'
         verbose_name_plural = verbose_name
+        # 邮箱登录
+        index_together = [['email']]
 
     def __unicode__(self):
         return self.username
 
     def log(self, message=''):
-        """记录用户操作"""
-        from operation.models import UserMessage
-
-        m = UserMessage()
-        m.user = self.id
-        m.message = message
-        m.save()
+        """记录用户操作(异步批量写入UserMessage)"""
+        from utils.activity_log import activity_log
+        activity_log.log(self.id, message)
 
     def unread_nums(self):
-        """获取用户未读消息数量"""
-        from operation.models import UserMessage
-        return UserMessage.objects.filter(user=self.id, has_read=False).count()
+        """获取用户未读消息数量(缓存)"""
+        from utils.message import get_unread_message_nums
+        return get_unread_message_nums(self.id)
 
 
 class EmailVerifyRecord(models.Model):
@@ -46,6 +44,10 @@ class EmailVerifyRecord(models.Model):
                                           ('update_email', u'修改邮箱')),
                                  max_length=20, verbose_name=u'验证码类型')
     send_time = models.DateTimeField(default=datetime.now, verbose_name=u'发送时间')
+    # 验证码类型、邮箱及验证码的sha256, 验证时按该字段查询(utils.verify_token)
+    token = models.CharField(max_length=64, unique=True, verbose_name=u'验证码摘要')
+    expire_time = models.DateTimeField(default=datetime.now, db_index=True, verbose_name=u'过期时间')
+    used_time = models.DateTimeField(null=True, blank=True, verbose_name=u'使用时间')
 
     class Meta:
         verbose_name = u'邮箱验证码'
@@ -55,6 +57,125 @@ class EmailVerifyRecord(models.Model):
         return '{code} ({email})'.format(code=self.code, email=self.email)
 
 
+class EmailOutbox(models.Model):
+    """待发送邮件(发送失败时按退避时间重试)"""
+    STATUS_PENDING = 'pending'
+    STATUS_SENDING = 'sending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+
+    subject = models.CharField(max_length=200, verbose_name=u'标题')
+    body = models.TextField(verbose_name=u'内容')
+    from_email = models.CharField(max_length=100, verbose_name=u'发件人', default='')
+    recipients = models.TextField(verbose_name=u'收件人')
+    status = models.CharField(choices=((STATUS_PENDING, u'待发送'), (STATUS_SENDING, u'发送中'),
+                                       (STATUS_SENT, u'已发送'), (STATUS_FAILED, u'发送失败')),
+                              max_length=10, default=STATUS_PENDING, verbose_name=u'状态')
+    attempts = models.IntegerField(default=0, verbose_name=u'发送次数')
+    next_try_time = models.DateTimeField(default=datetime.now, verbose_name=u'下次发送时间')
+    last_error = models.TextField(default='', blank=True, verbose_name=u'错误信息')
+    sent_time = models.DateTimeField(null=True, blank=True, verbose_name=u'发送时间')
+    add_time = models.DateTimeField(default=datetime.now, verbose_name=u'添加时间')
+
+    class Meta:
+        verbose_name = u'邮件发送队列'
+        verbose_name_plural = verbose_name
+        # 按状态及下次发送时间取出待重试的邮件
+        index_together = [('status', 'next_try_time')]
+
+    def __unicode__(self):
+        return '{subject} ({recipients})'.format(subject=self.subject, recipients=self.recipients)
+
+    def recipient_list(self):
+        return [email for email in self.recipients.split(',') if email]
+
+
+class ExportJob(models.Model):
+    """xadmin后台导出任务(utils.export_jobs), 导出文件只能由任务所属用户下载, 过期后删除"""
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CANCELLED = 'cancelled'
+
+    user = models.ForeignKey(UserProfile, verbose_name=u'用户')
+    model = models.CharField(max_length=100, verbose_name=u'导出模型')
+    title = models.CharField(max_length=100, default='', verbose_name=u'名称')
+    # 列表页的筛选、搜索、排序及导出格式参数
+    query_string = models.TextField(default='', blank=True, verbose_name=u'导出参数')
+    status = models.CharField(choices=((STATUS_PENDING, u'等待中'), (STATUS_RUNNING, u'导出中'),
+                                       (STATUS_DONE, u'已完成'), (STATUS_FAILED, u'导出失败'),
+                                       (STATUS_CANCELLED, u'已取消')),
+                              max_length=10, default=STATUS_PENDING, verbose_name=u'状态')
+    total_nums = models.IntegerField(default=0, verbose_name=u'总行数')
+    done_nums = models.IntegerField(default=0, verbose_name=u'已导出行数')
+    # 导出文件在 EXPORT_JOB_SETTINGS['ROOT'] 中的相对路径
+    file_name = models.CharField(max_length=200, default='', blank=True, verbose_name=u'导出文件')
+    file_size = models.BigIntegerField(default=0, verbose_name=u'文件大小')
+    error = models.TextField(default='', blank=True, verbose_name=u'错误信息')
+    add_time = models.DateTimeField(default=datetime.now, verbose_name=u'添加时间')
+    start_time = models.DateTimeField(null=True, blank=True, verbose_name=u'开始时间')
+    # 导出中定期更新, 超过LEASE未更新(如进程退出)的任务可被重新执行
+    update_time = models.DateTimeField(default=datetime.now, verbose_name=u'更新时间')
+    finish_time = models.DateTimeField(null=True, blank=True, verbose_name=u'完成时间')
+    expire_time = models.DateTimeField(default=datetime.now, db_index=True, verbose_name=u'过期时间')
+
+    class Meta:
+        verbose_name = u'导出任务'
+        verbose_name_plural = verbose_name
+        # 用户的导出任务列表; 按状态取出待执行的任务
+        index_together = [('user', 'add_time'), ('status', 'update_time')]
+
+    def __unicode__(self):
+        return '{title} ({user})'.format(title=self.title, user=self.user_id)
+
+    def is_active(self):
+        return self.status in (self.STATUS_PENDING, self.STATUS_RUNNING)
+
+    def percent(self):
+        """导出进度(0-100)"""
+        if self.status == self.STATUS_DONE:
+            return 100
+        if not self.total_nums:
+            return 0
+        return min(self.done_nums * 100 // self.total_nums, 99)
+
+
+class ImportJob(models.Model):
+    """xadmin分批导入任务(utils.bulk_import), done_rows为已提交的行数, 中断后重新提交从该行继续导入"""
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+
+    user = models.ForeignKey(UserProfile, verbose_name=u'用户')
+    model = models.CharField(max_length=100, verbose_name=u'导入模型')
+    # 上传文件保存在临时存储中的文件名
+    file_name = models.CharField(max_length=200, db_index=True, verbose_name=u'临时文件')
+    original_file_name = models.CharField(max_length=200, default='', blank=True, verbose_name=u'上传文件')
+    input_format = models.CharField(max_length=20, default='', blank=True, verbose_name=u'文件格式')
+    status = models.CharField(choices=((STATUS_PENDING, u'等待中'), (STATUS_RUNNING, u'导入中'),
+                                       (STATUS_DONE, u'已完成'), (STATUS_FAILED, u'导入失败')),
+                              max_length=10, default=STATUS_PENDING, verbose_name=u'状态')
+    done_rows = models.IntegerField(default=0, verbose_name=u'已导入行数')
+    new_nums = models.IntegerField(default=0, verbose_name=u'新增')
+    update_nums = models.IntegerField(default=0, verbose_name=u'更新')
+    skip_nums = models.IntegerField(default=0, verbose_name=u'跳过')
+    delete_nums = models.IntegerField(default=0, verbose_name=u'删除')
+    error = models.TextField(default='', blank=True, verbose_name=u'错误信息')
+    add_time = models.DateTimeField(default=datetime.now, verbose_name=u'添加时间')
+    # 每批提交时更新, 导入中超过LEASE未更新(如请求超时、进程退出)的任务可重新提交继续导入
+    update_time = models.DateTimeField(default=datetime.now, verbose_name=u'更新时间')
+    finish_time = models.DateTimeField(null=True, blank=True, verbose_name=u'完成时间')
+
+    class Meta:
+        verbose_name = u'导入任务'
+        verbose_name_plural = verbose_name
+
+    def __unicode__(self):
+        return '{file_name} ({user})'.format(file_name=self.original_file_name, user=self.user_id)
+
+
 class Banner(models.Model):
     title = models.CharField(max_length=100, verbose_name=u'标题')
     image = models.ImageField(upload_to='banner/%Y/%m', verbose_name=u'轮播图', max_length=100)
@@ -0,0 +1,22 @@
+# coding: utf-8
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from xadmin.filters import invalidate_filter_choices
+
+from .models import Banner
+from utils.bulk_import import post_bulk_import
+from utils.page_cache import invalidate_tags, TAG_BANNER
+
+
+@receiver(post_save, sender=Banner)
+@receiver(post_delete, sender=Banner)
+def invalidate_banner_pages(sender, **kwargs):
+    """轮播图保存、删除后清除首页的缓存"""
+    invalidate_tags(TAG_BANNER)
+
+
+@receiver(post_bulk_import)
+def invalidate_imported_filter_choices(sender, **kwargs):
+    """后台批量导入(不触发post_save)后清除该模型的xadmin筛选项缓存"""
+    invalidate_filter_choices(sender)
@@ -1,3 +1,162 @@
-from django.test import TestCase
+# coding: utf-8
+"""
+    邮件发送队列(utils.mail_dispatcher): 写入EmailOutbox后发送, 发送失败按指数退避时间重试
+    注册、修改邮箱时保存规范化后的邮箱(与登录时的规范化一致)
+"""
+from datetime import datetime, timedelta
+from importlib import import_module
+from smtplib import SMTPException
 
-# Create your tests here.
+from captcha.models import CaptchaStore
+from django.apps import apps
+from django.contrib.auth import authenticate
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.urlresolvers import reverse
+from django.test import TestCase, override_settings
+
+from courses.tests import TEST_CACHES
+from users.models import EmailOutbox, UserProfile
+from utils.mail_dispatcher import MailDispatcher
+from utils.verify_token import create_token
+
+LOCMEM_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+
+
+class FailingEmailBackend(BaseEmailBackend):
+    """每封邮件都发送失败的后端"""
+
+    def send_messages(self, email_messages):
+        raise SMTPException('connection unexpectedly closed')
+
+
+class RejectingEmailBackend(locmem.EmailBackend):
+    """收件人为reject@example.com的邮件发送失败"""
+
+    def send_messages(self, messages):
+        if any('reject@example.com' in message.to for message in messages):
+            raise SMTPException('recipient refused')
+        return super(RejectingEmailBackend, self).send_messages(messages)
+
+
+@override_settings(EMAIL_BACKEND=LOCMEM_BACKEND)
+class MailDispatcherTest(TestCase):
+
+    def setUp(self):
+        self.dispatcher = MailDispatcher(mode='sync', max_attempts=3, retry_delay=60)
+
+    def make_due(self):
+        EmailOutbox.objects.update(next_try_time=datetime.now() - timedelta(seconds=1))
+
+    def test_send(self):
+        email = self.dispatcher.send(u'注册激活链接', u'请点击链接激活', ['user@example.com'], from_email='from@example.com')
+
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts, email.last_error), (EmailOutbox.STATUS_SENT, 1, ''))
+        self.assertIsNotNone(email.sent_time)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual((mail.outbox[0].subject, mail.outbox[0].to, mail.outbox[0].from_email),
+                         (u'注册激活链接', ['user@example.com'], 'from@example.com'))
+
+        stats = self.dispatcher.stats()
+        self.assertEqual((stats['sent_nums'], stats['retry_nums'], stats['failed_nums']), (1, 0, 0))
+        self.assertEqual((stats['outbox_pending'], stats['outbox_failed'], stats['queue_depth']), (0, 0, 0))
+
+    def test_retry_backoff(self):
+        with override_settings(EMAIL_BACKEND='users.tests.FailingEmailBackend'):
+            start = datetime.now()
+            email = self.dispatcher.send(u'标题', u'内容', ['user@example.com'])
+            email.refresh_from_db()
+            self.assertEqual((email.status, email.attempts), (EmailOutbox.STATUS_PENDING, 1))
+            self.assertIn('connection unexpectedly closed', email.last_error)
+            self.assertGreaterEqual(email.next_try_time, start + timedelta(seconds=60))
+
+            # 未到重试时间
+            self.assertEqual(self.dispatcher.retry_due(), 0)
+            self.assertEqual(EmailOutbox.objects.get(id=email.id).attempts, 1)
+
+            # 第二次失败后等待时间翻倍
+            self.make_due()
+            start = datetime.now()
+            self.assertEqual(self.dispatcher.retry_due(), 0)
+            email.refresh_from_db()
+            self.assertEqual((email.status, email.attempts), (EmailOutbox.STATUS_PENDING, 2))
+            self.assertGreaterEqual(email.next_try_time, start + timedelta(seconds=120))
+            self.assertLess(email.next_try_time, start + timedelta(seconds=180))
+
+        self.make_due()
+        self.assertEqual(self.dispatcher.retry_due(), 1)
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), (EmailOutbox.STATUS_SENT, 3))
+        self.assertEqual(len(mail.outbox), 1)
+
+        stats = self.dispatcher.stats()
+        self.assertEqual((stats['sent_nums'], stats['retry_nums'], stats['failed_nums']), (1, 2, 0))
+
+    def test_max_attempts(self):
+        self.dispatcher.max_attempts = 2
+        with override_settings(EMAIL_BACKEND='users.tests.FailingEmailBackend'):
+            email = self.dispatcher.send(u'标题', u'内容', ['user@example.com'])
+            self.make_due()
+            self.dispatcher.retry_due()
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), (EmailOutbox.STATUS_FAILED, 2))
+
+        # 发送失败的邮件不再重试
+        self.make_due()
+        self.assertEqual(self.dispatcher.retry_due(), 0)
+        self.assertEqual(len(mail.outbox), 0)
+        stats = self.dispatcher.stats()
+        self.assertEqual((stats['failed_nums'], stats['outbox_failed'], stats['outbox_pending']), (1, 1, 0))
+
+    def test_batch_failure_per_email(self):
+        """一批中部分邮件发送失败时只重试失败的邮件"""
+        emails = [EmailOutbox.objects.create(subject=u'标题%d' % i, body=u'内容', recipients=recipients)
+                  for i, recipients in enumerate(['a@example.com', 'reject@example.com', 'c@example.com'])]
+        with override_settings(EMAIL_BACKEND='users.tests.RejectingEmailBackend'):
+            self.assertEqual(self.dispatcher.deliver([email.id for email in emails]), 2)
+        self.assertEqual([EmailOutbox.objects.get(id=email.id).status for email in emails],
+                         [EmailOutbox.STATUS_SENT, EmailOutbox.STATUS_PENDING, EmailOutbox.STATUS_SENT])
+        self.assertEqual([message.to for message in mail.outbox], [['a@example.com'], ['c@example.com']])
+
+
+@override_settings(CACHES=TEST_CACHES)
+class NormalizeEmailTest(TestCase):
+
+    def test_register(self):
+        captcha = CaptchaStore.objects.get(hashkey=CaptchaStore.generate_key())
+        self.client.post(reverse('register'), {'email': ' New.User@Example.COM ', 'password': 'password',
+                                               'captcha_0': captcha.hashkey, 'captcha_1': captcha.response})
+        user = UserProfile.objects.get()
+        self.assertEqual((user.username, user.email), ('New.User@example.com', 'New.User@example.com'))
+
+        user.is_active = True
+        user.save()
+        self.assertEqual(authenticate(username='New.User@EXAMPLE.com', password='password'), user)
+
+    def test_update_email(self):
+        user = UserProfile(username='user', email='old@example.com')
+        user.set_password('password')
+        user.save()
+        self.client.login(username='user', password='password')
+        code = create_token('update_email', 'old@example.com', new_email='new@example.com', length=4)
+
+        response = self.client.post(reverse('user:update_email'), {'email': 'new@Example.com', 'code': code})
+        self.assertContains(response, 'success')
+        user.refresh_from_db()
+        self.assertEqual(user.email, 'new@example.com')
+
+    def test_migration(self):
+        migration = import_module('users.migrations.0010_normalize_email')
+        UserProfile.objects.bulk_create([
+            UserProfile(username='a@Example.COM', email='a@Example.COM'),
+            UserProfile(username='user', email=' b@EXAMPLE.com'),
+            # 规范化后的用户名已被使用
+            UserProfile(username='c@Example.com', email='c@Example.com'),
+            UserProfile(username='c@example.com', email='c@example.com'),
+        ])
+        migration.normalize_emails(apps, None)
+        self.assertEqual(list(UserProfile.objects.order_by('id').values_list('username', 'email')),
+                         [('a@example.com', 'a@example.com'), ('user', 'b@example.com'),
+                          ('c@Example.com', 'c@example.com'), ('c@example.com', 'c@example.com')])
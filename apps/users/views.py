@@ -3,45 +3,44 @@ import json
 
 from django.core.urlresolvers import reverse
 from django.contrib.auth import authenticate, login, logout
-from django.contrib.auth.backends import ModelBackend
 from django.contrib.auth.hashers import make_password
-from django.db.models import Q
 from django.http import HttpResponse, HttpResponseRedirect
 from django.shortcuts import render, render_to_response
+from django.utils.decorators import method_decorator
 from django.views.generic.base import View
 
-from .models import UserProfile, EmailVerifyRecord, Banner
+from .backends import normalize_identifier
+from .models import UserProfile, Banner
 from .forms import LoginForm, RegisterForm, ForgetPasswordForm, ModifyPasswordForm, UploadImageForm, UserInfoForm
 from courses.models import Course
-from operation.models import UserCourse, UserFavorite, UserMessage
-from organization.models import CourseOrg, Teacher
-from pure_pagination import PageNotAnInteger, Paginator
+from operation.models import UserCourse, UserFavorite
+from organization.models import CourseOrg
+from pure_pagination import PageNotAnInteger
 from utils.email_send import send_register_email
+from utils.favorite import FavoritePaginator, FAV_TYPE_COURSE, FAV_TYPE_ORG, FAV_TYPE_TEACHER
+from utils.keyset_pagination import paginate
+from utils.message import get_user_messages, mark_messages_read
+from utils.page_cache import cache_anonymous_page, get_fragment, TAG_BANNER, TAG_COURSE, TAG_ORG
 from utils.mixin_utils import LoginRequiredMixin
+from utils.verify_token import check_token, consume_token
 from Lighten.settings import PAGINATION_SETTINGS
 
 
-class CustomBackend(ModelBackend):
-    def authenticate(self, username=None, password=None, **kwargs):
-        try:
-            user = UserProfile.objects.get(Q(username=username) | Q(email=username))
-            if user.check_password(password):
-                return user
-        except:
-            return None
-
-
 class IndexView(View):
     """首页"""
 
+    @method_decorator(cache_anonymous_page(tags=[TAG_BANNER, TAG_COURSE, TAG_ORG]))
     def get(self, request):
         # 轮播图
-        banners = Banner.objects.order_by('index').all()
+        banners = get_fragment('index_banners', [TAG_BANNER],
+                               lambda: list(Banner.objects.order_by('index')))
         # 课程
-        courses = Course.objects.filter(is_banner=False).order_by('-students')[:5]
-        banner_courses = Course.objects.filter(is_banner=True)[:3]
+        courses = get_fragment('index_courses', [TAG_COURSE],
+                               lambda: list(Course.objects.filter(is_banner=False).order_by('-students')[:5]))
+        banner_courses = get_fragment('index_banner_courses', [TAG_COURSE],
+                                      lambda: list(Course.objects.filter(is_banner=True)[:3]))
         # 机构
-        course_orgs = CourseOrg.objects.all()[:15]
+        course_orgs = get_fragment('index_orgs', [TAG_ORG], lambda: list(CourseOrg.objects.all()[:15]))
         return render(request, 'index.html', {'banners': banners,
                                               'courses': courses,
                                               'banner_courses': banner_courses,
@@ -95,7 +94,8 @@ class RegisterView(View):
     def post(self, request):
         register_form = RegisterForm(request.POST)
         if register_form.is_valid():
-            email = request.POST.get('email', '')
+            # 邮箱(同时作为用户名)的域名部分转为小写, 与登录时规范化后的登录名一致
+            email = normalize_identifier(request.POST.get('email', ''))
             # 邮箱是否已被注册
             if UserProfile.objects.filter(email=email):
                 return render(request, 'register.html',
@@ -121,13 +121,13 @@ class ActiveUserView(View):
     """用户邮箱激活"""
 
     def get(self, request, active_code):
-        email_verify_records = EmailVerifyRecord.objects.filter(code=active_code)
-        if email_verify_records:
-            for record in email_verify_records:
-                user = UserProfile.objects.get(email=record.email)
-                user.is_active = True
-                user.save()
-                user.log('你已激活')
+        # 验证码只能使用一次
+        record = consume_token('register', active_code)
+        if record:
+            user = UserProfile.objects.get(email=record.email)
+            user.is_active = True
+            user.save()
+            user.log('你已激活')
             return render(request, 'login.html')
         else:
             return render(request, 'active_fail.html')
@@ -143,7 +143,7 @@ class ForgetPasswordView(View):
     def post(self, request):
         forget_form = ForgetPasswordForm(request.POST)
         if forget_form.is_valid():
-            email = request.POST.get('email')
+            email = normalize_identifier(request.POST.get('email'))
             send_register_email(email, 'forget', host=request.get_host())
             return render(request, 'send_success.html')
         return render(request, 'forgetpwd.html', {'forget_form': forget_form})
@@ -153,11 +153,10 @@ class ResetPasswordView(View):
     """处理用户重置密码的链接"""
 
     def get(self, request, reset_code):
-        email_verify_records = EmailVerifyRecord.objects.filter(code=reset_code)
-        if email_verify_records:
-            for record in email_verify_records:
-                email = record.email
-                return render(request, 'password_reset.html', {'email': email})
+        # 显示重置密码表单, 提交新密码时才使用验证码
+        record = check_token('forget', reset_code)
+        if record:
+            return render(request, 'password_reset.html', {'email': record.email, 'code': reset_code})
         else:
             return render(request, 'active_fail.html')
 
@@ -167,14 +166,21 @@ class ModifyPasswordView(View):
 
     def post(self, request):
         modify_form = ModifyPasswordForm(request.POST)
-        email = request.POST.get('email', '')
+        code = request.POST.get('code', '')
+        # 用户邮箱由找回密码的验证码确定
+        record = check_token('forget', code)
+        if not record:
+            return render(request, 'active_fail.html')
+        email = record.email
 
         if modify_form.is_valid():
             password = request.POST.get('password', '')
             password_repeat = request.POST.get('password_repeat', '')
             # 验证两次密码输入一致
             if password != password_repeat:
-                return render(request, 'password_reset.html', {'email': email, 'msg': '密码不一致'})
+                return render(request, 'password_reset.html', {'email': email, 'code': code, 'msg': '密码不一致'})
+            if not consume_token('forget', code):
+                return render(request, 'active_fail.html')
             # 更新用户密码
             user = UserProfile.objects.get(email=email)
             user.password = make_password(password)
@@ -182,10 +188,28 @@ class ModifyPasswordView(View):
             user.log('(通过邮箱验证)重置了密码')
             # 密码修改成功, 返回登录界面
             return render(request, 'login.html')
-        return render(request, 'password_reset.html', {'email': email, 'modify_form': modify_form})
+        return render(request, 'password_reset.html', {'email': email, 'code': code, 'modify_form': modify_form})
 
 
 # ###################个人中心View################### #
+def get_fav_paginator(request, fav_type):
+    """
+    获取用户某类收藏的分页(按收藏时间倒序), 当前页的收藏对象按类型批量查询
+    :param request:    request对象
+    :param fav_type:   (int)   收藏类型 (1, u'课程'), (2, u'课程机构'), (3, u'讲师')
+    :return:           Page    object_list为收藏对象
+    """
+    fav_records = UserFavorite.objects.filter(user=request.user, fav_type=fav_type).order_by('-add_time')
+
+    per_page = PAGINATION_SETTINGS.get('FAV_NUM_PER_PAGE', 12)
+    paginator = FavoritePaginator(fav_records, per_page, request=request)
+    try:
+        page_num = int(request.GET.get('page', 1))
+    except (PageNotAnInteger, ValueError):
+        page_num = 1
+    return paginator.page(page_num)
+
+
 class UserInfoView(LoginRequiredMixin, View):
     """
         个人中心 - 用户个人信息
@@ -252,7 +276,7 @@ class SendEmailCodeView(LoginRequiredMixin, View):
     """发送邮箱验证"""
 
     def get(self, request):
-        new_email = request.GET.get('email', '')
+        new_email = normalize_identifier(request.GET.get('email', ''))
 
         if UserProfile.objects.filter(email=new_email):
             return HttpResponse('{"email": "邮箱已经存在"}', content_type='application/json')
@@ -267,13 +291,11 @@ class UpdateEmailView(LoginRequiredMixin, View):
     def post(self, request):
         request.user.log('尝试修改绑定邮箱')
         # 新邮箱地址
-        new_email = request.POST.get('email', '')
+        new_email = normalize_identifier(request.POST.get('email', ''))
         # 验证码
         code = request.POST.get('code', '')
 
-        existed_records = EmailVerifyRecord.objects.filter(email=request.user.email, code=code,
-                                                           new_email=new_email, send_type='update_email')
-        if existed_records:
+        if consume_token('update_email', code, email=request.user.email, new_email=new_email):
             user = request.user
             user.log('绑定邮箱已由{old_email}修改为{new_email}'.format(old_email=user.email, new_email=new_email))
             user.email = new_email
@@ -295,36 +317,27 @@ class FavOrgView(LoginRequiredMixin, View):
     """收藏机构"""
 
     def get(self, request):
-        # (1, u'课程'), (2, u'课程机构'), (3, u'讲师')
-        fav_records = UserFavorite.objects.filter(user=request.user, fav_type=2)
-        user_fav_orgs = []
-        for i in fav_records:
-            user_fav_orgs.append(CourseOrg.objects.get(id=i.fav_id))
-        return render(request, 'usercenter-fav-org.html', {'user_fav_orgs': user_fav_orgs})
+        fav_paginator = get_fav_paginator(request, FAV_TYPE_ORG)
+        return render(request, 'usercenter-fav-org.html', {'user_fav_orgs': fav_paginator.object_list,
+                                                           'fav_paginator': fav_paginator})
 
 
 class FavTeacherView(LoginRequiredMixin, View):
     """收藏教师"""
 
     def get(self, request):
-        # (1, u'课程'), (2, u'课程机构'), (3, u'讲师')
-        fav_records = UserFavorite.objects.filter(user=request.user, fav_type=3)
-        user_fav_teachers = []
-        for i in fav_records:
-            user_fav_teachers.append(Teacher.objects.get(id=i.fav_id))
-        return render(request, 'usercenter-fav-teacher.html', {'user_fav_teachers': user_fav_teachers})
+        fav_paginator = get_fav_paginator(request, FAV_TYPE_TEACHER)
+        return render(request, 'usercenter-fav-teacher.html', {'user_fav_teachers': fav_paginator.object_list,
+                                                               'fav_paginator': fav_paginator})
 
 
 class FavCourseView(LoginRequiredMixin, View):
     """收藏课程"""
 
     def get(self, request):
-        # (1, u'课程'), (2, u'课程机构'), (3, u'讲师')
-        fav_records = UserFavorite.objects.filter(fav_type=1)
-        user_fav_courses = []
-        for i in fav_records:
-            user_fav_courses.append(Course.objects.get(id=i.fav_id))
-        return render(request, 'usercenter-fav-course.html', {'user_fav_courses': user_fav_courses})
+        fav_paginator = get_fav_paginator(request, FAV_TYPE_COURSE)
+        return render(request, 'usercenter-fav-course.html', {'user_fav_courses': fav_paginator.object_list,
+                                                              'fav_paginator': fav_paginator})
 
 
 class UserMessageView(LoginRequiredMixin, View):
@@ -332,21 +345,14 @@ class UserMessageView(LoginRequiredMixin, View):
 
     def get(self, request):
         # UserMessage.user == 0 代表全体消息
-        messages = UserMessage.objects.filter(Q(user=request.user.id) | Q(user=0)).order_by('-add_time')
-
-        # 所有消息标为已读
-        for msg in messages:
-            msg.has_read = True
-            msg.save()
+        messages = get_user_messages(request.user.id)
 
         # 对消息进行分页
         per_page = PAGINATION_SETTINGS.get('MESSAGE_NUM_PER_PAGE', 10)
-        p = Paginator(messages, per_page, request=request)
-        try:
-            page_num = int(request.GET.get('page', 1))
-        except PageNotAnInteger:
-            page_num = 1
-        messages_paginator = p.page(page_num)
+        messages_paginator = paginate(request, messages, per_page, ordering=['-add_time', '-id'])
+
+        # 只将当前页的消息标为已读
+        messages_paginator.object_list = mark_messages_read(request.user.id, messages_paginator.object_list)
 
         return render(request, 'usercenter-message.html', {'messages_paginator': messages_paginator})
 
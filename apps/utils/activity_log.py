@@ -0,0 +1,149 @@
+# coding: utf-8
+import atexit
+import logging
+import threading
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.six.moves import queue
+
+from utils.background import WorkerThreadMixin
+
+logger = logging.getLogger(__name__)
+
+
+class ActivityLogQueue(WorkerThreadMixin):
+    """
+        用户操作记录(UserProfile.log)的异步批量写入
+
+        记录先进入进程内的有界队列, 由后台线程按时间间隔或数量批量bulk_create为UserMessage,
+        请求中不再等待每条记录的INSERT
+    """
+
+    def __init__(self, mode='async', flush_interval=2, flush_size=100, max_size=10000, overflow='drop',
+                 block_timeout=0.1):
+        self._queue = queue.Queue(maxsize=max_size)
+        self._lock = threading.Lock()
+        # 后台写入线程(每个进程一个)
+        self.init_workers('activity log writer')
+        # 队列已满被丢弃的记录数
+        self.dropped_nums = 0
+        self.configure(mode, flush_interval, flush_size, max_size, overflow, block_timeout)
+
+    def configure(self, mode='async', flush_interval=2, flush_size=100, max_size=10000, overflow='drop',
+                  block_timeout=0.1):
+        """
+        :param mode:             (str)   'async' 后台线程批量写入, 'sync' 立即写入(测试)
+        :param flush_interval:   (int)   写入间隔(秒)
+        :param flush_size:       (int)   每批写入的最大记录数
+        :param max_size:         (int)   队列容量
+        :param overflow:         (str)   队列已满时的策略: 'drop' 丢弃新记录,
+                                         'block' 最多等待block_timeout秒, 仍满则丢弃, 'sync' 在请求中直接写入
+        :param block_timeout:    (float) 'block'策略的等待时间(秒)
+        """
+        self.mode = mode
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self._queue.maxsize = max_size
+
+    def log(self, user_id, message):
+        """
+        记录用户操作
+        :param user_id:   (int)   用户id
+        :param message:   (str)   操作内容
+        :return:
+        """
+        entry = (user_id, message, datetime.now())
+        if self.mode == 'sync':
+            self._write([entry])
+            return
+
+        self._ensure_workers()
+        try:
+            if self.overflow == 'block':
+                self._queue.put(entry, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(entry)
+        except queue.Full:
+            if self.overflow == 'sync':
+                self._write([entry])
+            else:
+                with self._lock:
+                    self.dropped_nums += 1
+                logger.warning('activity log queue is full, dropped: %s', entry)
+
+    def flush(self):
+        """写入队列中所有的记录"""
+        while True:
+            entries = self._take(self.flush_size, timeout=None)
+            if not entries:
+                return
+            self._write(entries)
+
+    def _take(self, nums, timeout):
+        """从队列取出最多nums条记录, timeout为None时不等待"""
+        entries = []
+        deadline = time.time() + timeout if timeout else None
+        while len(entries) < nums:
+            try:
+                if deadline is None:
+                    entries.append(self._queue.get_nowait())
+                else:
+                    entries.append(self._queue.get(timeout=max(deadline - time.time(), 0.01)))
+            except queue.Empty:
+                break
+            if deadline is not None and time.time() >= deadline:
+                break
+        return entries
+
+    def _write(self, entries):
+        from operation.models import UserMessage
+        from utils.message import invalidate_unread_message_nums
+
+        try:
+            UserMessage.objects.bulk_create([UserMessage(user=user_id, message=message, add_time=add_time)
+                                             for user_id, message, add_time in entries])
+        except Exception:
+            logger.exception('write %d activity logs failed', len(entries))
+            return
+
+        # 写入后清除用户未读消息数的缓存
+        for user_id in set(entry[0] for entry in entries):
+            invalidate_unread_message_nums(user_id)
+
+    def _take_work(self):
+        return self._take(self.flush_size, timeout=self.flush_interval)
+
+    def _process_work(self, entries):
+        if entries:
+            self._write(entries)
+
+
+def get_activity_log_config():
+    """ACTIVITY_LOG_SETTINGS中的配置(ActivityLogQueue.configure的参数)"""
+    activity_log_settings = getattr(settings, 'ACTIVITY_LOG_SETTINGS', {})
+    return dict(mode=activity_log_settings.get('MODE', 'async'),
+                flush_interval=activity_log_settings.get('FLUSH_INTERVAL', 2),
+                flush_size=activity_log_settings.get('FLUSH_SIZE', 100),
+                max_size=activity_log_settings.get('MAX_SIZE', 10000),
+                overflow=activity_log_settings.get('OVERFLOW', 'drop'))
+
+
+# 测试settings中可将MODE设为'sync'
+activity_log = ActivityLogQueue(**get_activity_log_config())
+
+
+@receiver(setting_changed)
+def reload_activity_log_settings(setting, **kwargs):
+    """测试中override_settings(ACTIVITY_LOG_SETTINGS=...)时重新读取配置"""
+    if setting == 'ACTIVITY_LOG_SETTINGS':
+        activity_log.configure(**get_activity_log_config())
+
+
+# 进程退出时写入队列中剩余的记录
+atexit.register(activity_log.flush)
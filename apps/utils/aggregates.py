@@ -0,0 +1,131 @@
+# coding: utf-8
+"""
+    冗余计数字段的维护
+
+    Course.lesson_nums, CourseOrg.course_nums / teacher_nums / student_nums,
+    Teacher.course_nums / hot_course, Course.students 由各app的signals调用本模块更新,
+    Course / CourseOrg / Teacher 的 fav_nums 由 utils.favorite.toggle_favorite() 更新,
+    reconcile_aggregates() 以分组聚合查询全量校正(python manage.py reconcile_aggregates)
+"""
+from collections import OrderedDict, defaultdict
+
+from django.db.models import Count, F
+
+from courses.models import Course, Lesson
+from operation.models import UserCourse, UserFavorite
+from organization.models import CourseOrg, Teacher
+
+
+def _ids(ids):
+    return set(i for i in ids if i)
+
+
+def update_course_lesson_nums(course_ids):
+    """重新统计课程章节数"""
+    for course_id in _ids(course_ids):
+        Course.objects.filter(id=course_id).update(lesson_nums=Lesson.objects.filter(course_id=course_id).count())
+
+
+def update_org_course_nums(org_ids):
+    """重新统计机构课程数"""
+    for org_id in _ids(org_ids):
+        CourseOrg.objects.filter(id=org_id).update(course_nums=Course.objects.filter(course_org_id=org_id).count())
+
+
+def update_org_teacher_nums(org_ids):
+    """重新统计机构讲师数"""
+    for org_id in _ids(org_ids):
+        CourseOrg.objects.filter(id=org_id).update(teacher_nums=Teacher.objects.filter(org_id=org_id).count())
+
+
+def update_org_student_nums(org_ids):
+    """重新统计机构学习人数(机构下所有课程的用户-课程记录数)"""
+    for org_id in _ids(org_ids):
+        student_nums = UserCourse.objects.filter(course__course_org_id=org_id).count()
+        CourseOrg.objects.filter(id=org_id).update(student_nums=student_nums)
+
+
+def incr_org_student_nums(org_id, delta=1):
+    """机构学习人数 +delta(用户-课程记录新增、删除时)"""
+    if org_id:
+        CourseOrg.objects.filter(id=org_id).update(student_nums=F('student_nums') + delta)
+
+
+def incr_course_student_nums(course_id, delta=1):
+    """课程学习人数 +delta(用户-课程记录新增、删除时)"""
+    if course_id:
+        Course.objects.filter(id=course_id).update(students=F('students') + delta)
+
+
+def update_teacher_course_stats(teacher_ids):
+    """重新统计讲师课程数及热门课程(学习人数最多的课程)"""
+    for teacher_id in _ids(teacher_ids):
+        course_ids = list(Course.objects.filter(teacher_id=teacher_id).order_by('-students', 'id')
+                                        .values_list('id', flat=True))
+        Teacher.objects.filter(id=teacher_id).update(course_nums=len(course_ids),
+                                                     hot_course=course_ids[0] if course_ids else None)
+
+
+def _reconcile(model, field, values, default=0):
+    """
+    将model的field校正为values中的值, 只更新不一致的记录, 相同的值合并为一条UPDATE
+    :param values:    (dict)  {pk: 正确的值}, 不在其中的记录校正为default
+    :return:          (int)   更新的记录数
+    """
+    # {正确的值: [pk, ...]}
+    groups = defaultdict(list)
+    for pk, value in model.objects.values_list('pk', field).iterator():
+        expected = values.get(pk, default)
+        if value != expected:
+            groups[expected].append(pk)
+
+    nums = 0
+    for expected, pks in groups.items():
+        nums += model.objects.filter(pk__in=pks).update(**{field: expected})
+    return nums
+
+
+def _count_by(queryset, field):
+    """{field值: 记录数}"""
+    return dict((row[field], row['nums']) for row in queryset.values(field).annotate(nums=Count('id')).order_by())
+
+
+def _hot_courses():
+    """{讲师id: 学习人数最多的课程id}"""
+    hot_courses = {}
+    for teacher_id, course_id in Course.objects.filter(teacher__isnull=False) \
+                                               .order_by('teacher_id', '-students', 'id') \
+                                               .values_list('teacher_id', 'id').iterator():
+        hot_courses.setdefault(teacher_id, course_id)
+    return hot_courses
+
+
+# {字段: 校正该字段的函数}
+RECONCILERS = OrderedDict([
+    ('Course.lesson_nums', lambda: _reconcile(Course, 'lesson_nums', _count_by(Lesson.objects.all(), 'course'))),
+    ('Course.students', lambda: _reconcile(Course, 'students', _count_by(UserCourse.objects.all(), 'course'))),
+    ('CourseOrg.course_nums', lambda: _reconcile(CourseOrg, 'course_nums',
+                                                 _count_by(Course.objects.all(), 'course_org'))),
+    ('CourseOrg.teacher_nums', lambda: _reconcile(CourseOrg, 'teacher_nums', _count_by(Teacher.objects.all(), 'org'))),
+    ('CourseOrg.student_nums', lambda: _reconcile(CourseOrg, 'student_nums',
+                                                  _count_by(UserCourse.objects.all(), 'course__course_org'))),
+    ('Teacher.course_nums', lambda: _reconcile(Teacher, 'course_nums', _count_by(Course.objects.all(), 'teacher'))),
+    ('Teacher.hot_course', lambda: _reconcile(Teacher, 'hot_course_id', _hot_courses(), default=None)),
+    # UserFavorite.fav_type: 1 课程, 2 课程机构, 3 讲师
+    ('Course.fav_nums', lambda: _reconcile(Course, 'fav_nums',
+                                           _count_by(UserFavorite.objects.filter(fav_type=1), 'fav_id'))),
+    ('CourseOrg.fav_nums', lambda: _reconcile(CourseOrg, 'fav_nums',
+                                              _count_by(UserFavorite.objects.filter(fav_type=2), 'fav_id'))),
+    ('Teacher.fav_nums', lambda: _reconcile(Teacher, 'fav_nums',
+                                            _count_by(UserFavorite.objects.filter(fav_type=3), 'fav_id'))),
+])
+
+
+def reconcile_aggregates(fields=None):
+    """
+    以分组聚合查询全量校正冗余计数字段
+    :param fields:   (list)  只校正这些字段(RECONCILERS中的名称), 默认全部
+    :return:         (dict)  {字段: 更新的记录数}
+    """
+    return dict((field, reconciler()) for field, reconciler in RECONCILERS.items()
+                if fields is None or field in fields)
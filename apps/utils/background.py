@@ -0,0 +1,74 @@
+# coding: utf-8
+import logging
+import os
+import threading
+
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerThreadMixin(object):
+    """
+        进程内的后台线程(点击数写入、操作记录写入、邮件发送、后台导出)
+
+        - 线程在第一次需要时或进程启动时(start)启动, 每个进程启动一次: uWSGI fork出的worker进程中
+          不会保留master中启动的线程, 按进程id判断是否需要重新启动
+        - 线程循环: _take_work() 等待任务(超时返回None), 丢弃超时失效的数据库连接后以 _process_work() 执行
+        - stop() 后线程在当前任务完成后退出
+
+        子类在__init__中调用 init_workers(), 实现 _take_work()、_process_work()
+    """
+
+    def init_workers(self, name, workers=1):
+        """
+        :param name:      (str)   线程名称
+        :param workers:   (int)   每个进程的线程数
+        """
+        self.worker_name = name
+        self.workers = workers
+        self._workers_lock = threading.Lock()
+        # 后台线程所在的进程id(uWSGI fork后需要在worker中重新启动)
+        self._workers_pid = None
+        self._stopping = False
+
+    def start(self):
+        """进程启动时启动后台线程, 继续处理重启前未完成的任务('sync'时不启动)"""
+        if getattr(self, 'mode', None) != 'sync':
+            self._ensure_workers()
+
+    def stop(self):
+        """进程退出: 线程不再开始新的任务"""
+        self._stopping = True
+
+    def _ensure_workers(self):
+        """启动后台线程(每个进程workers个)"""
+        pid = os.getpid()
+        if self._workers_pid == pid:
+            return
+        with self._workers_lock:
+            if self._workers_pid == pid:
+                return
+            self._workers_pid = pid
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run_worker, name='%s %d' % (self.worker_name, i))
+            thread.daemon = True
+            thread.start()
+
+    def _run_worker(self):
+        while not self._stopping:
+            work = self._take_work()
+            # 长期运行的线程: 丢弃超时失效的数据库连接
+            close_old_connections()
+            try:
+                self._process_work(work)
+            except Exception:
+                logger.exception('%s failed', self.worker_name)
+
+    def _take_work(self):
+        """等待下一个任务, 超时返回None"""
+        raise NotImplementedError
+
+    def _process_work(self, work):
+        """执行_take_work()取出的任务(work为None时处理空闲时的工作, 如重试到期的任务)"""
+        raise NotImplementedError
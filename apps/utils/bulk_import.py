@@ -0,0 +1,456 @@
+# coding: utf-8
+"""
+    xadmin导入(django-import-export)的分批导入
+
+    确认导入后逐行读取上传的文件(csv / tsv / xlsx, 其他格式仍由tablib整体解析), 每BATCH_SIZE行为一批:
+        - 按import_id_fields一次查询出本批已存在的记录, ForeignKeyWidget的关联对象也按批一次查询
+        - 新记录bulk_create, 修改的记录以 UPDATE ... SET field = CASE pk WHEN ... END 批量更新
+        - 每批一个事务, 导入进度(ImportJob.done_rows)与该批数据在同一事务中提交,
+          请求超时、进程退出或某行出错时已提交的批次保留, 重新提交后从断点继续
+        - 每批写一条LogEntry汇总(不再每行一条)
+    bulk_create / update不触发post_save, 导入后发送post_bulk_import, 由各app重新统计计数字段、清除缓存及更新搜索索引;
+    Resource有多对多字段或重写了save_instance等逐行保存的钩子时, 每批以 resource.import_data() 逐行导入
+"""
+import io
+import logging
+import sys
+import traceback
+from collections import OrderedDict
+from copy import deepcopy
+from datetime import datetime, timedelta
+from itertools import islice
+
+import tablib
+from django.conf import settings
+from django.contrib.admin.models import LogEntry, ADDITION, CHANGE
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Case, F, Q, Value, When
+from django.dispatch import Signal
+from django.utils import six
+from django.utils.encoding import force_text
+from import_export.formats import base_formats
+from import_export.resources import Diff
+from import_export.results import Error, Result, RowResult
+from import_export.widgets import ForeignKeyWidget, ManyToManyWidget
+
+from users.models import ImportJob
+
+logger = logging.getLogger(__name__)
+
+BULK_IMPORT_SETTINGS = getattr(settings, 'BULK_IMPORT_SETTINGS', {})
+
+# 批量导入结束(包括中途出错)后发送, sender为导入的模型
+post_bulk_import = Signal(providing_args=['job'])
+
+# Resource重写了这些方法时不能批量保存
+ROW_SAVE_HOOKS = ('save_instance', 'before_save_instance', 'after_save_instance', 'save_m2m',
+                  'import_row', 'delete_instance')
+
+
+class ImportRowError(Exception):
+    """导入的行数据有误, line为文件中的行号(第1行为表头)"""
+
+    def __init__(self, line, error):
+        self.line = line
+        self.error = error
+        super(ImportRowError, self).__init__(u'第{line}行: {error}'.format(line=line, error=force_text(error)))
+
+
+def open_import_file(tmp_storage):
+    """以二进制方式打开上传到临时存储(xadmin ImportView.save_import_file)的文件"""
+    if hasattr(tmp_storage, 'open'):
+        return tmp_storage.open(mode='rb')
+    return io.BytesIO(tmp_storage.read('rb'))
+
+
+def _csv_rows(f, delimiter, encoding):
+    if sys.version_info[0] < 3:
+        import unicodecsv
+        return unicodecsv.reader(f, encoding=encoding, delimiter=delimiter)
+    import csv
+    return csv.reader(io.TextIOWrapper(f, encoding=encoding, newline=''), delimiter=delimiter)
+
+
+def _xlsx_rows(f):
+    import openpyxl
+    sheet = openpyxl.load_workbook(f, read_only=True, data_only=True).active
+    return ([cell.value for cell in row] for row in sheet.rows)
+
+
+def read_import_rows(f, input_format, encoding='utf-8'):
+    """
+    逐行读取导入的文件
+    :param f:              二进制方式打开的文件
+    :param input_format:   import_export.formats.base_formats.Format()
+    :return:               (tuple)  (表头, 数据行的迭代器)
+    """
+    encoding = encoding or 'utf-8'
+    if isinstance(input_format, base_formats.TSV):
+        rows = _csv_rows(f, '\t', encoding)
+    elif isinstance(input_format, base_formats.CSV):
+        rows = _csv_rows(f, ',', encoding)
+    elif isinstance(input_format, base_formats.XLSX):
+        rows = _xlsx_rows(f)
+    else:
+        data = f.read()
+        if not input_format.is_binary():
+            data = force_text(data, encoding)
+        dataset = input_format.create_dataset(data)
+        return list(dataset.headers or []), iter(dataset)
+
+    headers = next(rows, None) or []
+    if headers and isinstance(headers[0], six.text_type):
+        # 去掉Excel另存为csv时的BOM
+        headers[0] = headers[0].lstrip(u'\ufeff')
+    return headers, rows
+
+
+def read_import_dataset(f, input_format, encoding='utf-8', nums=None):
+    """读取前nums行为tablib.Dataset(预览导入)"""
+    headers, rows = read_import_rows(f, input_format, encoding)
+    dataset = tablib.Dataset(headers=headers)
+    for row in islice(rows, nums):
+        dataset.append(_fit_row(row, len(headers)))
+    return dataset
+
+
+def _fit_row(row, size):
+    row = list(row)
+    return (row + [u''] * (size - len(row)))[:size]
+
+
+class BatchForeignKeyWidget(ForeignKeyWidget):
+    """按批预先查询关联对象的ForeignKeyWidget, 未查询到时仍逐行查询(原错误信息不变)"""
+
+    def __init__(self, widget):
+        super(BatchForeignKeyWidget, self).__init__(widget.model, widget.field)
+        self.objects = {}
+
+    @staticmethod
+    def _key(value):
+        if isinstance(value, float) and value.is_integer():
+            # xlsx中的数字
+            value = int(value)
+        return force_text(value)
+
+    def prefetch(self, values):
+        keys = set(self._key(value) for value in values if value)
+        self.objects = {}
+        if not keys:
+            return
+        try:
+            objects = list(self.model.objects.filter(**{'%s__in' % self.field: keys}))
+        except (ValueError, TypeError):
+            return
+        self.objects = dict((self._key(getattr(obj, self.field)), obj) for obj in objects)
+
+    def clean(self, value, row=None, *args, **kwargs):
+        obj = self.objects.get(self._key(value)) if value else None
+        if obj is not None:
+            return obj
+        return super(BatchForeignKeyWidget, self).clean(value, row, *args, **kwargs)
+
+
+class BulkImporter(object):
+    """以import_export的Resource分批导入数据行"""
+
+    def __init__(self, resource):
+        self.resource = resource
+        self.model = resource._meta.model
+        self.bulk = self.supports_bulk(resource)
+        # 复制字段到Resource的子类(get_field_name()等类方法读取类的fields), 替换外键widget时不影响原Resource类
+        resource_class = type(resource)
+        resource.__class__ = type(resource_class.__name__, (resource_class,), {})
+        resource.__class__.fields = OrderedDict((name, deepcopy(field))
+                                                for name, field in resource_class.fields.items())
+        self.fk_fields = []
+        for field in resource.fields.values():
+            if type(field.widget) is ForeignKeyWidget and field.attribute and not field.readonly:
+                field.widget = BatchForeignKeyWidget(field.widget)
+                self.fk_fields.append(field)
+        self.id_fields = [resource.fields[name] for name in resource.get_import_id_fields()]
+        self.concrete_fields = [f for f in self.model._meta.concrete_fields if not f.primary_key]
+
+    @staticmethod
+    def supports_bulk(resource):
+        for field in resource.get_fields():
+            if isinstance(field.widget, ManyToManyWidget):
+                return False
+        return not set(ROW_SAVE_HOOKS) & _overridden(type(resource))
+
+    def import_batch(self, rows, line):
+        """
+        导入一批数据行(在调用方的事务中)
+        :param rows:   (list)  [OrderedDict(表头: 值), ...]
+        :param line:   (int)   第一行在文件中的行号
+        :return:       (dict)  {'new': 新增数, 'update': 更新数, 'skip': 跳过数, 'delete': 删除数}
+        """
+        if not self.bulk:
+            return self._import_rows(rows, line)
+
+        totals, created, changed, deleted = self._prepare(rows, line)
+        if deleted:
+            self.model.objects.filter(pk__in=deleted).delete()
+        if created:
+            objs = list(created.values())
+            self.model.objects.bulk_create(objs)
+            if any(obj.pk is not None for obj in objs):
+                self._reset_sequence()
+        self._bulk_update([obj for pk, obj in changed.items() if pk not in deleted])
+        return totals
+
+    def preview(self, rows):
+        """
+        试导入(不写入数据库), 返回import_export的Result用于预览每行的修改及错误
+        :param rows:   (list)  [OrderedDict(表头: 值), ...]
+        """
+        if not self.bulk:
+            headers = list(rows[0].keys()) if rows else []
+            dataset = tablib.Dataset(*[[row.get(header) for header in headers] for row in rows], headers=headers)
+            return self.resource.import_data(dataset, dry_run=True, raise_errors=False)
+
+        result = Result()
+        result.diff_headers = self.resource.get_diff_headers()
+        result.total_rows = len(rows)
+        self._prepare(rows, 2, result)
+        return result
+
+    def _prepare(self, rows, line, result=None):
+        """
+        查询本批已存在的记录及关联对象, 按行设置字段值(不写入数据库)
+        :param result:   import_export Result(), 预览时记录每行的修改, 行数据有误时记录错误而不抛出异常
+        :return:         (tuple)  (各类型行数, {key: 新记录}, {pk: 修改的记录}, {删除的pk})
+        """
+        for field in self.fk_fields:
+            field.widget.prefetch(row.get(field.column_name) for row in rows)
+        existing = self._existing(rows, select_related=result is not None)
+
+        totals = dict(new=0, update=0, skip=0, delete=0)
+        created = OrderedDict()
+        changed = OrderedDict()
+        deleted = set()
+        for i, row in enumerate(rows):
+            row_result = RowResult()
+            try:
+                self.resource.before_import_row(row)
+                key = self._key(row)
+                if key in created:
+                    # 同一批中重复的新记录合并为一条
+                    instance, new = created[key], True
+                elif key is not None and key in existing:
+                    instance, new = existing[key], False
+                else:
+                    instance, new = self.resource.init_instance(row), True
+                self.resource.after_import_instance(instance, new)
+                diff = Diff(self.resource, instance, new) if result is not None else None
+
+                if self.resource.for_delete(row, instance):
+                    if not new:
+                        deleted.add(instance.pk)
+                        row_result.import_type = RowResult.IMPORT_TYPE_DELETE
+                    else:
+                        row_result.import_type = RowResult.IMPORT_TYPE_SKIP
+                    instance = None
+                else:
+                    original = deepcopy(instance) if self.resource._meta.skip_unchanged and not new else None
+                    if not new and instance.pk not in changed:
+                        instance._bulk_import_values = self._values(instance)
+                    self.resource.import_obj(instance, row, False)
+                    if original is not None and self.resource.skip_row(instance, original):
+                        row_result.import_type = RowResult.IMPORT_TYPE_SKIP
+                    elif new:
+                        created[key if key is not None else ('row', i)] = instance
+                        row_result.import_type = RowResult.IMPORT_TYPE_NEW
+                    else:
+                        changed[instance.pk] = instance
+                        row_result.import_type = RowResult.IMPORT_TYPE_UPDATE
+                totals[row_result.import_type] += 1
+            except Exception as e:
+                if result is None:
+                    raise ImportRowError(line + i, e)
+                row_result.import_type = RowResult.IMPORT_TYPE_ERROR
+                row_result.errors.append(Error(e, traceback.format_exc(), row))
+                instance = diff = None
+
+            if result is not None:
+                if diff is not None:
+                    diff.compare_with(self.resource, instance)
+                    row_result.diff = diff.as_html()
+                result.increment_row_result_total(row_result)
+                if row_result.import_type != RowResult.IMPORT_TYPE_SKIP or self.resource._meta.report_skipped:
+                    result.append_row_result(row_result)
+        return totals, created, changed, deleted
+
+    def _import_rows(self, rows, line):
+        """Resource需要逐行保存: 以本批数据调用 resource.import_data()"""
+        headers = list(rows[0].keys()) if rows else []
+        dataset = tablib.Dataset(*[[row.get(header) for header in headers] for row in rows], headers=headers)
+        result = self.resource.import_data(dataset, dry_run=False, raise_errors=False, use_transactions=False)
+        for base_error in result.base_errors:
+            raise ImportRowError(line, base_error.error)
+        for i, row_errors in result.row_errors():
+            raise ImportRowError(line + i - 1, row_errors[0].error)
+        return dict(new=result.totals['new'], update=result.totals['update'], skip=result.totals['skip'],
+                    delete=result.totals['delete'])
+
+    def _key(self, row):
+        values = tuple(field.clean(row) for field in self.id_fields)
+        if any(value is None or value == '' for value in values):
+            return None
+        return values
+
+    def _existing(self, rows, select_related=False):
+        """
+        按import_id_fields一次查询本批已存在的记录(id有误的行在逐行导入时报错)
+        :param select_related:   (bool)  同时查询外键关联的对象(预览时显示修改前的值)
+        :return:                 (dict)  {(id值, ...): instance}
+        """
+        keys = set()
+        for row in rows:
+            try:
+                key = self._key(row)
+            except Exception:
+                continue
+            if key is not None:
+                keys.add(key)
+        if not keys:
+            return {}
+
+        queryset = self.resource.get_queryset()
+        if select_related and self.fk_fields:
+            queryset = queryset.select_related(*[field.attribute for field in self.fk_fields])
+        if len(self.id_fields) == 1:
+            queryset = queryset.filter(**{'%s__in' % self.id_fields[0].attribute: [key[0] for key in keys]})
+        else:
+            condition = Q()
+            for key in keys:
+                condition |= Q(**dict((field.attribute, value) for field, value in zip(self.id_fields, key)))
+            queryset = queryset.filter(condition)
+        return dict((tuple(field.get_value(obj) for field in self.id_fields), obj) for obj in queryset)
+
+    def _values(self, instance):
+        return dict((f.attname, getattr(instance, f.attname)) for f in self.concrete_fields)
+
+    def _bulk_update(self, instances):
+        """修改的字段以 CASE pk WHEN ... 批量更新, 每条UPDATE的参数数受数据库限制"""
+        updates = OrderedDict()
+        for instance in instances:
+            old_values = instance.__dict__.pop('_bulk_import_values', {})
+            for f in self.concrete_fields:
+                value = getattr(instance, f.attname)
+                if f.attname not in old_values or old_values[f.attname] != value:
+                    updates.setdefault(instance.pk, []).append((f, value))
+        if not updates:
+            return
+
+        # 每行每个字段2个参数(pk及值), 另加pk__in的参数
+        fields = set(f for values in updates.values() for f, value in values)
+        batch_size = max(connection.ops.bulk_batch_size(['pk'] * (len(fields) * 2 + 1), list(updates)), 1)
+        pks = list(updates)
+        for start in range(0, len(pks), batch_size):
+            batch = pks[start:start + batch_size]
+            cases = OrderedDict()
+            for pk in batch:
+                for f, value in updates[pk]:
+                    cases.setdefault(f, []).append(When(pk=pk, then=Value(value, output_field=f)))
+            self.model.objects.filter(pk__in=batch).update(**dict(
+                (f.name, Case(*whens, default=F(f.name), output_field=f)) for f, whens in cases.items()))
+
+    def _reset_sequence(self):
+        """指定了主键的新记录导入后重置自增序列(同loaddata)"""
+        sequence_sql = connection.ops.sequence_reset_sql(no_style(), [self.model])
+        if sequence_sql:
+            with connection.cursor() as cursor:
+                for sql in sequence_sql:
+                    cursor.execute(sql)
+
+
+def _overridden(resource_class):
+    """Resource子类(不包括import_export中的类)中定义的方法"""
+    names = set()
+    for cls in resource_class.__mro__:
+        if cls.__module__.startswith('import_export.'):
+            break
+        names.update(cls.__dict__)
+    return names
+
+
+def claim_job(job):
+    """
+    开始(或继续)导入, 同一任务同时只能在一个请求中导入
+    :return:   (bool)  任务已完成或正在其他请求中导入时返回False
+    """
+    stale_time = datetime.now() - timedelta(seconds=BULK_IMPORT_SETTINGS.get('LEASE', 300))
+    return bool(ImportJob.objects.filter(Q(status__in=(ImportJob.STATUS_PENDING, ImportJob.STATUS_FAILED)) |
+                                         Q(status=ImportJob.STATUS_RUNNING, update_time__lt=stale_time),
+                                         pk=job.pk)
+                                 .update(status=ImportJob.STATUS_RUNNING, error='', update_time=datetime.now()))
+
+
+def _log_batch(job, content_type_id, first_line, last_line, totals):
+    LogEntry.objects.log_action(
+        user_id=job.user_id,
+        content_type_id=content_type_id,
+        object_id='',
+        object_repr=u'{file_name} 第{first}-{last}行'.format(file_name=job.original_file_name, first=first_line,
+                                                           last=last_line)[:200],
+        action_flag=ADDITION if totals['new'] and not totals['update'] else CHANGE,
+        change_message=u'批量导入 新增: {new}, 更新: {update}, 跳过: {skip}, 删除: {delete}'.format(**totals),
+    )
+
+
+def run_import(job, resource, input_format, tmp_storage, encoding='utf-8', batch_size=None, log=True):
+    """
+    从断点(job.done_rows)开始分批导入, 调用前需以claim_job()开始导入
+    :param job:           ImportJob()
+    :param resource:      import_export Resource()
+    :param input_format:  import_export Format()
+    :param tmp_storage:   上传文件所在的临时存储
+    :param log:           (bool)  是否每批写一条LogEntry
+    :return:              ImportJob()  导入结束的任务(status为done或failed, error为出错原因)
+    """
+    batch_size = batch_size or BULK_IMPORT_SETTINGS.get('BATCH_SIZE', 1000)
+    importer = BulkImporter(resource)
+    content_type_id = ContentType.objects.get_for_model(importer.model).pk
+    done_rows = job.done_rows
+    imported = False
+    try:
+        with open_import_file(tmp_storage) as f:
+            headers, rows = read_import_rows(f, input_format, encoding)
+            rows = islice(rows, done_rows, None)
+            while True:
+                batch = [OrderedDict(zip(headers, _fit_row(row, len(headers)))) for row in islice(rows, batch_size)]
+                if not batch:
+                    break
+                # 第1行为表头
+                first_line = done_rows + 2
+                with transaction.atomic():
+                    totals = importer.import_batch(batch, first_line)
+                    # 以done_rows作为条件: 任务已在其他请求中继续导入时回滚本批
+                    if not ImportJob.objects.filter(pk=job.pk, status=ImportJob.STATUS_RUNNING,
+                                                    done_rows=done_rows).update(
+                            done_rows=F('done_rows') + len(batch), new_nums=F('new_nums') + totals['new'],
+                            update_nums=F('update_nums') + totals['update'],
+                            skip_nums=F('skip_nums') + totals['skip'],
+                            delete_nums=F('delete_nums') + totals['delete'], update_time=datetime.now()):
+                        raise ImportRowError(first_line, u'任务已在其他请求中导入')
+                    if log:
+                        _log_batch(job, content_type_id, first_line, first_line + len(batch) - 1, totals)
+                done_rows += len(batch)
+                imported = True
+    except Exception as e:
+        if not isinstance(e, ImportRowError):
+            logger.exception(u'导入失败: %s', job.pk)
+        ImportJob.objects.filter(pk=job.pk, status=ImportJob.STATUS_RUNNING) \
+                         .update(status=ImportJob.STATUS_FAILED, error=force_text(e)[:2000],
+                                 update_time=datetime.now())
+    else:
+        now = datetime.now()
+        ImportJob.objects.filter(pk=job.pk, status=ImportJob.STATUS_RUNNING) \
+                         .update(status=ImportJob.STATUS_DONE, update_time=now, finish_time=now)
+    finally:
+        if imported:
+            post_bulk_import.send(sender=importer.model, job=job)
+    return ImportJob.objects.get(pk=job.pk)
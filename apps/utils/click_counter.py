@@ -0,0 +1,139 @@
+# coding: utf-8
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.db.models import F
+
+from Lighten.settings import CLICK_COUNTER_SETTINGS
+from utils.background import WorkerThreadMixin
+
+logger = logging.getLogger(__name__)
+
+
+class ClickCounter(WorkerThreadMixin):
+    """
+        点击数写缓冲(write-behind)
+
+        详情页的点击数 +1 先累加在进程内缓冲中, 达到时间间隔或缓冲数量时
+        以 UPDATE ... SET click_nums = click_nums + n 批量写入数据库,
+        避免每次访问都对整行执行UPDATE(并发下还会丢失计数)
+    """
+
+    def __init__(self, field='click_nums', flush_interval=10, flush_size=100):
+        """
+        :param field:            (str)   计数字段名
+        :param flush_interval:   (int)   写入间隔(秒), 0表示每次累加后立即写入
+        :param flush_size:       (int)   缓冲中的对象数达到该值时立即写入
+        """
+        self.field = field
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        # {model: {pk: n}}
+        self._pending = defaultdict(dict)
+        self._lock = threading.Lock()
+        self._last_flush = time.time()
+        # 后台定时写入线程(每个进程一个)
+        self.init_workers('click counter flusher')
+
+    def incr(self, obj, n=1):
+        """
+        对象点击数 +n, 同时更新obj上的字段值(数据库值 + 缓冲中的增量)
+        :param obj:   model对象, 如Course、CourseOrg或Teacher
+        :param n:     (int)   增量
+        :return:
+        """
+        model = obj.__class__._meta.concrete_model
+        with self._lock:
+            pending = self._pending[model]
+            pending[obj.pk] = pending.get(obj.pk, 0) + n
+            delta = pending[obj.pk]
+            pending_nums = sum(len(i) for i in self._pending.values())
+
+        setattr(obj, self.field, getattr(obj, self.field) + delta)
+
+        if self.flush_interval <= 0 or pending_nums >= self.flush_size or \
+                time.time() - self._last_flush >= self.flush_interval:
+            self.flush()
+        else:
+            self._ensure_workers()
+
+    def pending(self, model, pk):
+        """获取缓冲中尚未写入数据库的增量"""
+        model = model._meta.concrete_model
+        with self._lock:
+            return self._pending.get(model, {}).get(pk, 0)
+
+    def merge(self, objs):
+        """
+        将缓冲中的增量合并到对象的字段值上(读路径)
+        :param objs:   model对象的可迭代对象
+        :return:       (list)  合并后的对象列表
+        """
+        objs = list(objs)
+        with self._lock:
+            for obj in objs:
+                delta = self._pending.get(obj.__class__._meta.concrete_model, {}).get(obj.pk, 0)
+                if delta:
+                    setattr(obj, self.field, getattr(obj, self.field) + delta)
+        return objs
+
+    def top(self, queryset, nums):
+        """
+        按点击数(合并缓冲增量后)降序取前nums个对象, 用于热门排行
+        :param queryset:   QuerySet  候选对象, 如 Course.objects.all()
+        :param nums:       (int)     数量
+        :return:           (list)    对象列表
+        """
+        model = queryset.model._meta.concrete_model
+        with self._lock:
+            pending_pks = list(self._pending.get(model, {}).keys())
+
+        objs = list(queryset.order_by('-' + self.field)[:nums])
+        # 缓冲中有增量的对象可能排进前nums
+        existed_pks = set(obj.pk for obj in objs)
+        pending_pks = [pk for pk in pending_pks if pk not in existed_pks]
+        if pending_pks:
+            objs.extend(queryset.filter(pk__in=pending_pks))
+
+        objs = self.merge(objs)
+        objs.sort(key=lambda obj: getattr(obj, self.field), reverse=True)
+        return objs[:nums]
+
+    def flush(self):
+        """将缓冲中的增量按 (model, n) 分组批量写入数据库"""
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(dict)
+            self._last_flush = time.time()
+
+        for model, deltas in pending.items():
+            # {n: [pk, ...]} 相同增量的对象合并为一条UPDATE
+            groups = defaultdict(list)
+            for pk, n in deltas.items():
+                groups[n].append(pk)
+            for n, pks in groups.items():
+                try:
+                    model.objects.filter(pk__in=pks).update(**{self.field: F(self.field) + n})
+                except Exception:
+                    logger.exception('flush %s.%s failed', model._meta.label, self.field)
+                    # 写入失败的增量放回缓冲, 等待下次写入
+                    with self._lock:
+                        for pk in pks:
+                            self._pending[model][pk] = self._pending[model].get(pk, 0) + n
+
+    def _take_work(self):
+        time.sleep(self.flush_interval)
+
+    def _process_work(self, work):
+        if time.time() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+
+click_counter = ClickCounter(field='click_nums',
+                             flush_interval=CLICK_COUNTER_SETTINGS.get('FLUSH_INTERVAL', 10),
+                             flush_size=CLICK_COUNTER_SETTINGS.get('FLUSH_SIZE', 100))
+
+# 进程退出时写入剩余的增量
+atexit.register(click_counter.flush)
@@ -0,0 +1,90 @@
+# coding: utf-8
+from collections import Counter
+from itertools import groupby
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from operation.models import RelatedCourse, UserCourse
+
+
+def get_top_related_courses(course_id, nums=5):
+    """
+    从课程关联索引中获取推荐课程(单次查询)
+    :param course_id:   (int)   课程id
+    :param nums:        (int)   推荐数量
+    :return:            (list)  Course()对象列表, 按共同学习人数降序
+    """
+    relations = RelatedCourse.objects.filter(course_id=course_id) \
+                                     .select_related('related_course') \
+                                     .order_by('-nums', 'related_course_id')[:nums]
+    return [relation.related_course for relation in relations]
+
+
+def _increase_relations(course_ids, related_course_ids):
+    """course_ids x related_course_ids 的共同学习人数 +1, 不存在的记录则创建"""
+    relations = RelatedCourse.objects.filter(course_id__in=course_ids, related_course_id__in=related_course_ids)
+    existed_pairs = set(relations.values_list('course_id', 'related_course_id'))
+    if existed_pairs:
+        relations.update(nums=F('nums') + 1)
+
+    for course_id in course_ids:
+        for related_course_id in related_course_ids:
+            if (course_id, related_course_id) in existed_pairs:
+                continue
+            try:
+                # savepoint: 并发下其他请求可能已经创建了该记录
+                with transaction.atomic():
+                    RelatedCourse.objects.create(course_id=course_id, related_course_id=related_course_id, nums=1)
+            except IntegrityError:
+                RelatedCourse.objects.filter(course_id=course_id, related_course_id=related_course_id) \
+                                     .update(nums=F('nums') + 1)
+
+
+def add_course_relations(user_id, course_id, exclude_id=None):
+    """
+    用户新学习了一门课程时, 增量更新该课程与用户已学课程之间的关联
+    :param user_id:      (int)   用户id
+    :param course_id:    (int)   新学习的课程id
+    :param exclude_id:   (int)   新建的UserCourse记录id, 判断用户是否已学过该课程时排除
+    :return:
+    """
+    user_courses = UserCourse.objects.filter(user_id=user_id).exclude(id=exclude_id)
+    # 重复的用户-课程记录不再计数
+    if user_courses.filter(course_id=course_id).exists():
+        return
+
+    learned_ids = list(set(user_courses.values_list('course_id', flat=True)))
+    if not learned_ids:
+        return
+
+    with transaction.atomic():
+        _increase_relations([course_id], learned_ids)
+        _increase_relations(learned_ids, [course_id])
+
+
+def rebuild_course_relations(batch_size=1000, user_course_model=UserCourse, related_course_model=RelatedCourse):
+    """
+    根据所有UserCourse记录全量重建课程关联索引
+    :param batch_size:            (int)   bulk_create每批写入数
+    :param user_course_model:     UserCourse, 数据迁移中传入历史模型
+    :param related_course_model:  RelatedCourse, 数据迁移中传入历史模型
+    :return:                      (int)   写入的关联记录数
+    """
+    records = user_course_model.objects.values_list('user_id', 'course_id').distinct().order_by('user_id')
+
+    # {(course_id, related_course_id): nums}
+    counter = Counter()
+    for user_id, rows in groupby(records.iterator(), key=lambda row: row[0]):
+        course_ids = [row[1] for row in rows]
+        for course_id in course_ids:
+            for related_course_id in course_ids:
+                if course_id != related_course_id:
+                    counter[(course_id, related_course_id)] += 1
+
+    relations = [related_course_model(course_id=course_id, related_course_id=related_course_id, nums=nums)
+                 for (course_id, related_course_id), nums in counter.items()]
+    with transaction.atomic():
+        related_course_model.objects.all().delete()
+        related_course_model.objects.bulk_create(relations, batch_size=batch_size)
+    return len(relations)
@@ -0,0 +1,424 @@
+# coding: utf-8
+"""
+    数据库连接管理
+
+    DATABASES中的ENGINE使用 'utils.db_pool.mysql'(本地测试 'utils.db_pool.sqlite3'), 在Django数据库后端的基础上:
+        - CONN_HEALTH_CHECKS: 持久连接(CONN_MAX_AGE > 0)在每个请求第一次使用前检查是否可用, 不可用时重新连接
+        - POOL: 进程内连接池, 连接关闭时归还连接池而不是断开, 最多 MAX_SIZE 个空闲连接,
+          繁忙时可额外打开 MAX_OVERFLOW 个连接(归还时断开), 取出空闲连接时ping检查
+        - 统计获取连接(新建或从连接池取出)的耗时, get_connection_stats() 查看当前进程的统计
+        - add_execute_hook() 注册的函数在每条SQL执行后调用(DEBUG=False时同样有效), 用于请求的SQL统计
+    uWSGI fork出worker进程后由 warmup_connections() 丢弃从master继承的连接并预先建立连接(Lighten/wsgi.py)
+
+    配置示例:
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
+        'POOL': {'ENABLED': True, 'MAX_SIZE': 5, 'MAX_OVERFLOW': 5, 'TIMEOUT': 10, 'RECYCLE': 3600},
+    启用连接池时忽略CONN_MAX_AGE(按0处理): 每个请求结束时连接归还连接池, 由同一进程的其他线程复用
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends import utils
+
+logger = logging.getLogger(__name__)
+
+# 连接获取耗时超过该值(秒)时记录warning
+SLOW_ACQUIRE_TIME = 0.5
+
+# fork前打开的连接: 子进程中不能使用, 也不能关闭(会断开父进程的连接), 只保留引用
+_abandoned_connections = []
+
+
+class PoolTimeout(Exception):
+    """等待空闲连接超时"""
+    pass
+
+
+class ConnectionStats(object):
+    """当前进程获取数据库连接的统计"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.acquire_nums = 0
+            self.acquire_time = 0.0
+            self.acquire_time_max = 0.0
+            # 新建连接数, 从连接池取出的连接数, 等待空闲连接的次数, 等待超时的次数
+            self.opened_nums = 0
+            self.reused_nums = 0
+            self.wait_nums = 0
+            self.timeout_nums = 0
+            # 健康检查发现不可用的连接数
+            self.unusable_nums = 0
+
+    def incr(self, name, nums=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + nums)
+
+    def record_acquire(self, seconds):
+        with self._lock:
+            self.acquire_nums += 1
+            self.acquire_time += seconds
+            self.acquire_time_max = max(self.acquire_time_max, seconds)
+        if seconds >= SLOW_ACQUIRE_TIME:
+            logger.warning('acquire database connection took %.3fs', seconds)
+
+    def as_dict(self):
+        with self._lock:
+            return {'acquire_nums': self.acquire_nums,
+                    'acquire_time_avg': self.acquire_time / self.acquire_nums if self.acquire_nums else 0,
+                    'acquire_time_max': self.acquire_time_max,
+                    'opened_nums': self.opened_nums,
+                    'reused_nums': self.reused_nums,
+                    'wait_nums': self.wait_nums,
+                    'timeout_nums': self.timeout_nums,
+                    'unusable_nums': self.unusable_nums}
+
+
+connection_stats = ConnectionStats()
+
+
+class ConnectionPool(object):
+    """
+        进程内的数据库连接池(多个线程共享)
+
+        空闲连接后进先出(最近使用的连接最可能仍然可用), 超过recycle秒的连接取出时断开重连
+    """
+
+    def __init__(self, max_size=5, max_overflow=5, timeout=10, recycle=3600):
+        """
+        :param max_size:       (int)   最多保留的空闲连接数
+        :param max_overflow:   (int)   连接池满时可额外打开的连接数, 归还时断开
+        :param timeout:        (int)   连接数达到 max_size + max_overflow 时等待空闲连接的时间(秒)
+        :param recycle:        (int)   连接的最长使用时间(秒), 避免被MySQL wait_timeout断开
+        """
+        self.max_size = max_size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pid = os.getpid()
+        self._cond = threading.Condition()
+        self._idle = deque()
+        # 已打开的连接(空闲及使用中): {id(连接): 打开时间}
+        self._opened = {}
+        # 正在新建的连接数
+        self._opening = 0
+
+    @property
+    def size(self):
+        return len(self._opened) + self._opening
+
+    @property
+    def idle_size(self):
+        return len(self._idle)
+
+    def acquire(self, connect, ping):
+        """
+        取出一个可用的空闲连接, 没有时新建连接
+        :param connect:   (callable)  新建连接, 返回DB-API连接
+        :param ping:      (callable)  检查连接是否可用, 不可用时抛出异常
+        """
+        deadline = time.time() + self.timeout
+        waited = False
+        while True:
+            with self._cond:
+                conn = self._idle.pop() if self._idle else None
+                if conn is None:
+                    if self.size >= self.max_size + self.max_overflow:
+                        remaining = deadline - time.time()
+                        if remaining <= 0:
+                            connection_stats.incr('timeout_nums')
+                            raise PoolTimeout('database connection pool timeout ({size} connections)'
+                                              .format(size=self.size))
+                        if not waited:
+                            waited = True
+                            connection_stats.incr('wait_nums')
+                        self._cond.wait(remaining)
+                        continue
+                    # 新建连接在锁外进行
+                    self._opening += 1
+
+            if conn is None:
+                return self._open(connect)
+            if time.time() - self._opened[id(conn)] < self.recycle and self._is_usable(conn, ping):
+                connection_stats.incr('reused_nums')
+                return conn
+            self._discard(conn)
+
+    def _open(self, connect):
+        conn = None
+        try:
+            conn = connect()
+        finally:
+            with self._cond:
+                self._opening -= 1
+                if conn is not None:
+                    self._opened[id(conn)] = time.time()
+                self._cond.notify()
+        connection_stats.incr('opened_nums')
+        return conn
+
+    def _is_usable(self, conn, ping):
+        try:
+            ping(conn)
+        except Exception:
+            connection_stats.incr('unusable_nums')
+            return False
+        return True
+
+    def release(self, conn, discard=False):
+        """
+        归还连接
+        :param discard:   (bool)  断开连接(连接出错或处于未知状态时)
+        """
+        with self._cond:
+            keep = not discard and id(conn) in self._opened and len(self._idle) < self.max_size
+            if keep:
+                self._idle.append(conn)
+                self._cond.notify()
+        if not keep:
+            self._discard(conn)
+
+    def _discard(self, conn):
+        with self._cond:
+            self._opened.pop(id(conn), None)
+            self._cond.notify()
+        try:
+            conn.close()
+        except Exception:
+            logger.exception('close database connection failed')
+
+    def prefill(self, nums, connect, ping):
+        """预先建立nums个空闲连接"""
+        conns = []
+        try:
+            for i in range(min(nums, self.max_size)):
+                conns.append(self.acquire(connect, ping))
+        finally:
+            for conn in conns:
+                self.release(conn)
+
+    def clear(self):
+        """断开所有空闲连接"""
+        with self._cond:
+            conns = list(self._idle)
+            self._idle.clear()
+        for conn in conns:
+            self._discard(conn)
+
+    def abandon(self):
+        """放弃所有连接(fork后的子进程中), 不关闭"""
+        with self._cond:
+            _abandoned_connections.extend(self._idle)
+            self._idle.clear()
+            self._opened.clear()
+
+
+# SQL执行后调用的函数: func(alias, sql, seconds)
+_execute_hooks = []
+
+
+def add_execute_hook(func):
+    if func not in _execute_hooks:
+        _execute_hooks.append(func)
+
+
+def remove_execute_hook(func):
+    if func in _execute_hooks:
+        _execute_hooks.remove(func)
+
+
+def _run_execute_hooks(alias, sql, seconds):
+    for func in _execute_hooks:
+        try:
+            func(alias, sql, seconds)
+        except Exception:
+            logger.exception('database execute hook failed')
+
+
+class ExecuteHookMixin(object):
+    """cursor的execute、executemany执行后调用_execute_hooks"""
+
+    def execute(self, sql, params=None):
+        if not _execute_hooks:
+            return super(ExecuteHookMixin, self).execute(sql, params)
+        start = time.time()
+        try:
+            return super(ExecuteHookMixin, self).execute(sql, params)
+        finally:
+            _run_execute_hooks(self.db.alias, sql, time.time() - start)
+
+    def executemany(self, sql, param_list):
+        if not _execute_hooks:
+            return super(ExecuteHookMixin, self).executemany(sql, param_list)
+        start = time.time()
+        try:
+            return super(ExecuteHookMixin, self).executemany(sql, param_list)
+        finally:
+            _run_execute_hooks(self.db.alias, sql, time.time() - start)
+
+
+class HookedCursorWrapper(ExecuteHookMixin, utils.CursorWrapper):
+    pass
+
+
+class HookedCursorDebugWrapper(ExecuteHookMixin, utils.CursorDebugWrapper):
+    pass
+
+
+# {(alias, NAME, HOST, PORT, USER): ConnectionPool()}
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(wrapper):
+    """获取数据库连接对应的连接池, 未启用连接池时返回None"""
+    pool_settings = wrapper.settings_dict.get('POOL') or {}
+    if not pool_settings.get('ENABLED'):
+        return None
+    settings_dict = wrapper.settings_dict
+    # 测试时NAME会被修改为测试数据库, 按连接参数区分连接池
+    key = (wrapper.alias, settings_dict['NAME'], settings_dict['HOST'], settings_dict['PORT'], settings_dict['USER'])
+    pool = _pools.get(key)
+    if pool is not None and pool.pid == os.getpid():
+        return pool
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is not None and pool.pid != os.getpid():
+            pool.abandon()
+            pool = None
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(max_size=pool_settings.get('MAX_SIZE', 5),
+                                                max_overflow=pool_settings.get('MAX_OVERFLOW', 5),
+                                                timeout=pool_settings.get('TIMEOUT', 10),
+                                                recycle=pool_settings.get('RECYCLE', 3600))
+        return pool
+
+
+def get_pool_stats():
+    """当前进程各连接池的连接数: {alias: {'size': 已打开的连接数, 'idle': 空闲连接数}}"""
+    return dict((key[0], {'size': pool.size, 'idle': pool.idle_size})
+                for key, pool in _pools.items() if pool.pid == os.getpid())
+
+
+def get_connection_stats():
+    stats = connection_stats.as_dict()
+    stats['pools'] = get_pool_stats()
+    return stats
+
+
+class PooledDatabaseWrapperMixin(object):
+    """在Django数据库后端的DatabaseWrapper上增加连接池、健康检查、连接耗时统计及SQL执行hook"""
+
+    def __init__(self, *args, **kwargs):
+        super(PooledDatabaseWrapperMixin, self).__init__(*args, **kwargs)
+        # 本次请求是否已检查过连接
+        self.health_check_done = False
+        # 连接处于未知状态, 关闭时断开而不归还连接池
+        self.discard_connection = False
+
+    def get_new_pool_connection(self, conn_params):
+        return super(PooledDatabaseWrapperMixin, self).get_new_connection(conn_params)
+
+    def ping_connection(self, conn):
+        """检查DB-API连接是否可用, 不可用时抛出异常"""
+        raise NotImplementedError
+
+    def pool_enabled(self):
+        return True
+
+    def get_new_connection(self, conn_params):
+        start = time.time()
+        pool = get_pool(self) if self.pool_enabled() else None
+        if pool is None:
+            conn = self.get_new_pool_connection(conn_params)
+            connection_stats.incr('opened_nums')
+        else:
+            conn = pool.acquire(lambda: self.get_new_pool_connection(conn_params), self.ping_connection)
+        connection_stats.record_acquire(time.time() - start)
+        self.discard_connection = False
+        return conn
+
+    def connect(self):
+        super(PooledDatabaseWrapperMixin, self).connect()
+        if self.pool_enabled() and get_pool(self) is not None:
+            # 忽略CONN_MAX_AGE: 持久连接不会归还连接池, 其他线程无法复用
+            self.close_at = time.time()
+
+    def make_cursor(self, cursor):
+        return HookedCursorWrapper(cursor, self)
+
+    def make_debug_cursor(self, cursor):
+        return HookedCursorDebugWrapper(cursor, self)
+
+    def ensure_connection(self):
+        if self.connection is not None and not self.health_check_done \
+                and self.settings_dict.get('CONN_HEALTH_CHECKS') and not self.in_atomic_block:
+            self.health_check_done = True
+            if not self.is_usable():
+                connection_stats.incr('unusable_nums')
+                self.discard_connection = True
+                self.close()
+        self.health_check_done = True
+        super(PooledDatabaseWrapperMixin, self).ensure_connection()
+
+    def _close(self):
+        pool = get_pool(self) if self.pool_enabled() else None
+        if pool is None:
+            return super(PooledDatabaseWrapperMixin, self)._close()
+        # 出错、事务中关闭的连接状态未知, 断开而不归还
+        discard = self.discard_connection or self.errors_occurred or self.in_atomic_block
+        if not discard:
+            try:
+                self.connection.rollback()
+            except Exception:
+                discard = True
+        pool.release(self.connection, discard=discard)
+
+
+def start_request_health_checks(**kwargs):
+    """新请求开始: 持久连接在本次请求第一次使用前重新检查"""
+    for conn in connections.all():
+        if isinstance(conn, PooledDatabaseWrapperMixin):
+            conn.health_check_done = False
+
+
+request_started.connect(start_request_health_checks, dispatch_uid='db_pool_health_checks')
+
+
+def warmup_connections():
+    """
+    uWSGI fork出worker进程后调用: 丢弃从master进程继承的连接(不关闭, 避免断开master的连接),
+    并为每个数据库预先建立连接(持久连接或连接池)
+    """
+    for conn in connections.all():
+        if conn.connection is not None:
+            _abandoned_connections.append(conn.connection)
+            conn.connection = None
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.abandon()
+        _pools.clear()
+
+    for conn in connections.all():
+        if not isinstance(conn, PooledDatabaseWrapperMixin):
+            continue
+        try:
+            pool = get_pool(conn) if conn.pool_enabled() else None
+            if pool is not None:
+                conn_params = conn.get_connection_params()
+                pool.prefill((conn.settings_dict.get('POOL') or {}).get('MIN_SIZE', 1),
+                             lambda: conn.get_new_pool_connection(conn_params), conn.ping_connection)
+            elif conn.settings_dict.get('CONN_MAX_AGE'):
+                conn.ensure_connection()
+        except Exception:
+            logger.exception('warm up database connection %s failed', conn.alias)
@@ -0,0 +1,11 @@
+# coding: utf-8
+from django.db.backends.mysql import base
+
+from utils.db_pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    """MySQL后端: 持久连接健康检查、连接池及连接耗时统计"""
+
+    def ping_connection(self, conn):
+        conn.ping()
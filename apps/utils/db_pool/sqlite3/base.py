@@ -0,0 +1,23 @@
+# coding: utf-8
+from django.db.backends.sqlite3 import base
+
+from utils.db_pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    """SQLite后端(本地测试): 持久连接健康检查、连接池及连接耗时统计"""
+
+    def ping_connection(self, conn):
+        conn.execute('SELECT 1')
+
+    def is_usable(self):
+        # Django的SQLite后端总是返回True, 健康检查时ping连接
+        try:
+            self.ping_connection(self.connection)
+        except Exception:
+            return False
+        return True
+
+    def pool_enabled(self):
+        # 内存数据库的每个连接都是一个新的数据库
+        return not self.is_in_memory_db(self.settings_dict['NAME'])
@@ -1,30 +1,13 @@
 # coding: utf-8
 
-from random import Random
-from threading import Thread
-
-from django.core.mail import send_mail
-
-from users.models import EmailVerifyRecord
+from utils.mail_dispatcher import mail_dispatcher
+from utils.verify_token import create_token
 from Lighten.settings import EMAIL_FROM
 
 
-def generate_random_str(length=8):
-    """生成随机字符串  使用Random().randint()"""
-    str = ''
-    # (用户验证码输入体验)去掉 Ii Ll 11 Oo0
-    chars = 'AaBbCcDdEeFfGgHhJjKkMmNnPpQqRrSsTtUuVvWwXxYyZz23456789'
-    chars_len = len(chars)
-    random = Random()
-    for i in xrange(length):
-        str += chars[random.randint(0, chars_len - 1)]
-    return str
-
-
-def async_send_email(*args, **kwargs):
-    """Multi Thread发送邮件"""
-    th = Thread(target=send_mail, name='send email', args=args, kwargs=kwargs)
-    th.start()
+def async_send_email(subject, message, from_email, recipient_list):
+    """写入邮件发送队列, 由发送线程池复用SMTP连接批量发送, 失败后重试"""
+    mail_dispatcher.send(subject, message, recipient_list, from_email=from_email)
 
 
 def send_register_email(email_to, send_type='register', user_new_email='', host='127.0.0.1:8000'):
@@ -36,16 +19,8 @@ def send_register_email(email_to, send_type='register', user_new_email='', host=
     :param host:             (str)   主机地址, 写入链接提供给用户
     :return:
     """
-    # 随机字符串
-    random_str = generate_random_str(16) if not user_new_email else generate_random_str(4)
-
-    # 实例化EmailVerifyRecord model
-    email_record = EmailVerifyRecord()
-    email_record.code = random_str
-    email_record.email = email_to
-    email_record.new_email = user_new_email
-    email_record.send_type = send_type
-    email_record.save()
+    # 随机验证码(修改邮箱时为用户输入的4位验证码)
+    random_str = create_token(send_type, email_to, new_email=user_new_email, length=16 if not user_new_email else 4)
 
     # 发送邮件
     if send_type == 'register':
@@ -0,0 +1,37 @@
+# coding: utf-8
+"""
+    用户学习课程记录(UserCourse)
+
+    (user, course) 唯一索引保证并发请求(同时打开多个课程页面)下只有一条记录,
+    记录以一次 get_or_create 创建; 已学习的课程id缓存在session中, 重复播放课程视频时不再查询数据库.
+    首次学习时课程学习人数(Course.students)及机构学习人数的 +1 由operation.signals在同一事务中完成
+"""
+from operation.models import UserCourse
+
+# session中缓存的已学习课程数上限
+MAX_SESSION_COURSES = 200
+
+
+def _session_key(user_id):
+    return '_enrolled_course_ids_{user_id}'.format(user_id=user_id)
+
+
+def enroll(request, course):
+    """
+    记录当前用户学习了该课程
+    :param request:   HttpRequest
+    :param course:    Course()对象
+    :return:          (bool)  是否首次学习该课程(未登录时返回False)
+    """
+    if not request.user.is_authenticated():
+        return False
+
+    key = _session_key(request.user.id)
+    course_ids = request.session.get(key, [])
+    if course.id in course_ids:
+        return False
+
+    # 记录已存在时一次查询; 不存在时INSERT, 并发插入触发唯一索引冲突时改为查询已有记录
+    record, created = UserCourse.objects.get_or_create(user=request.user, course=course)
+    request.session[key] = (course_ids + [course.id])[-MAX_SESSION_COURSES:]
+    return created
@@ -0,0 +1,363 @@
+# coding: utf-8
+"""
+    xadmin后台导出任务
+
+    列表页导出菜单中选择'后台导出'时创建ExportJob(保存当前的筛选、搜索、排序及导出参数), 由进程内的导出线程
+    以任务所属用户重新执行列表页的导出, 导出文件写入 EXPORT_JOB_SETTINGS['ROOT'](不在MEDIA_ROOT中,
+    只能由任务所属用户下载):
+        - 导出中定期以一条UPDATE更新进度, 更新失败(任务已被取消)时停止导出并删除文件
+        - 每次取得执行权时的start_time作为该次执行的标识, 更新进度、完成、失败的UPDATE均以其为条件:
+          超过LEASE被其他进程重新执行的任务, 原导出线程的UPDATE失败后停止, 不会覆盖新执行的结果;
+          导出文件写入该次执行的目录, 两次执行不会写入同一文件
+        - 任务保存在数据库中, 刷新页面后仍可查看进度; 进程退出时未完成的任务超过LEASE未更新后被重新执行
+        - 过期的任务及导出文件由导出线程空闲时或 python manage.py purge_export_jobs 删除
+"""
+import atexit
+import logging
+import os
+import re
+import time
+from datetime import datetime, timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.core.urlresolvers import reverse
+from django.db import transaction
+from django.db.models import Q
+from django.http import HttpRequest, QueryDict
+from django.utils.encoding import force_text
+from django.utils.module_loading import import_module
+from django.utils.six.moves import queue
+
+from users.models import ExportJob
+from utils.background import WorkerThreadMixin
+
+logger = logging.getLogger(__name__)
+
+EXPORT_JOB_SETTINGS = getattr(settings, 'EXPORT_JOB_SETTINGS', {})
+
+# 进行中的任务状态
+ACTIVE_STATUSES = (ExportJob.STATUS_PENDING, ExportJob.STATUS_RUNNING)
+
+
+class ExportJobCancelled(Exception):
+    """导出中任务被取消"""
+    pass
+
+
+def get_root():
+    """导出文件目录"""
+    return EXPORT_JOB_SETTINGS.get('ROOT') or os.path.join(settings.BASE_DIR, 'export_jobs')
+
+
+def get_expire_time(now=None):
+    return (now or datetime.now()) + timedelta(seconds=EXPORT_JOB_SETTINGS.get('EXPIRE', 60 * 60 * 24))
+
+
+def _remove_path(path):
+    """删除文件及其所在的(该次执行的)空目录"""
+    try:
+        os.remove(path)
+        os.rmdir(os.path.dirname(path))
+    except OSError:
+        pass
+
+
+def _remove_file(file_name):
+    if file_name:
+        _remove_path(os.path.join(get_root(), file_name))
+
+
+def create_job(user, model, query_string, title=''):
+    """
+    创建导出任务(事务提交后由导出线程执行)
+    :param user:           UserProfile()
+    :param model:          (Model)  导出的模型
+    :param query_string:   (str)    列表页导出的参数(筛选、搜索、排序及导出格式)
+    :param title:          (str)    任务名称
+    :return:               ExportJob() or None(用户进行中的任务数已达到MAX_ACTIVE_JOBS)
+    """
+    if ExportJob.objects.filter(user=user, status__in=ACTIVE_STATUSES).count() >= \
+            EXPORT_JOB_SETTINGS.get('MAX_ACTIVE_JOBS', 3):
+        return None
+    now = datetime.now()
+    job = ExportJob.objects.create(user=user, model=model._meta.label_lower, query_string=query_string,
+                                   title=title[:100], add_time=now, update_time=now,
+                                   expire_time=get_expire_time(now))
+    export_job_runner.submit(job.id)
+    return job
+
+
+def cancel_job(user, job_id):
+    """
+    取消用户进行中的任务(导出线程在下次更新进度时停止)
+    :return:   (bool)  是否取消成功
+    """
+    now = datetime.now()
+    return ExportJob.objects.filter(id=job_id, user=user, status__in=ACTIVE_STATUSES) \
+                            .update(status=ExportJob.STATUS_CANCELLED, finish_time=now,
+                                    expire_time=get_expire_time(now)) == 1
+
+
+def get_progress(job):
+    """任务进度(进度查询接口的返回数据)"""
+    progress = {'id': job.id,
+                'status': job.status,
+                'status_display': job.get_status_display(),
+                'done_nums': job.done_nums,
+                'total_nums': job.total_nums,
+                'percent': job.percent(),
+                'file_size': job.file_size,
+                'error': job.error}
+    if job.status == ExportJob.STATUS_DONE:
+        progress['download_url'] = reverse('xadmin:export_job_download', kwargs={'job_id': job.id})
+    return progress
+
+
+def purge_export_jobs():
+    """
+    删除过期的任务及导出文件(导出中的任务除外)
+    :return:   (int)   删除的任务数
+    """
+    jobs = ExportJob.objects.filter(expire_time__lt=datetime.now()).exclude(status=ExportJob.STATUS_RUNNING)
+    nums = 0
+    for job_id, file_name in list(jobs.values_list('id', 'file_name')):
+        if ExportJob.objects.filter(id=job_id).exclude(status=ExportJob.STATUS_RUNNING).delete()[0]:
+            _remove_file(file_name)
+            nums += 1
+    return nums
+
+
+def export_response(job, progress=None):
+    """
+    以任务所属用户执行列表页的导出(与页面中导出的权限、筛选、搜索、排序相同)
+    :param progress:   (callable)  progress(done_nums, total_nums), 导出全部数据时每导出一批调用
+    :return:           HttpResponse or StreamingHttpResponse
+    """
+    import xadmin
+    from xadmin.plugins.export import ExportPlugin
+    from xadmin.views import ListAdminView
+
+    user = job.user
+    if not user.is_active or not user.is_staff:
+        raise PermissionDenied
+    model = apps.get_model(job.model)
+    admin_class = xadmin.site._registry.get(model)
+    if admin_class is None:
+        raise ValueError('model {model} is not registered in xadmin'.format(model=job.model))
+
+    request = HttpRequest()
+    request.method = 'GET'
+    request.path = request.path_info = reverse('xadmin:{app_label}_{model_name}_changelist'.format(
+        app_label=model._meta.app_label, model_name=model._meta.model_name))
+    request.GET = QueryDict(job.query_string)
+    request.META = {'QUERY_STRING': job.query_string, 'REQUEST_METHOD': 'GET',
+                    'SERVER_NAME': 'localhost', 'SERVER_PORT': '80'}
+    request.user = user
+    request.session = import_module(settings.SESSION_ENGINE).SessionStore()
+    # 不经过中间件: GET请求不需要CSRF检查
+    request.csrf_processing_done = True
+
+    view = xadmin.site.get_view_class(ListAdminView, admin_class)(request)
+    for plugin in view.plugins:
+        if isinstance(plugin, ExportPlugin):
+            plugin.export_progress = progress
+    return view.get(request)
+
+
+def _file_name(response, job):
+    """
+    导出文件的相对路径: 用户id/任务id/执行时间/模型.扩展名(扩展名取自响应头中的文件名, 路径中不使用中文)
+    """
+    disposition = force_text(response.get('Content-Disposition', ''), errors='ignore')
+    ext = os.path.splitext(disposition.rpartition('filename=')[2].strip().strip('"'))[1]
+    if not re.match(r'^\.[0-9A-Za-z]{1,10}$', ext):
+        ext = ''
+    return '{user}/{id}/{claim}/{model}{ext}'.format(user=job.user_id, id=job.id,
+                                                     claim=job.start_time.strftime('%Y%m%d%H%M%S%f'),
+                                                     model=job.model.replace('.', '_'), ext=ext.lower())
+
+
+class JobProgress(object):
+    """导出中的进度: 每隔interval秒更新一次数据库, 同时检查任务是否已被取消或被其他进程重新执行"""
+
+    def __init__(self, job_id, start_time, interval):
+        self.job_id = job_id
+        self.start_time = start_time
+        self.interval = interval
+        self.done_nums = 0
+        self.total_nums = 0
+        self._last_update = 0
+
+    def update(self, done_nums, total_nums):
+        self.done_nums = done_nums
+        self.total_nums = total_nums
+        # 开始导出时立即保存总行数
+        self.beat(force=not done_nums)
+
+    def beat(self, force=False):
+        now = time.time()
+        if not force and now - self._last_update < self.interval:
+            return
+        self._last_update = now
+        if not ExportJob.objects.filter(id=self.job_id, status=ExportJob.STATUS_RUNNING,
+                                        start_time=self.start_time) \
+                                .update(done_nums=self.done_nums, total_nums=self.total_nums,
+                                        update_time=datetime.now()):
+            raise ExportJobCancelled(self.job_id)
+
+
+class ExportJobRunner(WorkerThreadMixin):
+    """
+        导出任务执行队列
+
+        任务id写入进程内的队列, 由固定数量的导出线程执行; 队列已满或进程退出时未执行的任务留在数据库中,
+        由导出线程空闲时取出执行
+    """
+
+    def __init__(self, mode='async', workers=2, max_size=100, lease=300, progress_interval=2,
+                 poll_interval=30):
+        """
+        :param mode:                (str)   'async' 导出线程执行, 'sync' 在请求中立即执行(测试)
+        :param workers:             (int)   每个进程的导出线程数
+        :param max_size:            (int)   队列容量
+        :param lease:               (int)   导出中的任务超过该时间(秒)未更新进度时可被重新执行
+        :param progress_interval:   (int)   更新进度的间隔(秒)
+        :param poll_interval:       (int)   导出线程空闲时检查未执行任务的间隔(秒)
+        """
+        self.mode = mode
+        self.lease = lease
+        self.progress_interval = progress_interval
+        self.poll_interval = poll_interval
+        self._queue = queue.Queue(maxsize=max_size)
+        self.init_workers('export job runner', workers)
+
+    def submit(self, job_id):
+        if self.mode == 'sync':
+            self.run(job_id)
+        else:
+            # 事务提交后导出线程才能读取到该任务
+            transaction.on_commit(lambda: self._enqueue(job_id))
+
+    def _enqueue(self, job_id):
+        self._ensure_workers()
+        try:
+            self._queue.put_nowait(job_id)
+        except queue.Full:
+            logger.warning('export job queue is full, job %s is left in database', job_id)
+
+    def _claim(self, job_id, now):
+        """
+        取得任务的执行权(一条UPDATE), 避免多个进程重复执行
+        :return:   (datetime)  该次执行的标识(start_time), 未取得时为None
+        """
+        if ExportJob.objects.filter(Q(status=ExportJob.STATUS_PENDING) |
+                                    Q(status=ExportJob.STATUS_RUNNING,
+                                      update_time__lt=now - timedelta(seconds=self.lease)),
+                                    id=job_id) \
+                            .update(status=ExportJob.STATUS_RUNNING, start_time=now, update_time=now,
+                                    done_nums=0, error='') == 1:
+            return now
+        return None
+
+    def run(self, job_id):
+        """
+        执行导出任务
+        :return:   (bool)  是否导出成功
+        """
+        start_time = self._claim(job_id, datetime.now())
+        if start_time is None:
+            return False
+        job = ExportJob.objects.select_related('user').get(id=job_id)
+        # 导出文件目录使用取得执行权时的值(数据库不支持微秒时读取的start_time已被舍去微秒)
+        job.start_time = start_time
+        # 该次执行的UPDATE条件
+        claimed = ExportJob.objects.filter(id=job.id, status=ExportJob.STATUS_RUNNING, start_time=start_time)
+        progress = JobProgress(job.id, start_time, self.progress_interval)
+        root = get_root()
+        file_name = ''
+        part_path = None
+        try:
+            # 不调用response.close(): 会发送request_finished信号关闭当前线程的数据库连接
+            response = export_response(job, progress.update)
+            if response.status_code != 200:
+                raise ValueError('export response status {status}'.format(status=response.status_code))
+            file_name = _file_name(response, job)
+            path = os.path.join(root, file_name)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            # 写入完成后再改名, 下载时不会读到未写完的文件
+            part_path = path + '.part'
+            with open(part_path, 'wb') as f:
+                for chunk in (response.streaming_content if response.streaming else [response.content]):
+                    f.write(chunk)
+                    progress.beat()
+            os.rename(part_path, path)
+            part_path = None
+        except ExportJobCancelled:
+            self._remove_part(part_path)
+            return False
+        except Exception as e:
+            logger.exception('export job %s failed', job.id)
+            self._remove_part(part_path)
+            now = datetime.now()
+            claimed.update(status=ExportJob.STATUS_FAILED, error=repr(e), finish_time=now,
+                           expire_time=get_expire_time(now))
+            return False
+
+        now = datetime.now()
+        if not claimed.update(status=ExportJob.STATUS_DONE, file_name=file_name,
+                              file_size=os.path.getsize(os.path.join(root, file_name)),
+                              done_nums=progress.total_nums or progress.done_nums,
+                              total_nums=progress.total_nums or progress.done_nums,
+                              update_time=now, finish_time=now, expire_time=get_expire_time(now)):
+            # 导出完成时任务已被取消或已被其他进程重新执行
+            _remove_file(file_name)
+            return False
+        return True
+
+    def _remove_part(self, part_path):
+        if part_path is not None:
+            _remove_path(part_path)
+
+    def run_due(self, limit=10):
+        """
+        执行数据库中未执行的任务(未进入队列、执行超时的任务)
+        :return:   (int)   导出成功的任务数
+        """
+        job_ids = list(ExportJob.objects.filter(Q(status=ExportJob.STATUS_PENDING) |
+                                                Q(status=ExportJob.STATUS_RUNNING,
+                                                  update_time__lt=datetime.now() - timedelta(seconds=self.lease)))
+                                        .order_by('add_time').values_list('id', flat=True)[:limit])
+        done_nums = 0
+        for job_id in job_ids:
+            if self._stopping:
+                break
+            done_nums += self.run(job_id)
+        return done_nums
+
+    def _take_work(self):
+        try:
+            return self._queue.get(timeout=self.poll_interval)
+        except queue.Empty:
+            return None
+
+    def _process_work(self, job_id):
+        if job_id is not None:
+            self.run(job_id)
+        else:
+            self.run_due()
+            purge_export_jobs()
+
+
+# 测试settings中可将MODE设为'sync'
+export_job_runner = ExportJobRunner(mode=EXPORT_JOB_SETTINGS.get('MODE', 'async'),
+                                    workers=EXPORT_JOB_SETTINGS.get('WORKERS', 2),
+                                    max_size=EXPORT_JOB_SETTINGS.get('MAX_SIZE', 100),
+                                    lease=EXPORT_JOB_SETTINGS.get('LEASE', 300),
+                                    progress_interval=EXPORT_JOB_SETTINGS.get('PROGRESS_INTERVAL', 2),
+                                    poll_interval=EXPORT_JOB_SETTINGS.get('POLL_INTERVAL', 30))
+
+# 进程退出时不再开始新的任务(导出中的任务超过LEASE后由其它进程重新执行)
+atexit.register(export_job_runner.stop)
@@ -0,0 +1,176 @@
+# coding: utf-8
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from pure_pagination import Paginator
+
+from courses.models import Course
+from operation.models import UserFavorite
+from organization.models import CourseOrg, Teacher
+
+# UserFavorite.fav_type: (1, u'课程'), (2, u'课程机构'), (3, u'讲师')
+FAV_TYPE_COURSE = 1
+FAV_TYPE_ORG = 2
+FAV_TYPE_TEACHER = 3
+
+FAV_MODELS = {FAV_TYPE_COURSE: Course, FAV_TYPE_ORG: CourseOrg, FAV_TYPE_TEACHER: Teacher}
+FAV_TYPE_NAMES = {FAV_TYPE_COURSE: u'课程', FAV_TYPE_ORG: u'课程机构', FAV_TYPE_TEACHER: u'讲师'}
+
+# 用户收藏集合的缓存时间(秒), 收藏、取消收藏时主动清除
+FAV_CACHE_TIMEOUT = 60 * 60 * 24
+
+# 批量收藏、取消收藏的最大数量
+MAX_BULK_FAV_NUMS = 100
+
+
+def get_fav_queryset(fav_type):
+    """获取收藏对象的queryset(关联收藏页模板中用到的外键)"""
+    if fav_type == FAV_TYPE_COURSE:
+        return Course.objects.select_related('course_org')
+    elif fav_type == FAV_TYPE_ORG:
+        return CourseOrg.objects.select_related('city')
+    return FAV_MODELS[fav_type].objects.all()
+
+
+def resolve_favorites(fav_records):
+    """
+    将UserFavorite记录解析为收藏对象, 每种收藏类型只查询一次(in_bulk)
+    :param fav_records:   UserFavorite的可迭代对象(如分页后的object_list)
+    :return:              (list)  收藏对象, 顺序与fav_records一致, 已删除的对象被跳过
+    """
+    fav_records = list(fav_records)
+
+    # {fav_type: set(fav_id)}
+    fav_ids = defaultdict(set)
+    for record in fav_records:
+        fav_ids[record.fav_type].add(record.fav_id)
+
+    # {fav_type: {fav_id: obj}}
+    objs = dict((fav_type, get_fav_queryset(fav_type).in_bulk(list(ids))) for fav_type, ids in fav_ids.items())
+
+    return [objs[record.fav_type][record.fav_id] for record in fav_records
+            if record.fav_id in objs[record.fav_type]]
+
+
+def _fav_cache_key(user_id, fav_type):
+    return 'user_fav_ids:{user_id}:{fav_type}'.format(user_id=user_id, fav_type=fav_type)
+
+
+def get_user_fav_ids(user_id, fav_types):
+    """
+    获取用户各类收藏的id集合, 优先从缓存中读取, 未命中的类型一次查询后写入缓存
+    :param user_id:     (int)   用户id
+    :param fav_types:   可迭代对象 收藏类型
+    :return:            (dict)  {fav_type: set(fav_id)}
+    """
+    keys = dict((fav_type, _fav_cache_key(user_id, fav_type)) for fav_type in set(fav_types))
+    cached = cache.get_many(keys.values())
+
+    fav_ids = {}
+    missed_types = []
+    for fav_type, key in keys.items():
+        if key in cached:
+            fav_ids[fav_type] = cached[key]
+        else:
+            missed_types.append(fav_type)
+            fav_ids[fav_type] = set()
+
+    if missed_types:
+        records = UserFavorite.objects.filter(user_id=user_id, fav_type__in=missed_types) \
+                                      .values_list('fav_type', 'fav_id')
+        for fav_type, fav_id in records:
+            fav_ids[fav_type].add(fav_id)
+        cache.set_many(dict((keys[fav_type], fav_ids[fav_type]) for fav_type in missed_types),
+                       FAV_CACHE_TIMEOUT)
+    return fav_ids
+
+
+def invalidate_user_fav_ids(user_id, fav_type):
+    """用户收藏、取消收藏后清除该类收藏的缓存"""
+    cache.delete(_fav_cache_key(user_id, fav_type))
+
+
+def toggle_favorite(user_id, fav_type, fav_id):
+    """
+    收藏或取消收藏(已收藏则取消)
+
+    (user, fav_type, fav_id) 唯一索引下: 先以一条DELETE取消收藏, 未删除记录时INSERT收藏;
+    收藏对象的fav_nums以F()表达式在同一事务中 +1/-1, 并发点击不会丢失更新
+    :param user_id:    (int)   用户id
+    :param fav_type:   (int)   收藏类型
+    :param fav_id:     (int)   收藏对象id
+    :return:           (bool)  True 已收藏, False 已取消收藏, None 收藏对象不存在
+    """
+    model = FAV_MODELS[fav_type]
+    with transaction.atomic():
+        # UserFavorite没有关联对象及删除signal, delete()为一条DELETE
+        deleted_nums = UserFavorite.objects.filter(user_id=user_id, fav_type=fav_type, fav_id=fav_id).delete()[0]
+        if deleted_nums:
+            model.objects.filter(id=fav_id, fav_nums__gt=0).update(fav_nums=F('fav_nums') - 1)
+            faved = False
+        else:
+            try:
+                # savepoint: 并发请求已插入同一收藏时放弃本次收藏
+                with transaction.atomic():
+                    UserFavorite.objects.create(user_id=user_id, fav_type=fav_type, fav_id=fav_id)
+                    if not model.objects.filter(id=fav_id).update(fav_nums=F('fav_nums') + 1):
+                        raise model.DoesNotExist()
+            except model.DoesNotExist:
+                return None
+            except IntegrityError:
+                pass
+            faved = True
+        # 事务提交后再清除缓存: 提交前读取的旧收藏集合会被重新缓存FAV_CACHE_TIMEOUT
+        # (批量收藏时外层事务提交后才执行)
+        transaction.on_commit(lambda: invalidate_user_fav_ids(user_id, fav_type))
+    return faved
+
+
+def toggle_favorites(user_id, targets):
+    """
+    批量收藏、取消收藏(一个事务), 重复的对象只切换一次
+    :param targets:   [(fav_type, fav_id), ...]
+    :return:          (list)  [(fav_type, fav_id, toggle_favorite()的返回值), ...], 按targets中首次出现的顺序
+    """
+    unique_targets = []
+    for target in targets:
+        if target not in unique_targets:
+            unique_targets.append(target)
+    with transaction.atomic():
+        return [(fav_type, fav_id, toggle_favorite(user_id, fav_type, fav_id)) for fav_type, fav_id in unique_targets]
+
+
+def get_fav_name(fav_type, fav_id):
+    """收藏对象的名称(课程名称、机构名称或讲师名字)"""
+    return FAV_MODELS[fav_type].objects.filter(id=fav_id).values_list('name', flat=True).first() or ''
+
+
+def get_fav_status(user, targets):
+    """
+    获取用户对多个对象的收藏状态(读取缓存的用户收藏集合)
+    :param user:      用户
+    :param targets:   [(fav_type, fav_id), ...]  如 [(1, course.id), (2, course.course_org_id)]
+    :return:          (set)  已收藏的 (fav_type, fav_id)
+    """
+    targets = [(fav_type, fav_id) for fav_type, fav_id in targets if fav_id]
+    if not user.is_authenticated() or not targets:
+        return set()
+
+    fav_ids = get_user_fav_ids(user.id, [fav_type for fav_type, fav_id in targets])
+    return set((fav_type, fav_id) for fav_type, fav_id in targets if fav_id in fav_ids[fav_type])
+
+
+def is_fav(user, fav_type, fav_id):
+    """用户是否收藏了某个对象"""
+    return (fav_type, fav_id) in get_fav_status(user, [(fav_type, fav_id)])
+
+
+class FavoritePaginator(Paginator):
+    """对UserFavorite记录分页, 当前页的object_list解析为收藏对象"""
+
+    def page(self, number):
+        page = super(FavoritePaginator, self).page(number)
+        page.object_list = resolve_favorites(page.object_list)
+        return page
@@ -0,0 +1,176 @@
+# coding: utf-8
+"""
+    生产环境(DEBUG=False)的media、static文件访问
+
+    替代 django.views.static.serve:
+        - 强ETag, If-None-Match / If-Modified-Since 返回304
+        - Range请求返回206(视频拖动进度条、断点续传下载)
+        - FileResponse交给WSGI服务器的 wsgi.file_wrapper(uWSGI使用sendfile发送, 不在python中逐块读写)
+        - 'x-accel' 模式只返回 X-Accel-Redirect 响应头, 由nginx发送文件
+        - 文件名带内容hash的静态资源(如 ManifestStaticFilesStorage 生成的 app.3f2a9c1b7e4d.css)长期缓存
+"""
+import mimetypes
+import os
+import posixpath
+import re
+import stat
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_http_date_safe, quote_etag, urlquote
+from django.views.static import was_modified_since
+
+FILE_SERVE_SETTINGS = getattr(settings, 'FILE_SERVE_SETTINGS', {})
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+# 文件名中的内容hash, 如 base.5e0c5a2ff3d1.css
+HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+ETAG_SPLIT_RE = re.compile(r'\s*,\s*')
+
+
+def make_etag(st):
+    """根据文件的修改时间及大小生成强ETag"""
+    return quote_etag('{mtime:x}-{size:x}'.format(mtime=int(st.st_mtime * 1000000), size=st.st_size))
+
+
+def parse_range(header, size):
+    """
+    解析Range请求头(只支持单个范围, 多个范围时返回完整文件)
+    :param header:   (str)   Range请求头, 如 'bytes=0-1023', 'bytes=1024-', 'bytes=-1024'
+    :param size:     (int)   文件大小
+    :return:         (tuple) (start, end) 闭区间, 无效或不支持的范围返回None
+    :raise:          ValueError  范围无法满足(416)
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match or size == 0:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+
+    if not start:
+        # 'bytes=-n' 最后n个字节
+        suffix = int(end)
+        if suffix == 0:
+            raise ValueError(header)
+        return max(size - suffix, 0), size - 1
+
+    start = int(start)
+    if end and int(end) < start:
+        return None
+    if start >= size:
+        raise ValueError(header)
+    return start, min(int(end), size - 1) if end else size - 1
+
+
+def _if_range_matches(request, etag, mtime):
+    """If-Range与当前文件一致时才返回部分内容, 否则返回完整文件"""
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == int(mtime)
+
+
+def _not_modified(request, etag, st):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        etags = ETAG_SPLIT_RE.split(if_none_match.strip())
+        return '*' in etags or etag in etags or ('W/' + etag) in etags
+    return not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), st.st_mtime, st.st_size)
+
+
+def _iter_range(f, length, chunk_size):
+    """读取文件当前位置起的length个字节"""
+    try:
+        while length > 0:
+            data = f.read(min(chunk_size, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+    finally:
+        f.close()
+
+
+def _cache_control(path):
+    if HASHED_NAME_RE.search(path):
+        return 'public, max-age={age}, immutable'.format(age=FILE_SERVE_SETTINGS.get('IMMUTABLE_MAX_AGE',
+                                                                                       60 * 60 * 24 * 365))
+    return 'public, max-age={age}'.format(age=FILE_SERVE_SETTINGS.get('MAX_AGE', 0))
+
+
+def _set_headers(response, path, etag, st):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(st.st_mtime)
+    response['Cache-Control'] = _cache_control(path)
+    response['Accept-Ranges'] = 'bytes'
+
+
+def serve(request, path, document_root=None, url_prefix=None):
+    """
+    文件访问view, 用法同 django.views.static.serve
+    :param path:            (str)  url中的文件路径
+    :param document_root:   (str)  文件根目录, 如 MEDIA_ROOT
+    :param url_prefix:      (str)  'x-accel'模式下nginx internal location的前缀, 如 '/protected/media/'
+    """
+    path = posixpath.normpath(path).lstrip('/')
+    try:
+        fullpath = safe_join(document_root, path)
+    except (SuspiciousFileOperation, ValueError):
+        raise Http404(u'文件不存在')
+    try:
+        st = os.stat(fullpath)
+    except OSError:
+        raise Http404(u'文件不存在')
+    if not stat.S_ISREG(st.st_mode):
+        raise Http404(u'文件不存在')
+
+    etag = make_etag(st)
+    if _not_modified(request, etag, st):
+        response = HttpResponseNotModified()
+        _set_headers(response, path, etag, st)
+        return response
+
+    content_type, encoding = mimetypes.guess_type(fullpath)
+    content_type = content_type or 'application/octet-stream'
+
+    if FILE_SERVE_SETTINGS.get('MODE') == 'x-accel' and url_prefix:
+        # 由nginx发送文件(nginx自行处理Range)
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = urlquote(url_prefix + path)
+        _set_headers(response, path, etag, st)
+        return response
+
+    try:
+        byte_range = parse_range(request.META.get('HTTP_RANGE'), st.st_size) \
+            if _if_range_matches(request, etag, st.st_mtime) else None
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = 'bytes */{size}'.format(size=st.st_size)
+        return response
+
+    f = open(fullpath, 'rb')
+    if byte_range is None:
+        response = FileResponse(f, content_type=content_type)
+        response['Content-Length'] = st.st_size
+    else:
+        start, end = byte_range
+        f.seek(start)
+        if end == st.st_size - 1:
+            # 到文件末尾的范围(视频拖动的常见请求)仍可使用wsgi.file_wrapper
+            response = FileResponse(f, status=206, content_type=content_type)
+        else:
+            response = StreamingHttpResponse(_iter_range(f, end - start + 1,
+                                                         FILE_SERVE_SETTINGS.get('CHUNK_SIZE', 64 * 1024)),
+                                             status=206, content_type=content_type)
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = 'bytes {start}-{end}/{size}'.format(start=start, end=end, size=st.st_size)
+
+    if encoding:
+        response['Content-Encoding'] = encoding
+    _set_headers(response, path, etag, st)
+    return response
@@ -0,0 +1,223 @@
+# coding: utf-8
+"""
+    游标(keyset / seek)分页
+
+    按 (排序字段, id) 定位下一页: WHERE (add_time, id) < (上一页最后一条) ORDER BY add_time DESC, id DESC LIMIT n,
+    不需要 COUNT(*) 及 OFFSET 扫描, 深度翻页的耗时不随页数增加.
+    游标(url中的cursor参数)为base64编码的排序字段值, 页面对象的属性与pure_pagination的Page一致,
+    模板中的 *_paginator.pages / has_next / next_page_number.querystring 等用法无需修改
+"""
+import base64
+import datetime
+import decimal
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import six
+from django.utils.encoding import force_bytes, force_text
+from pure_pagination import Paginator
+from pure_pagination.paginator import PageRepresentation
+
+from Lighten.settings import PAGINATION_SETTINGS
+
+# 游标分页的url参数
+CURSOR_PARAM = 'cursor'
+
+
+def get_count(queryset, cache_count=False):
+    """
+    查询总数
+    :param cache_count:   (bool)  是否缓存总数(近似值, 缓存时间 PAGINATION_SETTINGS['COUNT_CACHE_TIMEOUT'])
+    """
+    if not cache_count:
+        return queryset.count()
+    key = 'pagination_count:' + hashlib.md5(force_bytes(six.text_type(queryset.query))).hexdigest()
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, PAGINATION_SETTINGS.get('COUNT_CACHE_TIMEOUT', 60))
+    return count
+
+
+def _encode_value(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    return value
+
+
+class KeysetPaginator(object):
+    """游标分页器, 排序字段必须非空, 最后以id排序保证顺序唯一"""
+
+    def __init__(self, queryset, per_page, ordering, request=None, cache_count=False):
+        """
+        :param queryset:      QuerySet
+        :param per_page:      (int)   每页数量
+        :param ordering:      (list)  排序字段, 如 ['-add_time', '-id'], 未以id结尾时自动追加
+        :param request:       HttpRequest  用于生成保留其他GET参数的querystring
+        :param cache_count:   (bool)  总数是否使用缓存的近似值
+        """
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        # [(字段, 是否降序)]
+        self.ordering = [(field.lstrip('-'), field.startswith('-')) for field in ordering]
+        if self.ordering[-1][0] not in ('id', 'pk'):
+            self.ordering.append(('id', self.ordering[-1][1]))
+        self.request = request
+        self.cache_count = cache_count
+        self._count = None
+
+    @property
+    def count(self):
+        """总数(只在模板或view使用时查询)"""
+        if self._count is None:
+            self._count = get_count(self.queryset, self.cache_count)
+        return self._count
+
+    @property
+    def num_pages(self):
+        return max((self.count + self.per_page - 1) // self.per_page, 1)
+
+    def encode_cursor(self, obj, number, reverse=False):
+        """
+        生成游标
+        :param obj:       定位的对象(下一页: 当前页最后一条, 上一页: 当前页第一条)
+        :param number:    (int)   游标指向的页码(只用于显示)
+        :param reverse:   (bool)  是否向前翻页
+        """
+        state = {'v': [_encode_value(getattr(obj, field)) for field, desc in self.ordering],
+                 'p': number, 'r': int(reverse)}
+        return force_text(base64.urlsafe_b64encode(force_bytes(json.dumps(state, separators=(',', ':')))))
+
+    def decode_cursor(self, cursor):
+        """解析游标, 无效的游标返回None(显示第一页)"""
+        if not cursor:
+            return None
+        try:
+            state = json.loads(force_text(base64.urlsafe_b64decode(force_bytes(cursor))))
+            values = state['v']
+            if len(values) != len(self.ordering):
+                return None
+            values = [self.queryset.model._meta.get_field(field).to_python(value)
+                      for (field, desc), value in zip(self.ordering, values)]
+            return values, max(int(state['p']), 1), bool(state['r'])
+        except Exception:
+            return None
+
+    def _seek_q(self, values, reverse):
+        """(f1, f2, ...) 在游标之后(或之前)的条件: f1 < v1 OR (f1 = v1 AND f2 < v2) OR ..."""
+        q = Q()
+        for i, (field, desc) in enumerate(self.ordering):
+            lookup = 'lt' if desc != reverse else 'gt'
+            condition = dict((f, v) for (f, d), v in zip(self.ordering[:i], values[:i]))
+            condition['{field}__{lookup}'.format(field=field, lookup=lookup)] = values[i]
+            q |= Q(**condition)
+        return q
+
+    def page(self, cursor=None):
+        """获取游标所在的一页"""
+        state = self.decode_cursor(cursor)
+        values, number, reverse = state or (None, 1, False)
+
+        queryset = self.queryset
+        if values is not None:
+            queryset = queryset.filter(self._seek_q(values, reverse))
+        order_by = [('-' if desc != reverse else '') + field for field, desc in self.ordering]
+        # 多取一条判断是否还有下一页(向前翻页时为上一页)
+        objs = list(queryset.order_by(*order_by)[:self.per_page + 1])
+        has_more = len(objs) > self.per_page
+        objs = objs[:self.per_page]
+
+        if reverse:
+            objs.reverse()
+            return KeysetPage(objs, number, self, has_previous=has_more, has_next=True)
+        return KeysetPage(objs, number, self, has_previous=values is not None, has_next=has_more)
+
+
+class KeysetPage(object):
+    """游标分页的一页, 属性与pure_pagination的Page一致"""
+
+    def __init__(self, object_list, number, paginator, has_previous, has_next):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_previous = has_previous and number > 1
+        self._has_next = has_next and bool(object_list)
+        self.number = PageRepresentation(number, self._querystring(
+            paginator.request.GET.get(CURSOR_PARAM) if paginator.request else None))
+
+    def __repr__(self):
+        return '<KeysetPage %s>' % self.number
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_previous or self._has_next
+
+    def next_page_number(self):
+        number = self.number + 1
+        return PageRepresentation(number, self._querystring(
+            self.paginator.encode_cursor(self.object_list[-1], number)))
+
+    def previous_page_number(self):
+        number = self.number - 1
+        if number <= 1:
+            return self.first_page_number()
+        return PageRepresentation(number, self._querystring(
+            self.paginator.encode_cursor(self.object_list[0], number, reverse=True)))
+
+    def first_page_number(self):
+        return PageRepresentation(1, self._querystring(None))
+
+    def pages(self):
+        """页码导航: 第一页 ... 上一页 当前页 下一页"""
+        pages = []
+        if self.number > 2:
+            pages.append(self.first_page_number())
+        if self.number > 3:
+            pages.append(None)
+        if self.has_previous():
+            pages.append(self.previous_page_number())
+        pages.append(self.number)
+        if self.has_next():
+            pages.append(self.next_page_number())
+        return pages
+
+    def _querystring(self, cursor):
+        """保留其他GET参数, 替换游标"""
+        if not self.paginator.request:
+            return '{param}={cursor}'.format(param=CURSOR_PARAM, cursor=cursor) if cursor else ''
+        query = self.paginator.request.GET.copy()
+        query.pop('page', None)
+        query.pop(CURSOR_PARAM, None)
+        if cursor:
+            query[CURSOR_PARAM] = cursor
+        return query.urlencode()
+
+
+def paginate(request, queryset, per_page, ordering=None, cache_count=False):
+    """
+    列表分页: PAGINATION_SETTINGS['MODE'] 为 'keyset' 且指定了ordering时使用游标分页,
+    否则(如按搜索相关度排序)使用pure_pagination的页码分页
+    :param ordering:      (list)  游标分页的排序字段, 如 ['-add_time', '-id']
+    :param cache_count:   (bool)  总数是否使用缓存的近似值
+    :return:              当前页, 总数为 page.paginator.count
+    """
+    if ordering and PAGINATION_SETTINGS.get('MODE') == 'keyset':
+        paginator = KeysetPaginator(queryset, per_page, ordering, request=request, cache_count=cache_count)
+        return paginator.page(request.GET.get(CURSOR_PARAM))
+
+    paginator = Paginator(queryset, per_page, request=request)
+    if cache_count:
+        paginator._count = get_count(queryset, cache_count)
+    try:
+        page_num = int(request.GET.get('page', 1))
+    except (TypeError, ValueError):
+        page_num = 1
+    return paginator.page(page_num)
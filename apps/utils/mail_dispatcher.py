@@ -0,0 +1,247 @@
+# coding: utf-8
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils.six.moves import queue
+
+from utils.background import WorkerThreadMixin
+
+logger = logging.getLogger(__name__)
+
+
+class MailDispatcher(WorkerThreadMixin):
+    """
+        邮件发送队列
+
+        邮件先写入EmailOutbox表, 再由进程内的固定数量的发送线程批量发送:
+        同一批邮件复用一个SMTP连接, 发送失败的邮件按指数退避时间重试, 进程退出或队列已满时未发送的邮件
+        留在EmailOutbox中, 由发送线程空闲时或 python manage.py send_outbox 继续发送
+    """
+
+    def __init__(self, mode='async', workers=2, batch_size=20, max_size=1000, max_attempts=5,
+                 retry_delay=60, lease=300, poll_interval=30):
+        """
+        :param mode:            (str)   'async' 发送线程批量发送, 'sync' 在请求中立即发送(测试)
+        :param workers:         (int)   每个进程的发送线程数
+        :param batch_size:      (int)   每批(每个SMTP连接)发送的最大邮件数
+        :param max_size:        (int)   队列容量
+        :param max_attempts:    (int)   最大发送次数, 超过后标记为发送失败
+        :param retry_delay:     (int)   第一次重试的等待时间(秒), 之后每次翻倍
+        :param lease:           (int)   邮件被取出后的占用时间(秒), 超时未完成(如进程退出)可被重新发送
+        :param poll_interval:   (int)   发送线程空闲时检查待重试邮件的间隔(秒)
+        """
+        self.mode = mode
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self._queue = queue.Queue(maxsize=max_size)
+        self._lock = threading.Lock()
+        self.init_workers('mail dispatcher', workers)
+
+        # 统计(当前进程)
+        self.sent_nums = 0
+        self.failed_nums = 0
+        self.retry_nums = 0
+        # 最近发送的邮件: 从写入队列到发送完成的耗时, SMTP发送耗时(秒)
+        self._latencies = deque(maxlen=1000)
+        self._send_times = deque(maxlen=1000)
+
+    def send(self, subject, message, recipient_list, from_email=None):
+        """
+        写入邮件发送队列
+        :param subject:          (str)   标题
+        :param message:          (str)   内容
+        :param recipient_list:   (list)  收件人
+        :param from_email:       (str)   发件人, 默认settings.EMAIL_FROM
+        :return:                 EmailOutbox()
+        """
+        from users.models import EmailOutbox
+
+        email = EmailOutbox.objects.create(subject=subject, body=message,
+                                           from_email=from_email or getattr(settings, 'EMAIL_FROM', None) or '',
+                                           recipients=','.join(recipient_list))
+        if self.mode == 'sync':
+            self.deliver([email.id])
+        else:
+            # 事务提交后发送线程才能读取到该记录
+            transaction.on_commit(lambda: self._enqueue(email.id))
+        return email
+
+    def _enqueue(self, email_id):
+        self._ensure_workers()
+        try:
+            self._queue.put_nowait(email_id)
+        except queue.Full:
+            logger.warning('mail queue is full, email %s is left in outbox', email_id)
+
+    def _claim(self, email_id, now):
+        """取得邮件的发送权(一条UPDATE), 避免多个进程重复发送"""
+        from users.models import EmailOutbox
+
+        return EmailOutbox.objects.filter(id=email_id, next_try_time__lte=now,
+                                          status__in=[EmailOutbox.STATUS_PENDING, EmailOutbox.STATUS_SENDING]) \
+                                  .update(status=EmailOutbox.STATUS_SENDING,
+                                          next_try_time=now + timedelta(seconds=self.lease)) == 1
+
+    def deliver(self, email_ids):
+        """
+        发送一批邮件(复用一个SMTP连接)
+        :param email_ids:   (list)  EmailOutbox id
+        :return:            (int)   发送成功的邮件数
+        """
+        from users.models import EmailOutbox
+
+        now = datetime.now()
+        email_ids = [email_id for email_id in email_ids if self._claim(email_id, now)]
+        if not email_ids:
+            return 0
+
+        emails = list(EmailOutbox.objects.filter(id__in=email_ids).order_by('id'))
+        connection = get_connection(fail_silently=False)
+        try:
+            connection.open()
+        except Exception as e:
+            logger.exception('open mail connection failed')
+            for email in emails:
+                self._fail(email, e)
+            return 0
+
+        # 逐封发送而不是 connection.send_messages(messages): SMTP后端的send_messages同样在一个连接上逐封发送,
+        # 但第一封失败即抛出异常, 无法得知哪些邮件已发送(重试时会重复发送); 逐封发送可按行记录成功、失败
+        sent_nums = 0
+        try:
+            for email in emails:
+                start = time.time()
+                try:
+                    EmailMessage(email.subject, email.body, email.from_email, email.recipient_list(),
+                                 connection=connection).send()
+                except Exception as e:
+                    logger.exception('send email %s failed', email.id)
+                    self._fail(email, e)
+                    continue
+                self._succeed(email, time.time() - start)
+                sent_nums += 1
+        finally:
+            try:
+                connection.close()
+            except Exception:
+                logger.exception('close mail connection failed')
+        return sent_nums
+
+    def _succeed(self, email, send_time):
+        from users.models import EmailOutbox
+
+        now = datetime.now()
+        EmailOutbox.objects.filter(id=email.id).update(status=EmailOutbox.STATUS_SENT, sent_time=now,
+                                                       attempts=email.attempts + 1, last_error='')
+        with self._lock:
+            self.sent_nums += 1
+            self._send_times.append(send_time)
+            self._latencies.append((now - email.add_time).total_seconds())
+
+    def _fail(self, email, error):
+        """发送失败: 未达到最大发送次数时按指数退避时间重试"""
+        from users.models import EmailOutbox
+
+        attempts = email.attempts + 1
+        if attempts >= self.max_attempts:
+            EmailOutbox.objects.filter(id=email.id).update(status=EmailOutbox.STATUS_FAILED, attempts=attempts,
+                                                           last_error=repr(error))
+            with self._lock:
+                self.failed_nums += 1
+            return
+
+        delay = self.retry_delay * 2 ** (attempts - 1)
+        EmailOutbox.objects.filter(id=email.id).update(status=EmailOutbox.STATUS_PENDING, attempts=attempts,
+                                                       next_try_time=datetime.now() + timedelta(seconds=delay),
+                                                       last_error=repr(error))
+        with self._lock:
+            self.retry_nums += 1
+
+    def retry_due(self, limit=100):
+        """
+        发送EmailOutbox中已到发送时间的邮件(待重试、未进入队列、发送超时的邮件)
+        :return:   (int)   发送成功的邮件数
+        """
+        from users.models import EmailOutbox
+
+        email_ids = list(EmailOutbox.objects.filter(status__in=[EmailOutbox.STATUS_PENDING,
+                                                                EmailOutbox.STATUS_SENDING],
+                                                    next_try_time__lte=datetime.now())
+                                            .order_by('next_try_time').values_list('id', flat=True)[:limit])
+        sent_nums = 0
+        for i in range(0, len(email_ids), self.batch_size):
+            sent_nums += self.deliver(email_ids[i:i + self.batch_size])
+        return sent_nums
+
+    def stats(self):
+        """队列长度、发送数及发送耗时统计"""
+        from users.models import EmailOutbox
+
+        with self._lock:
+            latencies = list(self._latencies)
+            send_times = list(self._send_times)
+            stats = {'queue_depth': self._queue.qsize(),
+                     'sent_nums': self.sent_nums,
+                     'failed_nums': self.failed_nums,
+                     'retry_nums': self.retry_nums}
+        stats['outbox_pending'] = EmailOutbox.objects.filter(status__in=[EmailOutbox.STATUS_PENDING,
+                                                                         EmailOutbox.STATUS_SENDING]).count()
+        stats['outbox_failed'] = EmailOutbox.objects.filter(status=EmailOutbox.STATUS_FAILED).count()
+        stats['latency_avg'] = sum(latencies) / len(latencies) if latencies else 0
+        stats['latency_max'] = max(latencies) if latencies else 0
+        stats['send_time_avg'] = sum(send_times) / len(send_times) if send_times else 0
+        return stats
+
+    def flush(self):
+        """发送队列中所有的邮件"""
+        while True:
+            email_ids = self._take(self.batch_size, timeout=None)
+            if not email_ids:
+                return
+            self.deliver(email_ids)
+
+    def _take(self, nums, timeout):
+        """从队列取出最多nums个邮件id, timeout为None时不等待"""
+        email_ids = []
+        try:
+            email_ids.append(self._queue.get_nowait() if timeout is None else self._queue.get(timeout=timeout))
+            while len(email_ids) < nums:
+                email_ids.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return email_ids
+
+    def _take_work(self):
+        return self._take(self.batch_size, timeout=self.poll_interval)
+
+    def _process_work(self, email_ids):
+        if email_ids:
+            self.deliver(email_ids)
+        else:
+            self.retry_due()
+
+
+# 测试settings中可将MODE设为'sync'
+MAIL_DISPATCHER_SETTINGS = getattr(settings, 'MAIL_DISPATCHER_SETTINGS', {})
+
+mail_dispatcher = MailDispatcher(mode=MAIL_DISPATCHER_SETTINGS.get('MODE', 'async'),
+                                 workers=MAIL_DISPATCHER_SETTINGS.get('WORKERS', 2),
+                                 batch_size=MAIL_DISPATCHER_SETTINGS.get('BATCH_SIZE', 20),
+                                 max_size=MAIL_DISPATCHER_SETTINGS.get('MAX_SIZE', 1000),
+                                 max_attempts=MAIL_DISPATCHER_SETTINGS.get('MAX_ATTEMPTS', 5),
+                                 retry_delay=MAIL_DISPATCHER_SETTINGS.get('RETRY_DELAY', 60),
+                                 lease=MAIL_DISPATCHER_SETTINGS.get('LEASE', 300),
+                                 poll_interval=MAIL_DISPATCHER_SETTINGS.get('POLL_INTERVAL', 30))
+
+# 进程退出时发送队列中剩余的邮件(未发送的仍保留在EmailOutbox中)
+atexit.register(mail_dispatcher.flush)
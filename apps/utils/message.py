@@ -0,0 +1,100 @@
+# coding: utf-8
+import time
+
+from django.core.cache import cache
+from django.db.models import Q
+
+from operation.models import BroadcastReadMark, UserMessage
+
+# UserMessage.user == 0 代表全体消息
+BROADCAST_USER = 0
+
+# 未读消息数缓存时间(秒), 缓存计数与数据库出现偏差时以此为上限
+UNREAD_CACHE_TIMEOUT = 60 * 10
+# 新增全体消息时更新该版本号, 使所有用户的未读消息数缓存失效
+UNREAD_VERSION_KEY = 'unread_message_version'
+
+
+def get_user_messages(user_id):
+    """用户的个人消息及全体消息, 按时间倒序"""
+    return UserMessage.objects.filter(Q(user=user_id) | Q(user=BROADCAST_USER)).order_by('-add_time')
+
+
+def get_broadcast_read_id(user_id):
+    """用户已读的全体消息水位(id), 无记录时为0"""
+    read_ids = BroadcastReadMark.objects.filter(user_id=user_id).values_list('last_read_id', flat=True)
+    return read_ids[0] if read_ids else 0
+
+
+def update_broadcast_read_id(user_id, last_read_id):
+    """提升用户的全体消息已读水位(只增不减)"""
+    mark, created = BroadcastReadMark.objects.get_or_create(user_id=user_id,
+                                                            defaults={'last_read_id': last_read_id})
+    if not created and mark.last_read_id < last_read_id:
+        BroadcastReadMark.objects.filter(user_id=user_id, last_read_id__lt=last_read_id) \
+                                 .update(last_read_id=last_read_id)
+
+
+def mark_messages_read(user_id, messages):
+    """
+    将(当前页的)消息标为已读: 个人消息一次批量update, 全体消息提升已读水位
+    :param user_id:    (int)   用户id
+    :param messages:   UserMessage的可迭代对象
+    :return:           (list)  消息列表
+    """
+    messages = list(messages)
+
+    unread_ids = [msg.id for msg in messages if msg.user == user_id and not msg.has_read]
+    if unread_ids:
+        UserMessage.objects.filter(id__in=unread_ids).update(has_read=True)
+
+    broadcast_ids = [msg.id for msg in messages if msg.user == BROADCAST_USER]
+    if broadcast_ids:
+        update_broadcast_read_id(user_id, max(broadcast_ids))
+
+    if unread_ids or broadcast_ids:
+        invalidate_unread_message_nums(user_id)
+    return messages
+
+
+def count_unread_messages(user_id):
+    """用户未读消息数: 未读的个人消息 + 已读水位之后的全体消息"""
+    personal_nums = UserMessage.objects.filter(user=user_id, has_read=False).count()
+    broadcast_nums = UserMessage.objects.filter(user=BROADCAST_USER, id__gt=get_broadcast_read_id(user_id)).count()
+    return personal_nums + broadcast_nums
+
+
+def _new_unread_version():
+    return int(time.time() * 1000000)
+
+
+def _unread_cache_key(user_id):
+    version = cache.get(UNREAD_VERSION_KEY)
+    if version is None:
+        # 版本号被淘汰后不能回到旧值, 否则旧版本下缓存的未读数会被当作当前值
+        version = _new_unread_version()
+        if not cache.add(UNREAD_VERSION_KEY, version, None):
+            version = cache.get(UNREAD_VERSION_KEY, version)
+    return 'unread_message_nums:{version}:{user_id}'.format(version=version, user_id=user_id)
+
+
+def get_unread_message_nums(user_id):
+    """用户未读消息数, 优先读取缓存, 未命中时查询数据库并写入缓存"""
+    key = _unread_cache_key(user_id)
+    nums = cache.get(key)
+    if nums is None:
+        nums = count_unread_messages(user_id)
+        cache.set(key, nums, UNREAD_CACHE_TIMEOUT)
+    return nums
+
+
+def invalidate_unread_message_nums(user_id=None):
+    """
+    清除用户的未读消息数缓存(新增消息、标为已读), user_id为None时清除所有用户的(新增全体消息)
+
+    不在缓存中累加新消息数: FileBasedCache的incr不是原子操作, 并发累加会丢失, 下次读取时重新查询数据库
+    """
+    if user_id is None:
+        cache.set(UNREAD_VERSION_KEY, _new_unread_version(), None)
+    else:
+        cache.delete(_unread_cache_key(user_id))
@@ -0,0 +1,135 @@
+# coding: utf-8
+"""
+    页面缓存与片段缓存(基于tag版本号失效)
+
+    每个tag(如 'course')在缓存中保存一个版本号, 页面、片段的缓存键包含其依赖的所有tag的版本号,
+    模型保存、删除时由signals调用 invalidate_tags() 更新版本号, 旧的缓存键不再命中, 由缓存自行淘汰
+"""
+import hashlib
+import re
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.encoding import force_bytes
+from django.utils.http import urlencode
+
+# 缓存tag
+TAG_BANNER = 'banner'
+TAG_COURSE = 'course'
+TAG_ORG = 'org'
+TAG_CITY = 'city'
+TAG_TEACHER = 'teacher'
+
+PAGE_CACHE_SETTINGS = getattr(settings, 'PAGE_CACHE_SETTINGS', {})
+
+# 缓存的页面中csrf token替换为占位符, 命中时填入当前访问者的token
+CSRF_TOKEN_RE = re.compile(br"(name=['\"]csrfmiddlewaretoken['\"] value=['\"])([^'\"]*)(['\"])")
+CSRF_TOKEN_PLACEHOLDER = b'__csrf_token__'
+
+
+def _tag_key(tag):
+    return 'page_cache_tag:{tag}'.format(tag=tag)
+
+
+def get_tag_versions(tags):
+    """
+    获取tag的版本号, 缓存中不存在的tag生成新的版本号
+    :param tags:   可迭代对象 tag
+    :return:       (str)  按tag排序拼接的版本号, 用于组成缓存键
+    """
+    tags = sorted(set(tags))
+    keys = dict((tag, _tag_key(tag)) for tag in tags)
+    versions = cache.get_many(keys.values())
+
+    missed = {}
+    for tag in tags:
+        if keys[tag] not in versions:
+            # 以时间作为版本号: tag被淘汰后重新生成的版本号不会与旧的版本号相同
+            missed[keys[tag]] = versions[keys[tag]] = int(time.time() * 1000000)
+    if missed:
+        cache.set_many(missed, None)
+    return '.'.join(str(versions[keys[tag]]) for tag in tags)
+
+
+def invalidate_tags(*tags):
+    """更新tag的版本号, 依赖这些tag的页面、片段缓存全部失效"""
+    version = int(time.time() * 1000000)
+    cache.set_many(dict((_tag_key(tag), version) for tag in tags), None)
+
+
+def get_fragment(name, tags, builder, timeout=None):
+    """
+    获取缓存的片段数据(如轮播图、热门排行), 未命中时调用builder生成
+    :param name:      (str)      片段名
+    :param tags:      可迭代对象 片段依赖的tag
+    :param builder:   callable   生成片段数据, 返回值需可pickle(queryset应转为list)
+    :param timeout:   (int)      缓存时间(秒), 默认 PAGE_CACHE_SETTINGS['FRAGMENT_TIMEOUT']
+    :return:          片段数据
+    """
+    if timeout is None:
+        timeout = PAGE_CACHE_SETTINGS.get('FRAGMENT_TIMEOUT', 300)
+    key = 'fragment:{name}:{versions}'.format(name=name, versions=get_tag_versions(tags))
+    value = cache.get(key)
+    if value is None:
+        value = builder()
+        cache.set(key, value, timeout)
+    return value
+
+
+def normalize_query(query_dict, params):
+    """
+    规范化查询参数: 只保留params中的参数, 去除空值并排序, 避免无关参数(如统计参数)产生不同的缓存键
+    :param query_dict:   request.GET
+    :param params:       可迭代对象 页面使用的参数名
+    :return:             (str)  规范化的查询字符串
+    """
+    items = []
+    for param in sorted(set(params)):
+        value = query_dict.get(param, '').strip()
+        if value:
+            items.append((param, value))
+    return urlencode(items)
+
+
+def cache_anonymous_page(tags, query_params=(), timeout=None):
+    """
+    未登录用户的整页缓存(装饰GET请求的view函数, CBV中配合method_decorator使用)
+
+    缓存键由路径、规范化的查询参数及tag版本号组成, 已登录用户不使用整页缓存
+    :param tags:           可迭代对象 页面依赖的tag
+    :param query_params:   可迭代对象 页面使用的查询参数, 如 ('sort', 'page')
+    :param timeout:        (int)      缓存时间(秒), 默认 PAGE_CACHE_SETTINGS['PAGE_TIMEOUT']
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if not PAGE_CACHE_SETTINGS.get('ENABLED', True) or request.method not in ('GET', 'HEAD') or \
+                    request.user.is_authenticated():
+                return view_func(request, *args, **kwargs)
+
+            page_timeout = timeout
+            if page_timeout is None:
+                page_timeout = PAGE_CACHE_SETTINGS.get('PAGE_TIMEOUT', 300)
+            query = normalize_query(request.GET, query_params)
+            key = 'page:{path}:{versions}'.format(
+                path=hashlib.md5(force_bytes(request.path + '?' + query)).hexdigest(),
+                versions=get_tag_versions(tags))
+
+            cached = cache.get(key)
+            if cached is not None:
+                content, content_type = cached
+                if CSRF_TOKEN_PLACEHOLDER in content:
+                    content = content.replace(CSRF_TOKEN_PLACEHOLDER, force_bytes(get_token(request)))
+                return HttpResponse(content, content_type=content_type)
+
+            response = view_func(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming and not response.cookies:
+                content = CSRF_TOKEN_RE.sub(br'\g<1>' + CSRF_TOKEN_PLACEHOLDER + br'\g<3>', response.content)
+                cache.set(key, (content, response['Content-Type']), page_timeout)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,249 @@
+# coding: utf-8
+"""
+    请求统计: 每个view的SQL数量、SQL耗时、模板渲染耗时及总耗时
+
+    - SQL由 utils.db_pool 数据库后端的execute hook统计(DEBUG=False时同样有效)
+    - 模板渲染耗时由 InstrumentedDjangoTemplates 模板后端统计
+    - RequestStatsMiddleware 在请求结束时累加到当前进程的统计中, 并定期写入缓存(每个进程一个key),
+      xadmin中的 '请求统计' 页面(/xadmin/request_stats/)及 python manage.py request_stats 合并各进程的统计
+    - 超过 SLOW_TIME 或 MAX_QUERIES 的请求记录warning; SQL数量超过 QUERY_BUDGETS 时记录warning,
+      RAISE_ON_BUDGET 为True(运行测试时)抛出QueryBudgetExceeded使测试失败
+"""
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.backends.django import DjangoTemplates
+
+from utils.db_pool import add_execute_hook
+
+logger = logging.getLogger(__name__)
+
+REQUEST_STATS_SETTINGS = getattr(settings, 'REQUEST_STATS_SETTINGS', {})
+
+# 缓存中记录各进程统计key的列表
+PROCESSES_CACHE_KEY = 'request_stats:processes'
+# 各进程统计在缓存中保存的时间(秒)
+STATS_CACHE_TIMEOUT = 60 * 60 * 24
+
+# 每个view的统计字段
+STAT_FIELDS = ('requests', 'queries', 'queries_max', 'db_time', 'template_time', 'wall_time', 'wall_time_max')
+
+_local = threading.local()
+
+
+class QueryBudgetExceeded(AssertionError):
+    """view的SQL数量超过了QUERY_BUDGETS中的限制"""
+    pass
+
+
+class RequestRecord(object):
+    """一个请求的统计"""
+
+    def __init__(self):
+        self.start = time.time()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+
+
+def _record_query(alias, sql, seconds):
+    record = getattr(_local, 'record', None)
+    if record is not None:
+        record.queries += 1
+        record.db_time += seconds
+
+
+def _record_template(seconds):
+    record = getattr(_local, 'record', None)
+    if record is not None:
+        record.template_time += seconds
+
+
+add_execute_hook(_record_query)
+
+
+class InstrumentedTemplate(object):
+    """统计渲染耗时的模板(只统计最外层模板, include、extends的模板包含在内)"""
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        start = time.time()
+        try:
+            return self.template.render(context, request)
+        finally:
+            _record_template(time.time() - start)
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """统计模板渲染耗时的Django模板后端, TEMPLATES中的BACKEND使用 'utils.request_stats.InstrumentedDjangoTemplates'"""
+
+    def from_string(self, template_code):
+        return InstrumentedTemplate(super(InstrumentedDjangoTemplates, self).from_string(template_code))
+
+    def get_template(self, template_name, dirs=None):
+        if dirs is None:
+            template = super(InstrumentedDjangoTemplates, self).get_template(template_name)
+        else:
+            template = super(InstrumentedDjangoTemplates, self).get_template(template_name, dirs)
+        return InstrumentedTemplate(template)
+
+
+class RequestStats(object):
+    """当前进程各view的请求统计"""
+
+    def __init__(self, flush_interval=30):
+        """
+        :param flush_interval:   (int)   写入缓存的间隔(秒)
+        """
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        # {view名称: {统计字段: 值}}
+        self._views = {}
+        self._last_flush = time.time()
+
+    def add(self, view_name, record, wall_time):
+        with self._lock:
+            stats = self._views.setdefault(view_name, dict.fromkeys(STAT_FIELDS, 0))
+            stats['requests'] += 1
+            stats['queries'] += record.queries
+            stats['queries_max'] = max(stats['queries_max'], record.queries)
+            stats['db_time'] += record.db_time
+            stats['template_time'] += record.template_time
+            stats['wall_time'] += wall_time
+            stats['wall_time_max'] = max(stats['wall_time_max'], wall_time)
+            need_flush = time.time() - self._last_flush >= self.flush_interval
+        if need_flush:
+            self.flush()
+
+    def snapshot(self):
+        with self._lock:
+            return dict((view_name, dict(stats)) for view_name, stats in self._views.items())
+
+    def reset(self):
+        with self._lock:
+            self._views = {}
+
+    def _cache_key(self):
+        return 'request_stats:{pid}'.format(pid=os.getpid())
+
+    def flush(self):
+        """将当前进程的统计写入缓存(每个进程一个key, 不会互相覆盖)"""
+        with self._lock:
+            self._last_flush = time.time()
+        key = self._cache_key()
+        try:
+            cache.set(key, self.snapshot(), STATS_CACHE_TIMEOUT)
+            keys = cache.get(PROCESSES_CACHE_KEY) or []
+            if key not in keys:
+                # uWSGI重启后旧进程的key过期后自动失效, 最多保留最近的100个进程
+                cache.set(PROCESSES_CACHE_KEY, (keys + [key])[-100:], STATS_CACHE_TIMEOUT)
+        except Exception:
+            logger.exception('flush request stats failed')
+
+    def clear(self):
+        """清除所有进程的统计"""
+        self.reset()
+        keys = cache.get(PROCESSES_CACHE_KEY) or []
+        cache.delete_many(keys + [PROCESSES_CACHE_KEY])
+
+
+request_stats = RequestStats(flush_interval=REQUEST_STATS_SETTINGS.get('FLUSH_INTERVAL', 30))
+
+
+def get_all_stats():
+    """
+    合并所有进程的统计(当前进程使用最新的统计)
+    :return:   (list)  [dict(view=view名称, requests=请求数, queries_avg=平均SQL数, ...)]
+    """
+    keys = cache.get(PROCESSES_CACHE_KEY) or []
+    processes = cache.get_many(keys)
+    processes[request_stats._cache_key()] = request_stats.snapshot()
+
+    merged = {}
+    for views in processes.values():
+        for view_name, stats in views.items():
+            total = merged.setdefault(view_name, dict.fromkeys(STAT_FIELDS, 0))
+            for field in STAT_FIELDS:
+                if field.endswith('_max'):
+                    total[field] = max(total[field], stats[field])
+                else:
+                    total[field] += stats[field]
+
+    rows = []
+    for view_name, stats in merged.items():
+        requests = stats['requests'] or 1
+        rows.append(dict(stats, view=view_name,
+                         queries_avg=float(stats['queries']) / requests,
+                         db_time_avg=stats['db_time'] / requests,
+                         template_time_avg=stats['template_time'] / requests,
+                         wall_time_avg=stats['wall_time'] / requests))
+    return rows
+
+
+def get_top_stats(order_by='wall_time_avg', nums=20):
+    """按某项统计降序的前nums个view"""
+    return sorted(get_all_stats(), key=lambda row: row[order_by], reverse=True)[:nums]
+
+
+def get_query_budget(view_name):
+    """view的SQL数量限制, 没有限制时返回None"""
+    return REQUEST_STATS_SETTINGS.get('QUERY_BUDGETS', {}).get(view_name,
+                                                              REQUEST_STATS_SETTINGS.get('DEFAULT_QUERY_BUDGET'))
+
+
+def get_view_name(request):
+    """url名称(如 'course:detail'), 没有名称时为view函数路径"""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return '<unresolved>'
+    if match.url_name:
+        return match.view_name
+    func = getattr(match.func, 'view_class', match.func)
+    return '{module}.{name}'.format(module=func.__module__, name=getattr(func, '__name__', repr(func)))
+
+
+class RequestStatsMiddleware(object):
+    """统计每个请求的SQL数量、SQL耗时、模板渲染耗时及总耗时, 放在MIDDLEWARE_CLASSES的最前面"""
+
+    def process_request(self, request):
+        if not REQUEST_STATS_SETTINGS.get('ENABLED', True):
+            return None
+        _local.record = RequestRecord()
+        return None
+
+    def process_response(self, request, response):
+        record = getattr(_local, 'record', None)
+        if record is None:
+            return response
+        _local.record = None
+
+        wall_time = time.time() - record.start
+        view_name = get_view_name(request)
+        request_stats.add(view_name, record, wall_time)
+
+        if wall_time >= REQUEST_STATS_SETTINGS.get('SLOW_TIME', 1.0) or \
+                record.queries >= REQUEST_STATS_SETTINGS.get('MAX_QUERIES', 50):
+            logger.warning('slow request %s %s: %.3fs, %d queries (%.3fs), template %.3fs',
+                           view_name, request.path, wall_time, record.queries, record.db_time,
+                           record.template_time)
+
+        budget = get_query_budget(view_name)
+        if budget is not None and record.queries > budget:
+            message = '{view} ({path}) executed {queries} queries, budget is {budget}'.format(
+                view=view_name, path=request.path, queries=record.queries, budget=budget)
+            if REQUEST_STATS_SETTINGS.get('RAISE_ON_BUDGET'):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+
+        if settings.DEBUG:
+            response['X-Query-Count'] = record.queries
+        return response
@@ -0,0 +1,52 @@
+# coding: utf-8
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.db.models import Prefetch
+
+from courses.models import Course, Lesson, Video
+
+# 课程大纲缓存时间(秒), 章节、视频修改时主动清除
+SYLLABUS_CACHE_TIMEOUT = 60 * 60 * 24
+
+# 不可变的课程大纲节点
+SyllabusLesson = namedtuple('SyllabusLesson', ['id', 'name', 'videos'])
+SyllabusVideo = namedtuple('SyllabusVideo', ['id', 'name', 'learn_times'])
+
+
+def _syllabus_cache_key(course_id):
+    return 'course_syllabus:{course_id}'.format(course_id=course_id)
+
+
+def load_course_syllabus(course_id):
+    """
+    查询课程大纲: 章节及其视频(两次查询)
+    :param course_id:   (int)    课程id
+    :return:            (tuple)  (SyllabusLesson(id, name, videos=(SyllabusVideo, ...)), ...)
+    """
+    lessons = Lesson.objects.filter(course_id=course_id).order_by('id') \
+                            .prefetch_related(Prefetch('video_set', queryset=Video.objects.order_by('id')))
+    return tuple(SyllabusLesson(id=lesson.id, name=lesson.name,
+                                videos=tuple(SyllabusVideo(id=video.id, name=video.name, learn_times=video.learn_times)
+                                             for video in lesson.video_set.all()))
+                 for lesson in lessons)
+
+
+def get_course_syllabus(course_id):
+    """获取课程大纲, 优先读取缓存"""
+    key = _syllabus_cache_key(course_id)
+    syllabus = cache.get(key)
+    if syllabus is None:
+        syllabus = load_course_syllabus(course_id)
+        cache.set(key, syllabus, SYLLABUS_CACHE_TIMEOUT)
+    return syllabus
+
+
+def invalidate_course_syllabus(course_id):
+    """章节、视频修改后清除课程大纲缓存"""
+    cache.delete(_syllabus_cache_key(course_id))
+
+
+def invalidate_all_syllabus():
+    """批量导入章节、视频(不触发post_save)后清除所有课程的大纲缓存"""
+    cache.delete_many([_syllabus_cache_key(course_id) for course_id in Course.objects.values_list('id', flat=True)])
@@ -0,0 +1,286 @@
+# coding: utf-8
+"""
+    utils.db_pool: 连接池及 'utils.db_pool.sqlite3' 后端的连接复用、健康检查、warmup_connections
+    utils.background: 后台线程按进程启动、出错后继续、stop后退出
+"""
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.db.utils import ConnectionHandler
+from django.test import SimpleTestCase
+
+from utils import db_pool
+from utils.background import WorkerThreadMixin
+from utils.db_pool import ConnectionPool, PoolTimeout, connection_stats, get_pool, start_request_health_checks, \
+    warmup_connections
+
+
+class FakeConnection(object):
+    """DB-API连接: broken时ping失败"""
+
+    def __init__(self):
+        self.broken = False
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def ping(conn):
+    if conn.broken or conn.closed:
+        raise Exception('connection lost')
+
+
+class ConnectionPoolTest(SimpleTestCase):
+
+    def setUp(self):
+        self.opened = []
+
+    def connect(self):
+        conn = FakeConnection()
+        self.opened.append(conn)
+        return conn
+
+    def test_reuse_idle_connection(self):
+        pool = ConnectionPool(max_size=2, max_overflow=0)
+        conn = pool.acquire(self.connect, ping)
+        pool.release(conn)
+        self.assertIs(pool.acquire(self.connect, ping), conn)
+        self.assertEqual(len(self.opened), 1)
+
+    def test_overflow_connection_closed_on_release(self):
+        pool = ConnectionPool(max_size=1, max_overflow=1)
+        conn1 = pool.acquire(self.connect, ping)
+        conn2 = pool.acquire(self.connect, ping)
+        pool.release(conn1)
+        pool.release(conn2)
+        self.assertFalse(conn1.closed)
+        self.assertTrue(conn2.closed)
+        self.assertEqual((pool.size, pool.idle_size), (1, 1))
+
+    def test_timeout(self):
+        pool = ConnectionPool(max_size=1, max_overflow=0, timeout=0.05)
+        pool.acquire(self.connect, ping)
+        timeout_nums = connection_stats.timeout_nums
+        self.assertRaises(PoolTimeout, pool.acquire, self.connect, ping)
+        self.assertEqual(connection_stats.timeout_nums, timeout_nums + 1)
+
+    def test_wait_for_release(self):
+        pool = ConnectionPool(max_size=1, max_overflow=0, timeout=5)
+        conn = pool.acquire(self.connect, ping)
+        timer = threading.Timer(0.1, pool.release, [conn])
+        timer.start()
+        try:
+            self.assertIs(pool.acquire(self.connect, ping), conn)
+        finally:
+            timer.join()
+        self.assertEqual(len(self.opened), 1)
+
+    def test_discard_on_release(self):
+        pool = ConnectionPool(max_size=1, max_overflow=0)
+        conn = pool.acquire(self.connect, ping)
+        pool.release(conn, discard=True)
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.size, 0)
+
+    def test_recycle(self):
+        pool = ConnectionPool(max_size=1, max_overflow=0, recycle=0)
+        conn = pool.acquire(self.connect, ping)
+        pool.release(conn)
+        self.assertIsNot(pool.acquire(self.connect, ping), conn)
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.size, 1)
+
+    def test_unusable_idle_connection(self):
+        pool = ConnectionPool(max_size=1, max_overflow=0)
+        conn = pool.acquire(self.connect, ping)
+        pool.release(conn)
+        conn.broken = True
+        self.assertIsNot(pool.acquire(self.connect, ping), conn)
+        self.assertTrue(conn.closed)
+
+    def test_prefill_and_clear(self):
+        pool = ConnectionPool(max_size=2, max_overflow=0)
+        pool.prefill(3, self.connect, ping)
+        self.assertEqual((pool.size, pool.idle_size), (2, 2))
+        pool.clear()
+        self.assertEqual(pool.size, 0)
+        self.assertTrue(all(conn.closed for conn in self.opened))
+
+    def test_abandon(self):
+        """fork后的子进程中放弃连接: 不关闭(会断开父进程的连接)"""
+        pool = ConnectionPool(max_size=2, max_overflow=0)
+        pool.prefill(2, self.connect, ping)
+        pool.abandon()
+        self.assertEqual(pool.size, 0)
+        self.assertFalse(any(conn.closed for conn in self.opened))
+
+
+class PooledSQLiteBackendTest(SimpleTestCase):
+    """不使用测试数据库, 在临时目录中的SQLite数据库上测试 'utils.db_pool.sqlite3' 后端"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.handlers = []
+
+    def tearDown(self):
+        for handler in self.handlers:
+            for conn in handler.all():
+                conn.close()
+        with db_pool._pools_lock:
+            for key in [key for key in db_pool._pools if key[1].startswith(self.tmp_dir)]:
+                db_pool._pools.pop(key).clear()
+        shutil.rmtree(self.tmp_dir)
+
+    def get_connection(self, pool=True, **settings_dict):
+        settings_dict.setdefault('ENGINE', 'utils.db_pool.sqlite3')
+        settings_dict.setdefault('NAME', os.path.join(self.tmp_dir, 'db.sqlite3'))
+        settings_dict.setdefault('CONN_MAX_AGE', 60)
+        settings_dict.setdefault('CONN_HEALTH_CHECKS', True)
+        settings_dict.setdefault('POOL', {'ENABLED': pool, 'MAX_SIZE': 2, 'MAX_OVERFLOW': 1, 'TIMEOUT': 1,
+                                          'MIN_SIZE': 1})
+        handler = ConnectionHandler({'default': settings_dict})
+        self.handlers.append(handler)
+        return handler['default']
+
+    def call_with_connections(self, func):
+        """func中的 utils.db_pool.connections 为最近创建的连接(而不是测试数据库的连接)"""
+        connections = db_pool.connections
+        db_pool.connections = self.handlers[-1]
+        try:
+            func()
+        finally:
+            db_pool.connections = connections
+
+    def test_connection_returned_to_pool(self):
+        conn = self.get_connection()
+        conn.ensure_connection()
+        raw = conn.connection
+        # 启用连接池时忽略CONN_MAX_AGE
+        self.assertLessEqual(conn.close_at, time.time())
+        conn.close_if_unusable_or_obsolete()
+        self.assertIsNone(conn.connection)
+        self.assertEqual(get_pool(conn).idle_size, 1)
+        conn.ensure_connection()
+        self.assertIs(conn.connection, raw)
+
+    def test_pool_shared_by_threads(self):
+        conn = self.get_connection()
+        conn.ensure_connection()
+        raw = conn.connection
+        conn.close()
+        raws = []
+
+        def query():
+            other = self.get_connection()
+            other.ensure_connection()
+            raws.append(other.connection)
+            other.close()
+        thread = threading.Thread(target=query)
+        thread.start()
+        thread.join()
+        self.assertEqual(raws, [raw])
+
+    def test_connection_discarded_after_error(self):
+        conn = self.get_connection()
+        conn.ensure_connection()
+        raw = conn.connection
+        conn.errors_occurred = True
+        conn.close()
+        self.assertEqual(get_pool(conn).size, 0)
+        self.assertRaises(sqlite3.ProgrammingError, raw.execute, 'SELECT 1')
+
+    def test_persistent_connection_without_pool(self):
+        conn = self.get_connection(pool=False)
+        conn.ensure_connection()
+        self.assertIsNone(get_pool(conn))
+        self.assertGreater(conn.close_at, time.time())
+
+    def test_health_check(self):
+        """持久连接在新请求第一次使用前检查, 不可用时重新连接"""
+        conn = self.get_connection(pool=False)
+        conn.ensure_connection()
+        raw = conn.connection
+        raw.close()
+        unusable_nums = connection_stats.unusable_nums
+        # 同一请求中不再检查
+        conn.ensure_connection()
+        self.assertIs(conn.connection, raw)
+        self.call_with_connections(start_request_health_checks)
+        conn.ensure_connection()
+        self.assertIsNot(conn.connection, raw)
+        self.assertEqual(connection_stats.unusable_nums, unusable_nums + 1)
+        with conn.cursor() as cursor:
+            cursor.execute('SELECT 1')
+
+    def test_warmup_connections(self):
+        """fork后丢弃继承的连接(不关闭), 并预先建立MIN_SIZE个连接池连接"""
+        conn = self.get_connection()
+        conn.ensure_connection()
+        inherited = conn.connection
+        old_pool = get_pool(conn)
+        self.call_with_connections(warmup_connections)
+        self.assertIsNone(conn.connection)
+        self.assertIn(inherited, db_pool._abandoned_connections)
+        inherited.execute('SELECT 1')
+        pool = get_pool(conn)
+        self.assertIsNot(pool, old_pool)
+        self.assertEqual((pool.size, pool.idle_size), (1, 1))
+
+
+class Worker(WorkerThreadMixin):
+
+    def __init__(self, mode='async'):
+        self.mode = mode
+        self.done = []
+        self.work = threading.Event()
+        self.init_workers('test worker', 2)
+
+    def _take_work(self):
+        return self.work.wait(0.01) or None
+
+    def _process_work(self, work):
+        if work is not None:
+            self.done.append(threading.current_thread().name)
+            if len(self.done) == 1:
+                raise ValueError('failed')
+            if len(self.done) >= 3:
+                self.stop()
+
+
+class WorkerThreadMixinTest(SimpleTestCase):
+
+    def worker_threads(self):
+        return [thread for thread in threading.enumerate() if thread.name.startswith('test worker')]
+
+    def test_start(self):
+        Worker(mode='sync').start()
+        self.assertEqual(self.worker_threads(), [])
+
+        worker = Worker()
+        worker.start()
+        worker.start()
+        self.assertEqual(worker._workers_pid, os.getpid())
+        self.assertEqual(sorted(thread.name for thread in self.worker_threads()), ['test worker 0', 'test worker 1'])
+
+        # 出错后继续执行, stop()后退出
+        worker.work.set()
+        for thread in self.worker_threads():
+            thread.join(2)
+        self.assertEqual(self.worker_threads(), [])
+        self.assertGreaterEqual(len(worker.done), 3)
+
+    def test_start_after_fork(self):
+        """fork出的进程中(进程id不同)重新启动线程"""
+        worker = Worker()
+        worker._workers_pid = os.getpid() + 1
+        worker._ensure_workers()
+        self.assertEqual(worker._workers_pid, os.getpid())
+        self.assertEqual(len(self.worker_threads()), 2)
+        worker.stop()
+        for thread in self.worker_threads():
+            thread.join(2)
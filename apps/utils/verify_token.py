@@ -0,0 +1,106 @@
+# coding: utf-8
+"""
+    邮箱验证码(EmailVerifyRecord)的生成、验证及清理
+
+    验证码按 sha256(类型:邮箱:新邮箱:验证码) 保存在唯一索引的token字段中, 验证时一次索引查询;
+    验证码有过期时间, 使用时以一条UPDATE标记为已使用(只能使用一次), purge_tokens() 定期删除过期的记录
+"""
+import hashlib
+import random
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils.encoding import force_bytes
+
+from users.models import EmailVerifyRecord
+
+# 链接中的验证码(注册激活、找回密码)不需要邮箱即可验证
+LINK_SEND_TYPES = ('register', 'forget')
+
+# (用户验证码输入体验)去掉 Ii Ll 11 Oo0
+CODE_CHARS = 'AaBbCcDdEeFfGgHhJjKkMmNnPpQqRrSsTtUuVvWwXxYyZz23456789'
+
+VERIFY_TOKEN_SETTINGS = getattr(settings, 'VERIFY_TOKEN_SETTINGS', {})
+
+# 使用操作系统的随机源(os.urandom)
+_random = random.SystemRandom()
+
+
+def generate_code(length=16):
+    """生成随机验证码"""
+    return ''.join(_random.choice(CODE_CHARS) for i in range(length))
+
+
+def make_token(send_type, code, email='', new_email=''):
+    """验证码的摘要, 链接类型的验证码只与验证码本身有关"""
+    if send_type in LINK_SEND_TYPES:
+        email = new_email = ''
+    return hashlib.sha256(force_bytes(u':'.join([send_type, email, new_email, code]))).hexdigest()
+
+
+def get_ttl(send_type):
+    """验证码有效时间(秒)"""
+    return VERIFY_TOKEN_SETTINGS.get('TTL', {}).get(send_type, 60 * 60 * 24)
+
+
+def create_token(send_type, email, new_email='', length=16):
+    """
+    生成验证码并保存
+    :param send_type:   (str)   'register' 'forget' or 'update_email'
+    :param email:       (str)   用户邮箱
+    :param new_email:   (str)   修改邮箱时的新邮箱
+    :param length:      (int)   验证码长度
+    :return:            (str)   验证码
+    """
+    now = datetime.now()
+    for i in range(10):
+        code = generate_code(length)
+        try:
+            # savepoint: 验证码重复时重新生成
+            with transaction.atomic():
+                EmailVerifyRecord.objects.create(code=code, email=email, new_email=new_email, send_type=send_type,
+                                                 token=make_token(send_type, code, email, new_email),
+                                                 send_time=now,
+                                                 expire_time=now + timedelta(seconds=get_ttl(send_type)))
+            return code
+        except IntegrityError:
+            continue
+    raise IntegrityError('generate verify code failed')
+
+
+def _valid_records(send_type, code, email='', new_email=''):
+    return EmailVerifyRecord.objects.filter(token=make_token(send_type, code, email, new_email),
+                                            send_type=send_type, used_time__isnull=True,
+                                            expire_time__gt=datetime.now())
+
+
+def check_token(send_type, code, email='', new_email=''):
+    """
+    验证码是否有效(不标记为已使用, 如显示重置密码表单时)
+    :return:   EmailVerifyRecord() or None
+    """
+    if not code:
+        return None
+    return _valid_records(send_type, code, email, new_email).first()
+
+
+def consume_token(send_type, code, email='', new_email=''):
+    """
+    使用验证码: 一条UPDATE标记为已使用, 并发请求中只有一个能成功
+    :return:   EmailVerifyRecord() or None
+    """
+    if not code or not _valid_records(send_type, code, email, new_email).update(used_time=datetime.now()):
+        return None
+    return EmailVerifyRecord.objects.get(token=make_token(send_type, code, email, new_email))
+
+
+def purge_tokens(keep_seconds=None):
+    """
+    删除过期超过keep_seconds的验证码记录(已使用的记录同样在过期后删除)
+    :return:   (int)   删除的记录数
+    """
+    if keep_seconds is None:
+        keep_seconds = VERIFY_TOKEN_SETTINGS.get('KEEP_EXPIRED', 60 * 60 * 24 * 7)
+    records = EmailVerifyRecord.objects.filter(expire_time__lt=datetime.now() - timedelta(seconds=keep_seconds))
+    return records.delete()[0]
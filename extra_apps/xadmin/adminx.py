@@ -27,6 +27,8 @@ class LogAdmin(object):
     list_display = ('action_time', 'user', 'ip_addr', '__str__', 'link')
     list_filter = ['user', 'action_time']
     search_fields = ['ip_addr', 'message']
+    # The log table only grows, count it from the table statistics
+    list_count_strategy = 'estimated'
     model_icon = 'fa fa-cog'
 
 xadmin.site.register(Log, LogAdmin)
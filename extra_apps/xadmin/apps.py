@@ -13,3 +13,6 @@ class XAdminConfig(AppConfig):
     def ready(self):
         self.module.autodiscover()
         setattr(xadmin,'site',xadmin.site)
+
+        from xadmin.filters import watch_list_filter_models
+        watch_list_filter_models(xadmin.site)
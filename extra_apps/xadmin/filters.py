@@ -1,6 +1,14 @@
 from __future__ import absolute_import
+import hashlib
+import time
+
+from django.apps import apps
+from django.conf import settings
 from django.db import models
-from django.core.exceptions import ImproperlyConfigured
+from django.db.models.signals import post_delete, post_save
+from django.db.models.sql.datastructures import EmptyResultSet
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.utils.encoding import force_bytes
 from django.utils.encoding import smart_text
 from django.utils.translation import ugettext_lazy as _
 from django.utils import timezone
@@ -10,7 +18,7 @@ from django.utils import six
 from django.utils.safestring import mark_safe
 from django.utils.html import escape,format_html
 from django.utils.text import Truncator
-from django.core.cache import cache, caches
+from django.core.cache import caches
 
 from xadmin.views.list import EMPTY_CHANGELIST_VALUE
 from xadmin.util import is_related_field,is_related_field2
@@ -19,9 +27,116 @@ import datetime
 FILTER_PREFIX = '_p_'
 SEARCH_VAR = '_q_'
 
-from .util import (get_model_from_relation,
+from .util import (get_model_from_relation, get_fields_from_path, NotRelationField,
     reverse_field_path, get_limit_choices_to_from_path, prepare_lookup_value)
 
+# Choices built from the database (distinct values, related objects) are cached
+# under a key made of the model, the field path, a signature of the base queryset
+# and the version of every model on the field path. Saving or deleting one of
+# those models bumps its version, the old keys are then left to expire.
+FILTER_CHOICES_SETTINGS = dict({
+    'ENABLED': True,
+    'CACHE': 'default',
+    'TIMEOUT': 60 * 60,
+    # Filters with more choices than this show a search input instead
+    'MAX_CHOICES': 100,
+}, **getattr(settings, 'XADMIN_FILTER_CHOICES', {}))
+
+# Concrete models whose save/delete signals invalidate the cached choices
+_watched_models = set()
+
+
+def _choices_cache():
+    return caches[FILTER_CHOICES_SETTINGS['CACHE']]
+
+
+def _choices_version_key(model):
+    return 'xadmin_filter_choices:version:%s' % model._meta.concrete_model._meta.label_lower
+
+
+def get_choices_versions(models):
+    keys = sorted(set(_choices_version_key(model) for model in models))
+    c = _choices_cache()
+    versions = c.get_many(keys)
+    missed = {}
+    for key in keys:
+        if key not in versions:
+            # A version evicted from the cache must not come back with an old value
+            missed[key] = versions[key] = int(time.time() * 1000000)
+    if missed:
+        c.set_many(missed, None)
+    return '.'.join(str(versions[key]) for key in keys)
+
+
+def invalidate_filter_choices(*models):
+    """Drop the cached filter choices that depend on these models."""
+    version = int(time.time() * 1000000)
+    _choices_cache().set_many(dict((_choices_version_key(model), version) for model in models), None)
+
+
+def _invalidate_on_change(sender, **kwargs):
+    invalidate_filter_choices(sender)
+
+
+def watch_models(models):
+    """
+    Invalidate the cached filter choices when one of these models (or one of
+    its proxies) is saved or deleted.
+    """
+    concrete_models = set(model._meta.concrete_model for model in models) - _watched_models
+    if not concrete_models:
+        return
+    for model in apps.get_models():
+        if model._meta.concrete_model in concrete_models:
+            post_save.connect(_invalidate_on_change, sender=model, dispatch_uid='xadmin_filter_choices')
+            post_delete.connect(_invalidate_on_change, sender=model, dispatch_uid='xadmin_filter_choices')
+    _watched_models.update(concrete_models)
+
+
+def path_models(model, field_path):
+    """The model and every related model on the field path."""
+    models = [model]
+    for field in get_fields_from_path(model, field_path):
+        if is_related_field2(field):
+            models.append(get_model_from_relation(field))
+    return models
+
+
+def queryset_signature(queryset):
+    try:
+        sql, params = queryset.query.get_compiler(queryset.db).as_sql()
+    except EmptyResultSet:
+        return 'empty'
+    return hashlib.md5(force_bytes(repr((sql, params)))).hexdigest()
+
+
+def watch_list_filter_models(site):
+    """
+    Connect the invalidation signals for the list filters of every registered
+    admin when the app is loaded, so that saves in any process invalidate the
+    choices. Only the filters building their choices from the database count,
+    a signal receiver on post_delete disables the fast delete of a model.
+    """
+    class SiteView(object):
+        admin_site = site
+
+    for model, admin_class in site._registry.items():
+        for list_filter in getattr(admin_class, 'list_filter', ()):
+            if isinstance(list_filter, (tuple, list)):
+                field_path, filter_class = list_filter
+            else:
+                field_path, filter_class = list_filter, None
+            if not isinstance(field_path, six.string_types):
+                continue
+            try:
+                field = get_fields_from_path(model, field_path)[-1]
+                if filter_class is None:
+                    filter_class = manager.get_filter_class(field, None, {}, model, SiteView(), field_path)
+                if getattr(filter_class, 'cache_choices', False):
+                    watch_models(path_models(model, field_path))
+            except (FieldDoesNotExist, NotRelationField):
+                continue
+
 
 class BaseFilter(object):
     title = None
@@ -92,10 +207,14 @@ class FieldFilterManager(object):
             self._field_list_filters.append(list_filter_class)
         return list_filter_class
 
-    def create(self, field, request, params, model, admin_view, field_path):
+    def get_filter_class(self, field, request, params, model, admin_view, field_path):
         for list_filter_class in self._field_list_filters:
-            if not list_filter_class.test(field, request, params, model, admin_view, field_path):
-                continue
+            if list_filter_class.test(field, request, params, model, admin_view, field_path):
+                return list_filter_class
+
+    def create(self, field, request, params, model, admin_view, field_path):
+        list_filter_class = self.get_filter_class(field, request, params, model, admin_view, field_path)
+        if list_filter_class is not None:
             return list_filter_class(field, request, params,
                                      model, admin_view, field_path=field_path)
 
@@ -105,6 +224,8 @@ manager = FieldFilterManager()
 class FieldFilter(BaseFilter):
 
     lookup_formats = {}
+    # The choices are built from the database with get_cached_choices
+    cache_choices = False
 
     def __init__(self, field, request, params, model, admin_view, field_path):
         self.field = field
@@ -146,13 +267,58 @@ class FieldFilter(BaseFilter):
     def do_filte(self, queryset):
         return queryset.filter(**self.used_params)
 
+    def get_cached_choices(self, queryset, builder, cache_config=None):
+        """
+        Return the choices built by builder() from queryset, cached until one of
+        the models on the field path is saved or deleted. The choices must be
+        picklable. cache_config overrides ENABLED, CACHE and TIMEOUT of
+        FILTER_CHOICES_SETTINGS.
+        """
+        config = dict(FILTER_CHOICES_SETTINGS, **(cache_config or {}))
+        if not config['ENABLED']:
+            return builder()
+        models = path_models(self.model, self.field_path)
+        watch_models(models)
+        key = 'xadmin_filter_choices:%s:%s:%s:%s' % (
+            self.model._meta.label_lower, self.field_path, queryset_signature(queryset),
+            get_choices_versions(models))
+        c = caches[config['CACHE']]
+        choices = c.get(key)
+        if choices is None:
+            choices = builder()
+            c.set(key, choices, config['TIMEOUT'])
+        return choices
+
 
 class ListFieldFilter(FieldFilter):
     template = 'xadmin/filters/list.html'
+    # Shown instead of the list of choices when there are more than max_choices,
+    # with an input for the search_lookup of lookup_formats
+    too_many_template = 'xadmin/filters/too_many.html'
+    search_lookup = 'exact'
+    max_choices = FILTER_CHOICES_SETTINGS['MAX_CHOICES']
+    too_many_choices = False
+
+    def limit_choices(self, choices):
+        """
+        Choices built from the database are fetched up to max_choices + 1, more
+        than max_choices switch the filter to the search input.
+        """
+        choices = list(choices)
+        if len(choices) > self.max_choices:
+            self.too_many_choices = True
+            self.template = self.too_many_template
+            choices = choices[:self.max_choices]
+        return choices
 
     def get_context(self):
         context = super(ListFieldFilter, self).get_context()
-        context['choices'] = list(self.choices())
+        if self.too_many_choices:
+            context['max_choices'] = self.max_choices
+            context['search_name'] = self.context_params['%s_name' % self.search_lookup]
+            context['search_val'] = self.context_params['%s_val' % self.search_lookup]
+        else:
+            context['choices'] = list(self.choices())
         return context
 
 
@@ -383,6 +549,7 @@ class RelatedFieldSearchFilter(FieldFilter):
 
 @manager.register
 class RelatedFieldListFilter(ListFieldFilter):
+    cache_choices = True
 
     @classmethod
     def test(cls, field, request, params, model, admin_view, field_path):
@@ -397,10 +564,19 @@ class RelatedFieldListFilter(ListFieldFilter):
 
         self.lookup_formats = {'in': '%%s__%s__in' % rel_name,'exact': '%%s__%s__exact' %
                                rel_name, 'isnull': '%s__isnull'}
-        self.lookup_choices = field.get_choices(include_blank=False)
         super(RelatedFieldListFilter, self).__init__(
             field, request, params, model, model_admin, field_path)
 
+        # Same choices as field.get_choices(), fetched up to max_choices + 1
+        if hasattr(field, 'rel'):
+            queryset = other_model._default_manager.complex_filter(field.get_limit_choices_to())
+            value_attr = field.rel.get_related_field().attname
+        else:
+            queryset = other_model._default_manager.all()
+            value_attr = other_model._meta.pk.attname
+        self.lookup_choices = self.limit_choices(self.get_cached_choices(queryset, lambda: [
+            (getattr(obj, value_attr), smart_text(obj)) for obj in queryset[:self.max_choices + 1]]))
+
         if hasattr(field, 'verbose_name'):
             self.lookup_title = field.verbose_name
         else:
@@ -454,56 +630,38 @@ class MultiSelectFieldListFilter(ListFieldFilter):
      
     """
     template = 'xadmin/filters/checklist.html'
-    lookup_formats = {'in': '%s__in'}
-    cache_config = {'enabled':False,'key':'quickfilter_%s','timeout':3600,'cache':'default'}
+    lookup_formats = {'in': '%s__in', 'contains': '%s__contains'}
+    search_lookup = 'contains'
+    cache_choices = True
  
     @classmethod
     def test(cls, field, request, params, model, admin_view, field_path):
         return True
  
-    def get_cached_choices(self):
-        if not self.cache_config['enabled']:
-            return None
-        c = caches(self.cache_config['cache'])
-        return c.get(self.cache_config['key']%self.field_path)
-    
-    def set_cached_choices(self,choices):
-        if not self.cache_config['enabled']:
-            return
-        c = caches(self.cache_config['cache'])
-        return c.set(self.cache_config['key']%self.field_path,choices)
-    
     def __init__(self, field, request, params, model, model_admin, field_path,field_order_by=None,field_limit=None,sort_key=None,cache_config=None):
         super(MultiSelectFieldListFilter,self).__init__(field, request, params, model, model_admin, field_path)
-        
-        # Check for it in the cachce
+
+        # cache_config overrides FILTER_CHOICES_SETTINGS, e.g. {'enabled': False}
         if cache_config is not None and type(cache_config)==dict:
-            self.cache_config.update(cache_config)
-        
-        if self.cache_config['enabled']:
-            self.field_path = field_path
-            choices = self.get_cached_choices()
-            if choices:
-                self.lookup_choices = choices
-                return
-            
-        # Else rebuild it
-        queryset = self.admin_view.queryset().exclude(**{"%s__isnull"%field_path:True}).values_list(field_path, flat=True).distinct() 
-        #queryset = self.admin_view.queryset().distinct(field_path).exclude(**{"%s__isnull"%field_path:True})
+            cache_config = dict((k.upper(), v) for k, v in cache_config.items())
+
+        queryset = self.admin_view.queryset().exclude(**{"%s__isnull"%field_path:True}).values_list(field_path, flat=True).distinct()
+        # Ordered by the value: the DISTINCT must not include the default ordering columns
+        queryset = queryset.order_by(field_path)
         
         if field_order_by is not None:
             # Do a subquery to order the distinct set
             queryset = self.admin_view.queryset().filter(id__in=queryset).order_by(field_order_by)
-            
-        if field_limit is not None and type(field_limit)==int and queryset.count()>field_limit:
-            queryset = queryset[:field_limit]
-        
-        self.lookup_choices = [str(it) for it in queryset.values_list(field_path,flat=True) if str(it).strip()!=""]
+
+        limit = self.max_choices + 1
+        if field_limit is not None and type(field_limit)==int:
+            limit = min(limit, field_limit)
+
+        self.lookup_choices = self.limit_choices(self.get_cached_choices(queryset, lambda: [
+            smart_text(it) for it in queryset.values_list(field_path,flat=True)[:limit] if smart_text(it).strip()!=""],
+            cache_config))
         if sort_key is not None:
             self.lookup_choices = sorted(self.lookup_choices,key=sort_key)
-        
-        if self.cache_config['enabled']:
-            self.set_cached_choices(self.lookup_choices) 
 
     def choices(self):
         self.lookup_in_val = (type(self.lookup_in_val) in (tuple,list)) and self.lookup_in_val or list(self.lookup_in_val)
@@ -522,7 +680,9 @@ class MultiSelectFieldListFilter(ListFieldFilter):
 
 @manager.register
 class AllValuesFieldListFilter(ListFieldFilter):
-    lookup_formats = {'exact': '%s__exact', 'isnull': '%s__isnull'}
+    lookup_formats = {'exact': '%s__exact', 'isnull': '%s__isnull', 'contains': '%s__contains'}
+    search_lookup = 'contains'
+    cache_choices = True
 
     @classmethod
     def test(cls, field, request, params, model, admin_view, field_path):
@@ -537,12 +697,14 @@ class AllValuesFieldListFilter(ListFieldFilter):
         limit_choices_to = get_limit_choices_to_from_path(model, field_path)
         queryset = queryset.filter(limit_choices_to)
 
-        self.lookup_choices = (queryset
-                               .distinct()
-                               .order_by(field.name)
-                               .values_list(field.name, flat=True))
+        queryset = (queryset
+                    .distinct()
+                    .order_by(field.name)
+                    .values_list(field.name, flat=True))
         super(AllValuesFieldListFilter, self).__init__(
             field, request, params, model, admin_view, field_path)
+        self.lookup_choices = self.limit_choices(self.get_cached_choices(
+            queryset, lambda: list(queryset[:self.max_choices + 1])))
 
     def choices(self):
         yield {
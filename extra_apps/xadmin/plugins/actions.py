@@ -161,7 +161,7 @@ class ActionPlugin(BaseAdminPlugin):
 
             new_context = {
                 'selection_note': _('0 of %(cnt)s selected') % {'cnt': len(av.result_list)},
-                'selection_note_all': selection_note_all % {'total_count': av.result_count},
+                'selection_note_all': selection_note_all % {'total_count': av.result_count_display()},
                 'action_choices': self.get_action_choices(),
                 'actions_selection_counter': self.actions_selection_counter,
             }
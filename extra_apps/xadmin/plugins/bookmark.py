@@ -228,7 +228,7 @@ class BookmarkWidget(PartialBaseWidget):
                             ))]
                 for r in list_view.results()
                 ]
-        context['result_count'] = list_view.result_count
+        context['result_count'] = list_view.result_count_display()
         context['page_url'] = self.bookmark.url
 
 site.register(Bookmark, BookmarkAdmin)
@@ -1,9 +1,14 @@
 import io
 import datetime
+import decimal
 import sys
+import tempfile
+from collections import OrderedDict
 from future.utils import iteritems
 
-from django.http import HttpResponse
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, StreamingHttpResponse
 from django.template import loader
 from django.utils import six
 from django.utils.encoding import force_text, smart_text
@@ -15,7 +20,7 @@ from django.db.models import BooleanField, NullBooleanField
 from xadmin.plugins.utils import get_context_dict
 from xadmin.sites import site
 from xadmin.views import BaseAdminPlugin, ListAdminView
-from xadmin.util import json
+from xadmin.util import json, lookup_field, label_for_field
 from xadmin.views.list import ALL_VAR
 
 try:
@@ -59,6 +64,16 @@ class ExportPlugin(BaseAdminPlugin):
                     'xls': 'application/vnd.ms-excel', 'csv': 'text/csv',
                     'xml': 'application/xhtml+xml', 'json': 'application/json'}
 
+    # Export all data as a streaming response: the list queryset is iterated in
+    # chunks and values are formatted from the model fields. xls (xlwt keeps the
+    # whole workbook in memory, at most 65536 rows) uses the rendered list.
+    export_streaming = True
+    export_streaming_types = ('xlsx', 'csv', 'xml', 'json')
+    export_chunk_size = 1000
+    # progress(done_nums, total_nums) called for every chunk of a streaming
+    # export, set by background export jobs.
+    export_progress = None
+
     def init_request(self, *args, **kwargs):
         return self.request.GET.get('_do_') == 'export'
 
@@ -88,14 +103,14 @@ class ExportPlugin(BaseAdminPlugin):
         new_rows.insert(0, [force_text(c.text) for c in context['result_headers'].cells if c.export])
         return new_rows
 
-    def get_xlsx_export(self, context):
-        datas = self._get_datas(context)
-        output = io.BytesIO()
-        export_header = (
-            self.request.GET.get('export_xlsx_header', 'off') == 'on')
-
+    def _write_xlsx(self, output, headers, rows):
+        """
+        Write rows with xlsxwriter's constant_memory mode: every row is flushed to a
+        temp file when the next row is started, so memory does not grow with the rows.
+        Rows must be written in order.
+        """
         model_name = self.opts.verbose_name
-        book = xlsxwriter.Workbook(output)
+        book = xlsxwriter.Workbook(output, {'constant_memory': True, 'remove_timezone': True})
         sheet = book.add_worksheet(
             u"%s %s" % (_(u'Sheet'), force_text(model_name)))
         styles = {'datetime': book.add_format({'num_format': 'yyyy-mm-dd hh:mm:ss'}),
@@ -104,24 +119,33 @@ class ExportPlugin(BaseAdminPlugin):
                   'header': book.add_format({'font': 'name Times New Roman', 'color': 'red', 'bold': 'on', 'num_format': '#,##0.00'}),
                   'default': book.add_format()}
 
-        if not export_header:
-            datas = datas[1:]
-        for rowx, row in enumerate(datas):
+        rowx = 0
+        if headers is not None:
+            for colx, value in enumerate(headers):
+                sheet.write(rowx, colx, value, styles['header'])
+            rowx += 1
+        for row in rows:
             for colx, value in enumerate(row):
-                if export_header and rowx == 0:
-                    cell_style = styles['header']
+                if isinstance(value, datetime.datetime):
+                    cell_style = styles['datetime']
+                elif isinstance(value, datetime.date):
+                    cell_style = styles['date']
+                elif isinstance(value, datetime.time):
+                    cell_style = styles['time']
                 else:
-                    if isinstance(value, datetime.datetime):
-                        cell_style = styles['datetime']
-                    elif isinstance(value, datetime.date):
-                        cell_style = styles['date']
-                    elif isinstance(value, datetime.time):
-                        cell_style = styles['time']
-                    else:
-                        cell_style = styles['default']
+                    cell_style = styles['default']
                 sheet.write(rowx, colx, value, cell_style)
+            rowx += 1
         book.close()
 
+    def get_xlsx_export(self, context):
+        datas = self._get_datas(context)
+        output = io.BytesIO()
+        export_header = (
+            self.request.GET.get('export_xlsx_header', 'off') == 'on')
+
+        self._write_xlsx(output, datas[0] if export_header else None, datas[1:])
+
         output.seek(0)
         return output.getvalue()
 
@@ -200,7 +224,7 @@ class ExportPlugin(BaseAdminPlugin):
 
     def get_xml_export(self, context):
         results = self._get_objects(context)
-        stream = io.StringIO()
+        stream = io.BytesIO()
 
         xml = SimplerXMLGenerator(stream, "utf-8")
         xml.startDocument()
@@ -211,28 +235,188 @@ class ExportPlugin(BaseAdminPlugin):
         xml.endElement("objects")
         xml.endDocument()
 
-        return stream.getvalue().split('\n')[1]
+        return stream.getvalue().split(b'\n')[1]
 
     def get_json_export(self, context):
         results = self._get_objects(context)
         return json.dumps({'objects': results}, ensure_ascii=False,
                           indent=(self.request.GET.get('export_json_format', 'off') == 'on') and 4 or None)
 
+    def _set_attachment(self, response, file_type):
+        file_name = self.opts.verbose_name.replace(' ', '_')
+        response['Content-Disposition'] = ('attachment; filename=%s.%s' % (
+            file_name, file_type)).encode('utf-8')
+
     def get_response(self, response, context, *args, **kwargs):
         file_type = self.request.GET.get('export_type', 'csv')
         response = HttpResponse(
             content_type="%s; charset=UTF-8" % self.export_mimes[file_type])
-
-        file_name = self.opts.verbose_name.replace(' ', '_')
-        response['Content-Disposition'] = ('attachment; filename=%s.%s' % (
-            file_name, file_type)).encode('utf-8')
+        self._set_attachment(response, file_type)
 
         response.write(getattr(self, 'get_%s_export' % file_type)(context))
         return response
 
+    # Streaming export
+    def _use_streaming(self):
+        return self.export_streaming and \
+            self.request.GET.get('export_type', 'csv') in self.export_streaming_types
+
+    def _get_export_fields(self):
+        """
+        (field_name, header) of the exported columns, the same columns as the
+        rendered list (see result_header below).
+        """
+        fields = []
+        for field_name in self.admin_view.list_display:
+            text, attr = label_for_field(field_name, self.model,
+                                         model_admin=self.admin_view, return_attr=True)
+            if not attr or field_name == '__str__' or getattr(attr, 'allow_export', True):
+                fields.append((field_name, force_text(text)))
+        return fields
+
+    def _get_field_value(self, obj, field_name):
+        """
+        The value of a column taken from the model field (choices display, related
+        object text, raw bool/date/number), instead of the rendered list cell.
+        """
+        try:
+            f, attr, value = lookup_field(field_name, obj, self.admin_view)
+        except (AttributeError, ObjectDoesNotExist):
+            return None
+        if f is not None and f.flatchoices and value is not None:
+            return force_text(dict(f.flatchoices).get(value, value), strings_only=True)
+        if value is None or isinstance(value, (bool, float, decimal.Decimal, datetime.date,
+                                               datetime.time) + six.integer_types):
+            return value
+        return smart_text(value)
+
+    def _iter_objects(self, queryset):
+        """
+        Iterate the queryset in chunks of export_chunk_size with .iterator(): the
+        queryset never caches the results, and only one chunk is fetched from the
+        database at a time (MySQLdb fetches the whole result set of a query).
+        Ordered by pk only: the next chunk is selected by the last pk, otherwise by offset.
+        """
+        chunk_size = self.export_chunk_size
+        ordering = list(queryset.query.order_by)
+        pk_names = ('pk', self.opts.pk.name, self.opts.pk.attname)
+        keyset = len(ordering) == 1 and ordering[0].lstrip('-') in pk_names
+        lookup = 'pk__lt' if keyset and ordering[0].startswith('-') else 'pk__gt'
+
+        last_pk = None
+        offset = 0
+        while True:
+            if not keyset:
+                chunk = queryset[offset:offset + chunk_size]
+            elif last_pk is None:
+                chunk = queryset[:chunk_size]
+            else:
+                chunk = queryset.filter(**{lookup: last_pk})[:chunk_size]
+            nums = 0
+            for obj in chunk.iterator():
+                nums += 1
+                last_pk = obj.pk
+                yield obj
+            if nums < chunk_size:
+                return
+            offset += chunk_size
+
+    def _iter_rows(self, fields):
+        field_names = [field_name for field_name, header in fields]
+        queryset = self.admin_view.get_list_queryset()
+        progress = self.export_progress
+        total_nums = queryset.count() if progress is not None else 0
+        if progress is not None:
+            progress(0, total_nums)
+        for i, obj in enumerate(self._iter_objects(queryset)):
+            if progress is not None and i and i % self.export_chunk_size == 0:
+                progress(i, total_nums)
+            yield [self._get_field_value(obj, field_name) for field_name in field_names]
+
+    def _format_stream_csv_value(self, value):
+        if value is None:
+            return u''
+        if isinstance(value, bool):
+            return force_text(_('Yes') if value else _('No'))
+        if isinstance(value, (float, decimal.Decimal) + six.integer_types):
+            return force_text(value)
+        if isinstance(value, datetime.datetime):
+            value = value.strftime('%Y-%m-%d %H:%M:%S')
+        elif isinstance(value, (datetime.date, datetime.time)):
+            value = value.isoformat()
+        return u'"%s"' % force_text(value).replace(u'"', u'""')
+
+    def stream_csv_export(self, fields):
+        if self.request.GET.get('export_csv_header', 'off') == 'on':
+            yield (u','.join(self._format_stream_csv_value(header) for field_name, header in fields)
+                   + u'\r\n').encode('utf-8')
+        for row in self._iter_rows(fields):
+            yield (u','.join(map(self._format_stream_csv_value, row)) + u'\r\n').encode('utf-8')
+
+    def stream_json_export(self, fields):
+        indent = (self.request.GET.get('export_json_format', 'off') == 'on') and 4 or None
+        separator = indent and u',\n' or u', '
+        headers = [header for field_name, header in fields]
+        yield b'{"objects": ['
+        for i, row in enumerate(self._iter_rows(fields)):
+            text = json.dumps(OrderedDict(zip(headers, row)), ensure_ascii=False,
+                              indent=indent, cls=DjangoJSONEncoder)
+            yield ((i and separator or u'') + text).encode('utf-8')
+        yield b']}'
+
+    def stream_xml_export(self, fields):
+        keys = [header.replace(' ', '_') for field_name, header in fields]
+        stream = io.BytesIO()
+        xml = SimplerXMLGenerator(stream, "utf-8")
+        xml.startDocument()
+        xml.startElement("objects", {})
+        for i, row in enumerate(self._iter_rows(fields)):
+            xml.startElement("row", {})
+            for key, value in zip(keys, row):
+                xml.startElement(key, {})
+                xml.characters(u'' if value is None else smart_text(value))
+                xml.endElement(key)
+            xml.endElement("row")
+            if (i + 1) % self.export_chunk_size == 0:
+                yield stream.getvalue()
+                stream.seek(0)
+                stream.truncate()
+        xml.endElement("objects")
+        xml.endDocument()
+        yield stream.getvalue()
+
+    def stream_xlsx_export(self, fields):
+        # A xlsx file is a zip archive which is only complete after Workbook.close(),
+        # write it to a temp file on disk and then send the file in blocks.
+        output = tempfile.TemporaryFile()
+        try:
+            headers = None
+            if self.request.GET.get('export_xlsx_header', 'off') == 'on':
+                headers = [header for field_name, header in fields]
+            self._write_xlsx(output, headers, self._iter_rows(fields))
+            output.seek(0)
+            while True:
+                block = output.read(64 * 1024)
+                if not block:
+                    return
+                yield block
+        finally:
+            output.close()
+
+    def get_streaming_response(self):
+        file_type = self.request.GET.get('export_type', 'csv')
+        response = StreamingHttpResponse(
+            getattr(self, 'stream_%s_export' % file_type)(self._get_export_fields()),
+            content_type="%s; charset=UTF-8" % self.export_mimes[file_type])
+        self._set_attachment(response, file_type)
+        return response
+
     # View Methods
     def get_result_list(self, __):
         if self.request.GET.get('all', 'off') == 'on':
+            if self._use_streaming():
+                # Export all data without building the rendered list context.
+                return self.get_streaming_response()
             self.admin_view.list_per_page = sys.maxsize
         return __()
 
@@ -151,6 +151,30 @@ class ImportBaseView(ModelAdminView):
         """
         return [f for f in self.formats if f().can_import()]
 
+    @filter_hook
+    def save_import_file(self, import_file, input_format):
+        """
+        Writes the uploaded file to a new temp storage chunk by chunk.
+        """
+        tmp_storage = self.get_tmp_storage_class()()
+        if hasattr(tmp_storage, 'open'):
+            with tmp_storage.open(mode='wb') as f:
+                for chunk in import_file.chunks():
+                    f.write(chunk)
+        else:
+            tmp_storage.save(b''.join(import_file.chunks()), input_format.get_read_mode())
+        return tmp_storage
+
+    @filter_hook
+    def get_import_dataset(self, input_format, tmp_storage):
+        """
+        Reads the saved file into a dataset, warning, big files may exceed memory.
+        """
+        data = tmp_storage.read(input_format.get_read_mode())
+        if not input_format.is_binary() and self.from_encoding:
+            data = force_text(data, self.from_encoding)
+        return input_format.create_dataset(data)
+
 
 class ImportView(ImportBaseView):
     def get_media(self):
@@ -210,29 +234,17 @@ class ImportView(ImportBaseView):
             import_file = form.cleaned_data['import_file']
             # first always write the uploaded file to disk as it may be a
             # memory file or else based on settings upload handlers
-            tmp_storage = self.get_tmp_storage_class()()
-            data = bytes()
-            for chunk in import_file.chunks():
-                data += chunk
-
-            tmp_storage.save(data, input_format.get_read_mode())
+            tmp_storage = self.save_import_file(import_file, input_format)
 
             # then read the file, using the proper format-specific mode
-            # warning, big files may exceed memory
             try:
-                data = tmp_storage.read(input_format.get_read_mode())
-                if not input_format.is_binary() and self.from_encoding:
-                    data = force_text(data, self.from_encoding)
-                dataset = input_format.create_dataset(data)
+                dataset = self.get_import_dataset(input_format, tmp_storage)
             except UnicodeDecodeError as e:
                 return HttpResponse(_(u"<h1>Imported file has a wrong encoding: %s</h1>" % e))
             except Exception as e:
                 return HttpResponse(_(u"<h1>%s encountered while trying to read file: %s</h1>" % (type(e).__name__,
                                                                                                   import_file.name)))
-            result = resource.import_data(dataset, dry_run=True,
-                                          raise_errors=False,
-                                          file_name=import_file.name,
-                                          user=request.user)
+            result = self.dry_run_import(resource, dataset, import_file)
 
             context['result'] = result
 
@@ -252,16 +264,28 @@ class ImportView(ImportBaseView):
         return TemplateResponse(request, [self.import_template_name],
                                 context)
 
+    @filter_hook
+    def dry_run_import(self, resource, dataset, import_file):
+        """
+        Imports the dataset with dry_run, the result is shown as a preview.
+        """
+        return resource.import_data(dataset, dry_run=True,
+                                    raise_errors=False,
+                                    file_name=import_file.name,
+                                    user=self.request.user)
+
 
 class ImportProcessView(ImportBaseView):
     @filter_hook
     @csrf_protect_m
-    @transaction.atomic
     def post(self, request, *args, **kwargs):
         """
         Perform the actual import action (after the user has confirmed he
         wishes to import)
         """
+        if not (self.has_change_permission() and self.has_add_permission()):
+            raise PermissionDenied
+
         resource = self.get_import_resource_class()(**self.get_import_resource_kwargs(request, *args, **kwargs))
 
         confirm_form = ConfirmImportForm(request.POST)
@@ -271,46 +295,53 @@ class ImportProcessView(ImportBaseView):
                 int(confirm_form.cleaned_data['input_format'])
             ]()
             tmp_storage = self.get_tmp_storage_class()(name=confirm_form.cleaned_data['import_file_name'])
-            data = tmp_storage.read(input_format.get_read_mode())
-            if not input_format.is_binary() and self.from_encoding:
-                data = force_text(data, self.from_encoding)
-            dataset = input_format.create_dataset(data)
-
-            result = resource.import_data(dataset, dry_run=False,
-                                          raise_errors=True,
-                                          file_name=confirm_form.cleaned_data['original_file_name'],
-                                          user=request.user)
-
-            if not self.get_skip_admin_log():
-                # Add imported objects to LogEntry
-                logentry_map = {
-                    RowResult.IMPORT_TYPE_NEW: ADDITION,
-                    RowResult.IMPORT_TYPE_UPDATE: CHANGE,
-                    RowResult.IMPORT_TYPE_DELETE: DELETION,
-                }
-                content_type_id = ContentType.objects.get_for_model(self.model).pk
-                for row in result:
-                    if row.import_type != row.IMPORT_TYPE_ERROR and row.import_type != row.IMPORT_TYPE_SKIP:
-                        LogEntry.objects.log_action(
-                            user_id=request.user.pk,
-                            content_type_id=content_type_id,
-                            object_id=row.object_id,
-                            object_repr=row.object_repr,
-                            action_flag=logentry_map[row.import_type],
-                            change_message="%s through import_export" % row.import_type,
-                        )
-            success_message = str(_(u'Import finished')) + ' , ' + str(_(u'Add')) + ' : %d' % result.totals[
-                RowResult.IMPORT_TYPE_NEW] + ' , ' + str(_(u'Update')) + ' : %d' % result.totals[
-                RowResult.IMPORT_TYPE_UPDATE]
-
-            messages.success(request, success_message)
-            tmp_storage.remove()
-
-            post_import.send(sender=None, model=self.model)
-            model_info = (self.opts.app_label, self.opts.model_name)
-            url = reverse('xadmin:%s_%s_changelist' % model_info,
-                          current_app=self.admin_site.name)
-            return HttpResponseRedirect(url)
+            return self.process_import(resource, input_format, tmp_storage, confirm_form)
+
+    @filter_hook
+    @transaction.atomic
+    def process_import(self, resource, input_format, tmp_storage, confirm_form):
+        """
+        Imports the whole file in one transaction, plugins may import it in
+        batches instead.
+        """
+        request = self.request
+        dataset = self.get_import_dataset(input_format, tmp_storage)
+
+        result = resource.import_data(dataset, dry_run=False,
+                                      raise_errors=True,
+                                      file_name=confirm_form.cleaned_data['original_file_name'],
+                                      user=request.user)
+
+        if not self.get_skip_admin_log():
+            # Add imported objects to LogEntry
+            logentry_map = {
+                RowResult.IMPORT_TYPE_NEW: ADDITION,
+                RowResult.IMPORT_TYPE_UPDATE: CHANGE,
+                RowResult.IMPORT_TYPE_DELETE: DELETION,
+            }
+            content_type_id = ContentType.objects.get_for_model(self.model).pk
+            for row in result:
+                if row.import_type != row.IMPORT_TYPE_ERROR and row.import_type != row.IMPORT_TYPE_SKIP:
+                    LogEntry.objects.log_action(
+                        user_id=request.user.pk,
+                        content_type_id=content_type_id,
+                        object_id=row.object_id,
+                        object_repr=row.object_repr,
+                        action_flag=logentry_map[row.import_type],
+                        change_message="%s through import_export" % row.import_type,
+                    )
+        success_message = str(_(u'Import finished')) + ' , ' + str(_(u'Add')) + ' : %d' % result.totals[
+            RowResult.IMPORT_TYPE_NEW] + ' , ' + str(_(u'Update')) + ' : %d' % result.totals[
+            RowResult.IMPORT_TYPE_UPDATE]
+
+        messages.success(request, success_message)
+        tmp_storage.remove()
+
+        post_import.send(sender=None, model=self.model)
+        model_info = (self.opts.app_label, self.opts.model_name)
+        url = reverse('xadmin:%s_%s_changelist' % model_info,
+                      current_app=self.admin_site.name)
+        return HttpResponseRedirect(url)
 
 
 class ExportMixin(object):
@@ -449,7 +449,7 @@ class ListWidget(ModelBaseWidget, PartialBaseWidget):
         context['results'] = [[o for i, o in
                                enumerate(filter(lambda c:c.field_name in base_fields, r.cells))]
                               for r in list_view.results()]
-        context['result_count'] = list_view.result_count
+        context['result_count'] = list_view.result_count_display()
         context['page_url'] = self.model_admin_url('changelist') + "?" + urlencode(self.list_params)
 
 
@@ -1,13 +1,16 @@
 from __future__ import absolute_import
+import hashlib
 from collections import OrderedDict
+from django.core.cache import cache
 from django.core.exceptions import PermissionDenied, ObjectDoesNotExist
 from django.core.paginator import InvalidPage, Paginator
 from django.core.urlresolvers import NoReverseMatch
-from django.db import models
+from django.db import connections, models
+from django.db.models.sql.datastructures import EmptyResultSet
 from django.http import HttpResponseRedirect
 from django.template.response import SimpleTemplateResponse, TemplateResponse
 from django.utils import six
-from django.utils.encoding import force_text, smart_text
+from django.utils.encoding import force_bytes, force_text, smart_text
 from django.utils.html import escape, conditional_escape
 from django.utils.safestring import mark_safe
 from django.utils.text import capfirst
@@ -31,6 +34,27 @@ DOT = '.'
 EMPTY_CHANGELIST_VALUE = _('Null')
 
 
+def estimate_table_rows(model, using):
+    """
+    Row count of the model's table from the database statistics (InnoDB
+    TABLE_ROWS, PostgreSQL reltuples), None if the database has none.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute('SELECT TABLE_ROWS FROM information_schema.TABLES '
+                           'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s', [table])
+        elif connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [table])
+        else:
+            return None
+        row = cursor.fetchone()
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
 class FakeMethodField(object):
     """
     This class used when a column is an model function, wrap function as a fake field to display in select columns.
@@ -112,6 +136,16 @@ class ListAdminView(ModelAdminView):
     paginator_class = Paginator
     ordering = None
 
+    # How the number of results is counted, see get_result_count:
+    # 'exact'     COUNT(*) of the filtered queryset on every request
+    # 'cached'    the exact count, cached for list_count_cache_timeout seconds per query string
+    # 'estimated' the table statistics for unfiltered lists, otherwise a COUNT over at
+    #             most list_count_limit + 1 rows, shown as "more than list_count_limit".
+    #             The page links of table statistics end at the next page.
+    list_count_strategy = 'exact'
+    list_count_cache_timeout = 60
+    list_count_limit = 10000
+
     # Change list templates
     object_list_template = None
 
@@ -174,9 +208,11 @@ class ListAdminView(ModelAdminView):
         self.paginator = self.get_paginator()
 
         # Get the number of objects, with admin filters applied.
-        self.result_count = self.paginator.count
+        self.result_count_mode = 'exact'
+        self.result_count = self.get_result_count()
+        self.set_paginator_count(self.result_count)
 
-        self.can_show_all = self.result_count <= self.list_max_show_all
+        self.can_show_all = self.result_count_mode == 'exact' and self.result_count <= self.list_max_show_all
         self.multi_page = self.result_count > self.list_per_page
 
         # Get the list of objects to display on this page.
@@ -184,16 +220,94 @@ class ListAdminView(ModelAdminView):
             self.result_list = self.list_queryset._clone()
         else:
             try:
-                self.result_list = self.paginator.page(
-                    self.page_num + 1).object_list
+                if self.list_count_strategy == 'exact':
+                    self.result_list = self.paginator.page(
+                        self.page_num + 1).object_list
+                else:
+                    # The count may be stale or estimated, the page is not checked against it
+                    self.result_list = self.get_page_result_list()
             except InvalidPage:
                 if ERROR_FLAG in self.request.GET.keys():
                     return SimpleTemplateResponse('xadmin/views/invalid_setup.html', {
                         'title': _('Database error'),
                     })
                 return HttpResponseRedirect(self.request.path + '?' + ERROR_FLAG + '=1')
-        self.has_more = self.result_count > (
-            self.list_per_page * self.page_num + len(self.result_list))
+        if self.result_count_mode == 'exact':
+            self.has_more = self.result_count > (
+                self.list_per_page * self.page_num + len(self.result_list))
+        else:
+            self.has_more = self.multi_page and len(self.result_list) == self.list_per_page
+            # Table statistics often overshoot the real count, so the page links
+            # end at the next page and the following pages are reached with the
+            # next link. With 'more' there are at least result_count objects.
+            count = self.list_per_page * self.page_num + len(self.result_list) + self.has_more
+            if self.result_count_mode == 'more':
+                count = max(self.result_count, count)
+            self.set_paginator_count(count)
+
+    def set_paginator_count(self, count):
+        # Paginator.count is a read-only property caching the COUNT(*) in _count
+        self.paginator._count = count
+        self.paginator._num_pages = None
+
+    @filter_hook
+    def get_result_count(self):
+        """
+        Return the number of objects with the admin filters applied, counted
+        according to list_count_strategy. result_count_mode tells how to show
+        it: 'exact', 'estimated' (from the table statistics) or 'more' (there
+        are more objects than the count).
+        """
+        if self.list_count_strategy == 'cached':
+            return self.get_cached_count()
+        elif self.list_count_strategy == 'estimated':
+            return self.get_estimated_count()
+        return self.paginator.count
+
+    def get_cached_count(self):
+        queryset = self.list_queryset.order_by()
+        try:
+            sql = queryset.query.get_compiler(queryset.db).as_sql()
+        except EmptyResultSet:
+            return 0
+        params = sorted((k, v) for k, v in self.params.items() if k not in (ORDER_VAR, COL_LIST_VAR))
+        # The SQL covers an admin queryset() depending on the user
+        key = 'xadmin_list_count:%s:%s' % (
+            self.opts.label_lower, hashlib.md5(force_bytes(repr((params, sql)))).hexdigest())
+        count = cache.get(key)
+        if count is None:
+            count = self.paginator.count
+            cache.set(key, count, self.list_count_cache_timeout)
+        return count
+
+    def get_estimated_count(self):
+        queryset = self.list_queryset.order_by()
+        if not queryset.query.where:
+            rows = estimate_table_rows(self.model, queryset.db)
+            # Statistics of small tables are too far off, these are counted
+            if rows is not None and rows > self.list_count_limit:
+                self.result_count_mode = 'estimated'
+                return rows
+        count = queryset.values('pk')[:self.list_count_limit + 1].count()
+        if count > self.list_count_limit:
+            self.result_count_mode = 'more'
+            return self.list_count_limit
+        return count
+
+    def get_page_result_list(self):
+        # A page past the end (from a stale count or an old link) is shown
+        # empty, with the page links leading back to the last pages
+        if self.page_num < 0:
+            raise InvalidPage
+        offset = self.list_per_page * self.page_num
+        return self.list_queryset[offset:offset + self.list_per_page]
+
+    def result_count_display(self):
+        if self.result_count_mode == 'estimated':
+            return '~%d' % self.result_count
+        elif self.result_count_mode == 'more':
+            return '%d+' % self.result_count
+        return '%d' % self.result_count
 
     @filter_hook
     def get_result_list(self):
@@ -651,10 +765,14 @@ class ListAdminView(ModelAdminView):
                     page_range.extend(range(page_num + 1, paginator.num_pages))
 
         need_show_all_link = self.can_show_all and not self.show_all and self.multi_page
+        # The page links end at the count, which is a lower bound when it is not exact,
+        # or at the next page for table statistics
+        need_next_link = pagination_required and self.result_count_mode != 'exact' and self.has_more
         return {
             'cl': self,
             'pagination_required': pagination_required,
             'show_all_url': need_show_all_link and self.get_query_string({ALL_VAR: ''}),
+            'next_url': need_next_link and self.get_query_string({PAGE_VAR: page_num + 1}),
             'page_range': map(self.get_page_number, page_range),
             'ALL_VAR': ALL_VAR,
             '1': 1,